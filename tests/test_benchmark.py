@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+
+from os.path import abspath, join
+from pytest import mark
+from vn_organizer.benchmark import benchmark_chain
+
+# Number of prompts along the deep route
+CHAIN_LENGTH = 50000
+
+# Maximum time in seconds to save, load, render and check the deep route in each format
+CHAIN_BUDGET = 60.0
+
+@mark.parametrize("extension", ["json", "vno", "vndb"])
+def test_deep_chain(tmp_path, extension):
+    # Check that a very deep route stays within the time budget without hitting the recursion limit
+    file = abspath(join(tmp_path, f"chain.{extension}"))
+    results = benchmark_chain(file, CHAIN_LENGTH, CHAIN_BUDGET)
+    assert results["total"] <= CHAIN_BUDGET
+    assert results["within_budget"]
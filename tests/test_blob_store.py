@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+from os.path import abspath, join
+from vn_organizer.benchmark import generate_route
+from vn_organizer.blob_store import MAX_DELTA_CHAIN
+from vn_organizer.blob_store import get_blob_directory
+from vn_organizer.blob_store import get_delta_chain
+from vn_organizer.blob_store import get_stored_size
+from vn_organizer.blob_store import get_tree_blobs
+from vn_organizer.blob_store import pack_saves
+from vn_organizer.blob_store import read_blob
+from vn_organizer.vn_organizer import get_empty_branch_dict
+
+def test_pack_saves_round_trip(tmp_path):
+    # Saves stored as deltas read back the same, while taking less space
+    blob_dir = get_blob_directory(abspath(join(tmp_path, "route.json")))
+    branch_dict = generate_route(blob_dir, 40, 4, 16384, 2)
+    hashes = get_tree_blobs(branch_dict)
+    saves = {blob_hash:read_blob(blob_dir, blob_hash) for blob_hash in hashes}
+    full_size = sum([get_stored_size(blob_dir, blob_hash) for blob_hash in hashes])
+    assert pack_saves(branch_dict, blob_dir) > 0
+    assert sum([get_stored_size(blob_dir, blob_hash) for blob_hash in hashes]) < full_size
+    for blob_hash in hashes:
+        assert read_blob(blob_dir, blob_hash) == saves[blob_hash]
+        assert len(get_delta_chain(blob_dir, blob_hash)) <= MAX_DELTA_CHAIN + 1
+    # Packing again leaves the saves as they are
+    assert pack_saves(branch_dict, blob_dir) == 0
+    for blob_hash in hashes:
+        assert read_blob(blob_dir, blob_hash) == saves[blob_hash]
+
+def test_pack_saves_keeps_old_bases(tmp_path):
+    # Saves that deltas no longer in the tree are based on stay in full, so their chains don't grow
+    blob_dir = get_blob_directory(abspath(join(tmp_path, "route.json")))
+    hashes = get_tree_blobs(generate_route(blob_dir, 2, 4, 16384, 3))
+    saves = {blob_hash:read_blob(blob_dir, blob_hash) for blob_hash in hashes}
+    route = get_empty_branch_dict()
+    route["item_list"] = [{"type":"s", "hash":blob_hash} for blob_hash in hashes[:MAX_DELTA_CHAIN + 1]]
+    assert pack_saves(route, blob_dir) == MAX_DELTA_CHAIN
+    # Pack a route where the first save comes after another save
+    route["item_list"] = [{"type":"s", "hash":hashes[-1]}, {"type":"s", "hash":hashes[0]}]
+    pack_saves(route, blob_dir)
+    for blob_hash in hashes:
+        assert read_blob(blob_dir, blob_hash) == saves[blob_hash]
+        assert len(get_delta_chain(blob_dir, blob_hash)) <= MAX_DELTA_CHAIN + 1
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+
+from copy import deepcopy
+from vn_organizer.history import apply_with_history
+from vn_organizer.history import get_empty_history
+from vn_organizer.history import redo_operation
+from vn_organizer.history import undo_operation
+from vn_organizer.nodes import to_dicts
+from vn_organizer.nodes import to_nodes
+from vn_organizer.tree_index import build_index
+from vn_organizer.tree_index import get_node_from_path
+from vn_organizer.vn_organizer import add_item_to_dict
+from vn_organizer.vn_organizer import create_branch_in_dict
+from vn_organizer.vn_organizer import get_empty_branch_dict
+
+def test_undo_redo():
+    # Undoing edits restores the tree exactly, including edits given negative or out of range indexes
+    branch_dict = get_empty_branch_dict()
+    create_branch_in_dict(branch_dict, "Prompt", ["A", "B", "C"])
+    for text in ["X", "Y", "Z"]:
+        add_item_to_dict(branch_dict, "g", text)
+    tree_dict = {"tree":to_nodes(branch_dict)}
+    index = build_index(tree_dict["tree"])
+    history = get_empty_history()
+    edits = [{"op":"delete_branch", "path":[], "index":-1},
+                {"op":"delete_item", "path":[], "index":-1},
+                {"op":"add_item", "path":[], "item":{"type":"g", "text":"W"}, "index":-1},
+                {"op":"insert_branch", "path":[], "index":99, "branch":get_empty_branch_dict()},
+                {"op":"toggle_end", "path":[0]}]
+    states = [to_dicts(tree_dict["tree"])]
+    for edit in edits:
+        node_id = get_node_from_path(index, edit["path"])
+        assert apply_with_history(tree_dict, deepcopy(edit), index, history, node_id)
+        states.append(to_dicts(tree_dict["tree"]))
+    for state in reversed(states[:-1]):
+        assert undo_operation(tree_dict, index, history) is not None
+        assert to_dicts(tree_dict["tree"]) == state
+    assert undo_operation(tree_dict, index, history) is None
+    for state in states[1:]:
+        assert redo_operation(tree_dict, index, history) is not None
+        assert to_dicts(tree_dict["tree"]) == state
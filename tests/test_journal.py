@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+from os.path import abspath, exists, join
+from vn_organizer.benchmark import generate_tree
+from vn_organizer.blob_store import get_blob_directory
+from vn_organizer.journal import get_journal_file
+from vn_organizer.journal import read_journal
+from vn_organizer.vn_organizer import apply_operation
+from vn_organizer.vn_organizer import compact_tree
+from vn_organizer.vn_organizer import get_empty_branch_dict
+from vn_organizer.vn_organizer import read_tree
+from vn_organizer.vn_organizer import save_tree
+from vn_organizer.vn_organizer import write_tree
+
+def get_edits() -> list:
+    # Edits touching every kind of journal operation that changes the tree
+    return [{"op":"add_item", "path":[0], "item":{"type":"c", "text":"Added"}},
+                {"op":"add_item", "path":[], "item":{"type":"g", "text":"First"}, "index":0},
+                {"op":"delete_item", "path":[1], "index":-1},
+                {"op":"toggle_end", "path":[0, 1]},
+                {"op":"create_branch", "path":[0, 0], "prompt":"New", "responses":["Yes", "No"]},
+                {"op":"insert_branch", "path":[], "index":1, "branch":get_empty_branch_dict()},
+                {"op":"delete_branch", "path":[2], "index":0}]
+
+def apply_edits(tree_dict:dict) -> list:
+    # Apply the edits to the tree, as they are before being saved
+    edits = get_edits()
+    for edit in edits:
+        assert apply_operation(tree_dict, edit)
+    return edits
+
+def test_journal_replay(tmp_path):
+    # Edits saved to the journal are replayed on top of the snapshot
+    file = abspath(join(tmp_path, "tree.json"))
+    branch_dict = generate_tree(get_blob_directory(file), 3, 2, 2, 64)
+    write_tree(file, branch_dict, str(tmp_path), None, None)
+    tree_dict = read_tree(file)
+    assert save_tree(file, tree_dict, apply_edits(tree_dict), False)
+    assert len(read_journal(file)) == len(get_edits())
+    assert tree_dict["tree"]["item_list"][0]["text"] == "First"
+    assert read_tree(file) == tree_dict
+    # Folding the journal into a snapshot keeps the same tree
+    compact_tree(file, tree_dict)
+    assert not exists(get_journal_file(file))
+    assert read_tree(file) == tree_dict
+
+def test_journal_skips_old_edits(tmp_path):
+    # Edits already part of the snapshot aren't applied twice
+    file = abspath(join(tmp_path, "tree.json"))
+    branch_dict = generate_tree(get_blob_directory(file), 2, 2, 2, 64)
+    write_tree(file, branch_dict, str(tmp_path), None, None)
+    tree_dict = read_tree(file)
+    assert save_tree(file, tree_dict, apply_edits(tree_dict), False)
+    write_tree(file, tree_dict["tree"], str(tmp_path), None, tree_dict["persistent"], tree_dict["sequence"])
+    assert len(read_journal(file)) == len(get_edits())
+    assert read_tree(file) == tree_dict
+
+def test_failed_compaction_keeps_journal(tmp_path):
+    # A snapshot that can't be written leaves the journal and the old snapshot as they were
+    file = abspath(join(tmp_path, "tree.json"))
+    branch_dict = generate_tree(get_blob_directory(file), 2, 2, 2, 64)
+    write_tree(file, branch_dict, str(tmp_path), None, None)
+    tree_dict = read_tree(file)
+    assert save_tree(file, tree_dict, apply_edits(tree_dict), False)
+    saved_dict = read_tree(file)
+    tree_dict["tree"]["item_list"].append({"type":"c", "text":object()})
+    assert not compact_tree(file, tree_dict)
+    assert not exists(file + ".tmp")
+    assert len(read_journal(file)) == len(get_edits())
+    assert read_tree(file) == saved_dict
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+from os.path import abspath, exists, join
+from pytest import mark
+from shutil import rmtree
+from time import perf_counter
+from vn_organizer.benchmark import generate_chain
+from vn_organizer.benchmark import generate_tree
+from vn_organizer.blob_store import get_blob_directory
+from vn_organizer.blob_store import get_tree_blobs
+from vn_organizer.blob_store import read_blob
+from vn_organizer.nodes import to_dicts
+from vn_organizer.tree_catalog import summarize_tree
+from vn_organizer.tree_database import read_database_tree
+from vn_organizer.vn_organizer import convert_tree
+from vn_organizer.vn_organizer import read_tree
+from vn_organizer.vn_organizer import write_tree
+
+# Number of saves written to a single binary file
+MANY_SAVES = 20000
+
+# Maximum time in seconds to write a binary file with MANY_SAVES saves
+MANY_SAVES_BUDGET = 5.0
+
+def write_test_tree(directory:str) -> str:
+    # Write a JSON tree with saves in its blob store
+    file = abspath(join(directory, "tree.json"))
+    branch_dict = generate_tree(get_blob_directory(file), 3, 3, 4, 256, 0.5, 1)
+    write_tree(file, branch_dict, directory, None, None)
+    return file
+
+@mark.parametrize("extension", [".vno", ".vndb"])
+def test_convert_round_trip(tmp_path, extension):
+    # Converting to another format and back keeps the tree and its saves
+    file = write_test_tree(str(tmp_path))
+    tree_dict = read_tree(file)
+    saves = {blob_hash:read_blob(get_blob_directory(file), blob_hash) for blob_hash in get_tree_blobs(tree_dict["tree"])}
+    converted = abspath(join(tmp_path, "tree" + extension))
+    assert convert_tree(file, converted)
+    # Saves are read from the converted file itself once its blob store is gone
+    rmtree(get_blob_directory(converted))
+    back = abspath(join(tmp_path, "back.json"))
+    assert convert_tree(converted, back)
+    assert read_tree(back)["tree"] == tree_dict["tree"]
+    for blob_hash in saves:
+        assert read_blob(get_blob_directory(back), blob_hash) == saves[blob_hash]
+
+def test_database_lazy_read(tmp_path):
+    # A database read lazily loads the same tree as one read in full
+    file = write_test_tree(str(tmp_path))
+    database = abspath(join(tmp_path, "tree.vndb"))
+    assert convert_tree(file, database)
+    assert to_dicts(read_tree(database, True)["tree"]) == read_tree(database)["tree"]
+
+def test_database_missing_file(tmp_path):
+    # Reading a database that doesn't exist fails without creating it
+    database = abspath(join(tmp_path, "missing.vndb"))
+    assert read_database_tree(database, get_blob_directory(database)) is None
+    assert read_database_tree(database, get_blob_directory(database), True) is None
+    assert not exists(database)
+
+@mark.parametrize("extension", [".json", ".vno", ".vndb"])
+def test_summary_is_read_only(tmp_path, extension):
+    # Summarizing a tree doesn't extract its saves, and finds the saves stored in the file
+    file = write_test_tree(str(tmp_path))
+    converted = abspath(join(tmp_path, "copy" + extension))
+    assert convert_tree(file, converted)
+    rmtree(get_blob_directory(converted))
+    summary = summarize_tree(converted)
+    assert summary["branches"] == 40
+    if extension == ".json":
+        # JSON files only refer to saves in the blob store
+        assert summary["saves"] == 0 and summary["missing_saves"] == 80
+    else:
+        assert summary["saves"] == 80 and summary["missing_saves"] == 0
+    assert not exists(get_blob_directory(converted))
+
+def test_binary_many_saves(tmp_path):
+    # Writing a binary file with many saves takes time in proportion to the number of saves
+    file = abspath(join(tmp_path, "chain.vno"))
+    branch_dict = generate_chain(get_blob_directory(file), MANY_SAVES - 1, 16)
+    start_time = perf_counter()
+    write_tree(file, branch_dict, str(tmp_path), None, None)
+    assert perf_counter() - start_time <= MANY_SAVES_BUDGET
+    rmtree(get_blob_directory(file))
+    summary = summarize_tree(file)
+    assert summary["saves"] == MANY_SAVES and summary["missing_saves"] == 0
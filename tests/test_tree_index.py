@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+from random import Random
+from time import perf_counter
+from vn_organizer.nodes import to_nodes
+from vn_organizer.tree_index import build_index
+from vn_organizer.tree_index import get_node_id
+from vn_organizer.tree_index import get_node_path
+from vn_organizer.tree_index import search_index
+from vn_organizer.vn_organizer import get_empty_branch_dict
+
+# Maximum time in seconds to search the deep route
+SEARCH_BUDGET = 2.0
+
+def test_search_order():
+    # Matches are returned in the order they appear in the tree
+    generator = Random(0)
+    branch_dict = get_empty_branch_dict()
+    branches = [branch_dict]
+    for i in range(0, 2000):
+        parent = generator.choice(branches)
+        branch = get_empty_branch_dict()
+        branch["response"] = generator.choice(["Left", "Right", "Left Right"])
+        parent["branch"].insert(generator.randint(0, len(parent["branch"])), branch)
+        branches.append(branch)
+    tree = to_nodes(branch_dict)
+    index = build_index(tree)
+    expected = []
+    stack = [tree]
+    while len(stack) > 0:
+        cur_dict = stack.pop()
+        if cur_dict["response"] is not None and "Left" in cur_dict["response"].split():
+            expected.append(get_node_id(index, cur_dict))
+        stack.extend(reversed(cur_dict["branch"]))
+    assert search_index(index, "left") == expected
+
+def test_search_deep_route():
+    # Searching a deep route doesn't build a path for every branch
+    branch_dict = get_empty_branch_dict()
+    cur_dict = branch_dict
+    for i in range(0, 20000):
+        cur_dict["branch"].append(get_empty_branch_dict())
+        cur_dict = cur_dict["branch"][0]
+        cur_dict["response"] = f"Step{i} Route"
+    index = build_index(to_nodes(branch_dict))
+    start_time = perf_counter()
+    matches = search_index(index, "route")
+    deepest = search_index(index, "step19999")
+    assert perf_counter() - start_time <= SEARCH_BUDGET
+    assert len(matches) == 20000 and matches[-1] == deepest[0]
+    assert get_node_path(index, deepest[0]) == [0] * 20000
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+from threading import Condition, Thread
+from time import monotonic
+from typing import List
+from vn_organizer.blob_store import get_blob_directory
+from vn_organizer.tree_cache import flatten_tree
+from vn_organizer.tree_cache import unflatten_tree
+from vn_organizer.vn_organizer import apply_operation
+from vn_organizer.vn_organizer import compact_tree
+from vn_organizer.vn_organizer import get_persistent_operation
+from vn_organizer.vn_organizer import needs_compaction
+from vn_organizer.vn_organizer import number_operations
+from vn_organizer.vn_organizer import write_operations
+
+# Seconds without new edits to wait before saving them
+AUTOSAVE_DELAY = 2.0
+
+def start_autosave(file:str=None, tree_dict:dict=None, delay:float=AUTOSAVE_DELAY) -> dict:
+    """
+    Starts a background worker that saves edits to a tree file.
+    Edits queued in quick succession are saved together once no new edits have come in for the delay.
+    The tree must only be edited while holding the "condition" of the returned state, so it isn't saved mid-edit,
+    and edits must be queued before the condition is released.
+
+    :param file: File path of the tree file, defaults to None
+    :type file: str, optional
+    :param tree_dict: Tree dict as returned by read_tree, defaults to None
+    :type tree_dict: dict, optional
+    :param delay: Seconds without new edits to wait before saving, defaults to AUTOSAVE_DELAY
+    :type delay: float, optional
+    :return: Autosave state
+    :rtype: dict
+    """
+    state = {"file":file,
+                "tree":tree_dict,
+                "delay":delay,
+                "condition":Condition(),
+                "pending":[],
+                "last_edit":0.0,
+                "flush":False,
+                "stop":False,
+                "writing":False,
+                "failed":False}
+    state["thread"] = Thread(target=autosave_worker, args=(state,), daemon=True)
+    state["thread"].start()
+    return state
+
+def autosave_worker(state:dict=None):
+    """
+    Saves queued edits until the autosave is stopped.
+    The condition is only held to take the queued edits, record changes to the persistent file, and copy the tree,
+    so files are read and written while new edits are made.
+
+    :param state: Autosave state as returned by start_autosave, defaults to None
+    :type state: dict, optional
+    """
+    condition = state["condition"]
+    tree_dict = state["tree"]
+    blob_dir = get_blob_directory(state["file"])
+    while True:
+        snapshot = None
+        with condition:
+            # Wait until no new edits have come in for the delay, or until the edits are flushed
+            while True:
+                if len(state["pending"]) > 0:
+                    remaining = state["last_edit"] + state["delay"] - monotonic()
+                    if remaining <= 0 or state["flush"] or state["stop"]:
+                        break
+                    condition.wait(remaining)
+                elif state["stop"]:
+                    return None
+                else:
+                    condition.wait()
+            operations = state["pending"]
+            state["pending"] = []
+            state["writing"] = True
+            paths = {"primary_path":tree_dict["primary_path"], "persistent":tree_dict["persistent"]}
+        # Check the persistent file outside the condition, as it may need to be hashed
+        persistent_operation = get_persistent_operation(paths, blob_dir)
+        with condition:
+            if persistent_operation is not None:
+                apply_operation(tree_dict, persistent_operation)
+                operations.append(persistent_operation)
+            number_operations(tree_dict, operations)
+        # Append the edits to the journal
+        try:
+            saved = write_operations(state["file"], operations)
+        except OSError:
+            saved = False
+        # Copy the tree to fold the journal into a new snapshot, flattened as it's faster than copying the nodes
+        # The tree is only copied without newer edits, as those aren't numbered yet and would be applied twice
+        # A failed snapshot keeps the journal, so it's tried again after the next edits are saved
+        compacted = True
+        if saved and needs_compaction(state["file"]):
+            with condition:
+                if len(state["pending"]) == 0:
+                    snapshot = {key:tree_dict[key] for key in tree_dict if not key == "tree"}
+                    snapshot["tree"] = flatten_tree(tree_dict["tree"])
+            if snapshot is not None:
+                snapshot["tree"] = unflatten_tree(*snapshot["tree"])
+                try:
+                    compacted = compact_tree(state["file"], snapshot)
+                except OSError:
+                    compacted = False
+        with condition:
+            if not saved:
+                # Keep the edits to try again after the delay
+                state["pending"] = operations + state["pending"]
+                state["last_edit"] = monotonic()
+            state["writing"] = False
+            state["failed"] = not saved or not compacted
+            condition.notify_all()
+            # Give up on edits that can't be saved once stopped
+            if state["stop"] and not saved:
+                return None
+
+def queue_operations(state:dict=None, operations:List[dict]=None):
+    """
+    Queues operations that were applied to the tree to be saved by the autosave worker.
+
+    :param state: Autosave state as returned by start_autosave, defaults to None
+    :type state: dict, optional
+    :param operations: Operations applied to the tree, defaults to None
+    :type operations: list[dict], optional
+    """
+    if len(operations) == 0:
+        return None
+    with state["condition"]:
+        state["pending"].extend(operations)
+        state["last_edit"] = monotonic()
+        state["condition"].notify_all()
+
+def flush_autosave(state:dict=None) -> bool:
+    """
+    Saves queued edits without waiting for the delay, and waits for them to be written.
+
+    :param state: Autosave state as returned by start_autosave, defaults to None
+    :type state: dict, optional
+    :return: Whether all edits were saved
+    :rtype: bool
+    """
+    condition = state["condition"]
+    with condition:
+        state["flush"] = True
+        state["failed"] = False
+        condition.notify_all()
+        while ((len(state["pending"]) > 0 or state["writing"])
+                    and not state["failed"] and state["thread"].is_alive()):
+            condition.wait(0.1)
+        state["flush"] = False
+        return len(state["pending"]) == 0 and not state["failed"]
+
+def stop_autosave(state:dict=None) -> bool:
+    """
+    Saves queued edits and stops the autosave worker.
+
+    :param state: Autosave state as returned by start_autosave, defaults to None
+    :type state: dict, optional
+    :return: Whether all edits were saved
+    :rtype: bool
+    """
+    saved = flush_autosave(state)
+    with state["condition"]:
+        state["stop"] = True
+        state["condition"].notify_all()
+    state["thread"].join()
+    return saved
@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+
+from argparse import ArgumentParser
+from base64 import standard_b64decode as b64decode
+from base64 import standard_b64encode as b64encode
+from json import dumps
+from os import makedirs, pardir, urandom
+from os.path import abspath, getsize, join
+from random import Random
+from sys import exit
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from tracemalloc import get_traced_memory, reset_peak, start, stop
+from typing import Callable
+from vn_organizer.blob_store import get_blob_directory
+from vn_organizer.blob_store import get_stored_size
+from vn_organizer.blob_store import get_tree_blobs
+from vn_organizer.blob_store import pack_saves
+from vn_organizer.blob_store import read_blob
+from vn_organizer.blob_store import write_blob
+from vn_organizer.nodes import to_nodes
+from vn_organizer.tree_format import iterencode_json
+from vn_organizer.tree_format import loads_json
+from vn_organizer.tree_index import build_index
+from vn_organizer.vn_organizer import add_item_to_dict
+from vn_organizer.vn_organizer import add_save_to_dict
+from vn_organizer.vn_organizer import b64_to_file
+from vn_organizer.vn_organizer import create_branch_in_dict
+from vn_organizer.vn_organizer import create_saves
+from vn_organizer.vn_organizer import file_to_b64
+from vn_organizer.vn_organizer import get_dict_from_path
+from vn_organizer.vn_organizer import get_dict_print
+from vn_organizer.vn_organizer import get_empty_branch_dict
+from vn_organizer.vn_organizer import get_saves_from_dict
+from vn_organizer.vn_organizer import is_complete
+from vn_organizer.vn_organizer import read_tree
+from vn_organizer.vn_organizer import set_dict_from_path
+from vn_organizer.vn_organizer import write_b64
+from vn_organizer.vn_organizer import write_tree
+
+def legacy_file_to_b64(file:str) -> str:
+    """
+    Original version of file_to_b64, kept for comparison.
+    """
+    with open(file, "rb") as f:
+        ba = bytearray(f.read())
+        data = str(b64encode(ba))
+    # Remove Extraneous characters
+    while data.startswith("b'"):
+        data = data[2:]
+    while data.endswith("'"):
+        data = data[:len(data)-1]
+    return data
+
+def legacy_b64_to_file(b64:str, file:str):
+    """
+    Original version of b64_to_file, kept for comparison.
+    """
+    ba = bytearray(b64decode(b64))
+    with open(file, "wb") as f:
+        f.write(ba)
+
+def measure(function:Callable, *args, setup:Callable=None) -> dict:
+    """
+    Measures the wall time and peak memory allocated while running a function.
+    The function is run twice, once for timing and once with memory tracing,
+    so tracing overhead doesn't affect the time.
+
+    :param function: Function to run
+    :type function: Callable
+    :param setup: Function to run before each run of the measured function, defaults to None
+    :type setup: Callable, optional
+    :return: Dict with "time" in seconds, "peak_memory" in bytes, and the function's "result"
+    :rtype: dict
+    """
+    # Measure wall time
+    if setup is not None:
+        setup()
+    start_time = perf_counter()
+    result = function(*args)
+    end_time = perf_counter()
+    # Measure peak memory
+    if setup is not None:
+        setup()
+    start()
+    reset_peak()
+    function(*args)
+    peak = get_traced_memory()[1]
+    stop()
+    return {"time":end_time - start_time, "peak_memory":peak, "result":result}
+
+def benchmark_b64(size:int=None) -> dict:
+    """
+    Compares the streaming base64 functions with the original versions on a random file.
+
+    :param size: Size of the file to encode in bytes, defaults to None
+    :type size: int, optional
+    :return: Measurements for each function
+    :rtype: dict
+    """
+    results = dict()
+    with TemporaryDirectory() as temp_dir:
+        file = abspath(join(temp_dir, "1-1-LT1.save"))
+        with open(file, "wb") as out_file:
+            out_file.write(urandom(size))
+        b64 = file_to_b64(file)
+        out = abspath(join(temp_dir, "out.save"))
+        results["legacy_file_to_b64"] = measure(legacy_file_to_b64, file)
+        results["file_to_b64"] = measure(file_to_b64, file)
+        with open(abspath(join(temp_dir, "out.json")), "w") as json_file:
+            results["write_b64"] = measure(write_b64, file, json_file)
+        results["legacy_b64_to_file"] = measure(legacy_b64_to_file, b64, out)
+        results["b64_to_file"] = measure(b64_to_file, b64, out)
+    # Only keep the measurements
+    for key in results:
+        results[key].pop("result")
+    return results
+
+def generate_tree(blob_dir:str=None,
+            depth:int=3,
+            branching:int=2,
+            items:int=2,
+            save_size:int=1024,
+            completion:float=0.5,
+            seed:int=0) -> dict:
+    """
+    Generates a synthetic branch dict for benchmarking.
+    Every branch above the given depth splits into the given number of responses.
+    Items alternate between saves and events, with each save holding unique random bytes.
+
+    :param blob_dir: Blob directory to store the generated saves in, defaults to None
+    :type blob_dir: str, optional
+    :param depth: Number of branch splits from the root to each ending, defaults to 3
+    :type depth: int, optional
+    :param branching: Number of responses at each split, defaults to 2
+    :type branching: int, optional
+    :param items: Number of items in each branch, defaults to 2
+    :type items: int, optional
+    :param save_size: Size of each save in bytes, defaults to 1024
+    :type save_size: int, optional
+    :param completion: Fraction of endings marked as complete, defaults to 0.5
+    :type completion: float, optional
+    :param seed: Seed for the random generator, defaults to 0
+    :type seed: int, optional
+    :return: Generated branch dict
+    :rtype: dict
+    """
+    generator = Random(seed)
+    root = get_empty_branch_dict()
+    stack = [(root, 0)]
+    while len(stack) > 0:
+        cur_dict, level = stack.pop()
+        # Add items to the branch
+        for i in range(0, items):
+            if i % 2 == 0:
+                data = generator.getrandbits(save_size * 8).to_bytes(save_size, "little")
+                add_save_to_dict(cur_dict, write_blob(blob_dir, data))
+            else:
+                add_item_to_dict(cur_dict, "c", f"Event {level}-{i}")
+        # Mark endings as complete or split into more branches
+        if level == depth:
+            cur_dict["end"] = generator.random() < completion
+            continue
+        responses = []
+        for i in range(0, branching):
+            responses.append(f"Response {i+1}")
+        create_branch_in_dict(cur_dict, f"Prompt {level+1}", responses)
+        for branch in cur_dict["branch"]:
+            stack.append((branch, level+1))
+    return root
+
+def benchmark_tree(file:str=None, **parameters) -> dict:
+    """
+    Measures the main tree functions on a generated tree.
+    Parameters are passed on to generate_tree.
+
+    :param file: Path of the tree file to write and read, defaults to None
+    :type file: str, optional
+    :return: Measurements for each function along with the size of the tree
+    :rtype: dict
+    """
+    results = dict()
+    save_dir = abspath(join(file, pardir, "saves"))
+    makedirs(save_dir, exist_ok=True)
+    blob_dir = get_blob_directory(file)
+    branch_dict = generate_tree(blob_dir, **parameters)
+    # Get the path of the deepest branch along the first responses
+    path = []
+    cur_dict = branch_dict
+    while len(cur_dict["branch"]) > 0:
+        path.append(0)
+        cur_dict = cur_dict["branch"][0]
+    # Measure reading and writing the tree file
+    results["write_tree"] = measure(write_tree, file, branch_dict, save_dir, None, None)
+    results["read_tree"] = measure(read_tree, file)
+    # Measure the functions for reading the tree
+    results["is_complete"] = measure(is_complete, branch_dict)
+    results["get_dict_print"] = measure(get_dict_print, branch_dict, [])
+    results["get_dict_from_path"] = measure(get_dict_from_path, branch_dict, path)
+    results["set_dict_from_path"] = measure(set_dict_from_path, branch_dict, cur_dict, path)
+    # Measure writing saves into an empty save directory
+    def clear_saves():
+        create_saves([], save_dir, None, blob_dir)
+    saves = get_saves_from_dict(cur_dict)
+    results["create_saves"] = measure(create_saves, saves, save_dir, None, blob_dir, setup=clear_saves)
+    # Only keep the measurements
+    for key in results:
+        results[key].pop("result")
+    results["memory"] = benchmark_nodes(branch_dict)
+    results["nodes"] = len(build_index(branch_dict)["nodes"])
+    results["file_size"] = getsize(file)
+    results["blob_size"] = 0
+    for blob_hash in get_tree_blobs(branch_dict):
+        results["blob_size"] += get_stored_size(blob_dir, blob_hash)
+    return results
+
+def benchmark_nodes(branch_dict:dict=None) -> dict:
+    """
+    Compares the memory used by a tree held as branch dicts and as BranchNode objects.
+
+    :param branch_dict: Tree to measure, defaults to None
+    :type branch_dict: dict, optional
+    :return: Memory in bytes held by each representation after loading
+    :rtype: dict
+    """
+    text = "".join(iterencode_json(branch_dict, None))
+    results = dict()
+    # Measure the tree as dicts
+    start()
+    tree = loads_json(text)
+    results["dict_memory"] = get_traced_memory()[0]
+    del tree
+    stop()
+    # Measure the tree as nodes, once the dicts used for loading are freed
+    start()
+    tree = to_nodes(loads_json(text))
+    results["node_memory"] = get_traced_memory()[0]
+    del tree
+    stop()
+    results["ratio"] = results["node_memory"] / results["dict_memory"]
+    return results
+
+def generate_chain(blob_dir:str=None, length:int=50000, save_size:int=64) -> dict:
+    """
+    Generates a branch dict for a single long route, where every branch has one response leading to the next.
+    Each branch holds a save and an event, and the last branch is marked as the end.
+
+    :param blob_dir: Blob directory to store the generated saves in, defaults to None
+    :type blob_dir: str, optional
+    :param length: Number of prompts along the route, defaults to 50000
+    :type length: int, optional
+    :param save_size: Size of each save in bytes, defaults to 64
+    :type save_size: int, optional
+    :return: Generated branch dict
+    :rtype: dict
+    """
+    generator = Random(length)
+    root = get_empty_branch_dict()
+    cur_dict = root
+    for i in range(0, length + 1):
+        data = generator.getrandbits(save_size * 8).to_bytes(save_size, "little")
+        add_save_to_dict(cur_dict, write_blob(blob_dir, data))
+        add_item_to_dict(cur_dict, "c", f"Event {i}")
+        if i == length:
+            cur_dict["end"] = True
+            break
+        create_branch_in_dict(cur_dict, f"Prompt {i+1}", ["Continue"])
+        cur_dict = cur_dict["branch"][0]
+    return root
+
+def benchmark_chain(file:str=None, length:int=50000, budget:float=60.0) -> dict:
+    """
+    Checks that a very deep route can be saved, loaded, rendered and checked for completion within a time budget.
+
+    :param file: Path of the tree file to write and read, defaults to None
+    :type file: str, optional
+    :param length: Number of prompts along the route, defaults to 50000
+    :type length: int, optional
+    :param budget: Maximum total time in seconds, defaults to 60.0
+    :type budget: float, optional
+    :return: Time taken by each step, the total time and whether it was within budget
+    :rtype: dict
+    """
+    results = dict()
+    path = [0] * length
+    start_time = perf_counter()
+    branch_dict = generate_chain(get_blob_directory(file), length)
+    results["generate"] = perf_counter() - start_time
+    # Save and load the tree
+    step_time = perf_counter()
+    write_tree(file, branch_dict, abspath(join(file, pardir)), None, None)
+    results["write_tree"] = perf_counter() - step_time
+    step_time = perf_counter()
+    tree_dict = read_tree(file)
+    branch_dict = tree_dict["tree"]
+    results["read_tree"] = perf_counter() - step_time
+    # Check completion and render the deepest branch
+    step_time = perf_counter()
+    complete = is_complete(branch_dict)
+    results["is_complete"] = perf_counter() - step_time
+    step_time = perf_counter()
+    text = get_dict_print(branch_dict, path)
+    results["get_dict_print"] = perf_counter() - step_time
+    results["total"] = perf_counter() - start_time
+    results["file_size"] = getsize(file)
+    results["within_budget"] = complete and len(text) > 0 and results["total"] <= budget
+    return results
+
+def generate_route(blob_dir:str=None, length:int=200, saves:int=4, save_size:int=65536, seed:int=0) -> dict:
+    """
+    Generates a branch dict for a single route with saves that change the way game saves do along a playthrough.
+    Each save holds a header with a counter and timestamp, a block of game variables where a few change between saves,
+    and a message log that grows with each save and drops its oldest lines once full, shifting the rest of the log.
+
+    :param blob_dir: Blob directory to store the generated saves in, defaults to None
+    :type blob_dir: str, optional
+    :param length: Number of prompts along the route, defaults to 200
+    :type length: int, optional
+    :param saves: Number of saves in each branch, defaults to 4
+    :type saves: int, optional
+    :param save_size: Approximate size of each save in bytes, defaults to 65536
+    :type save_size: int, optional
+    :param seed: Seed for the random generator, defaults to 0
+    :type seed: int, optional
+    :return: Generated branch dict
+    :rtype: dict
+    """
+    generator = Random(seed)
+    words = ["the", "door", "opens", "she", "smiles", "rain", "falls", "again", "you", "wait", "quietly", "night"]
+    variables = [generator.randrange(0, 100) for i in range(0, save_size // 8)]
+    log = []
+    log_size = 0
+    save_num = 0
+    root = get_empty_branch_dict()
+    cur_dict = root
+    for i in range(0, length + 1):
+        for j in range(0, saves):
+            # Change a few variables and add a line to the message log
+            save_num += 1
+            for k in range(0, generator.randrange(1, 9)):
+                variables[generator.randrange(0, len(variables))] = generator.randrange(0, 100)
+            line = f"{save_num}: " + " ".join([generator.choice(words) for k in range(0, 10)]) + "\n"
+            log.append(line.encode("utf-8"))
+            log_size += len(log[-1])
+            while log_size > save_size // 2:
+                log_size -= len(log.pop(0))
+            # Write the save
+            header = b"LT1\x00" + save_num.to_bytes(4, "little") + (1700000000 + save_num * 37).to_bytes(8, "little")
+            data = b"".join([value.to_bytes(4, "little") for value in variables])
+            add_save_to_dict(cur_dict, write_blob(blob_dir, header + data + log_size.to_bytes(4, "little") + b"".join(log)))
+        add_item_to_dict(cur_dict, "c", f"Event {i}")
+        if i == length:
+            cur_dict["end"] = True
+            break
+        create_branch_in_dict(cur_dict, f"Prompt {i+1}", ["Continue"])
+        cur_dict = cur_dict["branch"][0]
+    return root
+
+def benchmark_deltas(file:str=None, **parameters) -> dict:
+    """
+    Measures the space saved by storing the saves along a generated route as deltas, and the time to restore them.
+    Parameters are passed on to generate_route.
+
+    :param file: Path of the tree file the saves belong to, defaults to None
+    :type file: str, optional
+    :return: Sizes of the saves in full and as deltas, and measurements for packing and restoring them
+    :rtype: dict
+    """
+    results = dict()
+    save_dir = abspath(join(file, pardir, "saves"))
+    makedirs(save_dir, exist_ok=True)
+    blob_dir = get_blob_directory(file)
+    branch_dict = generate_route(blob_dir, **parameters)
+    hashes = get_tree_blobs(branch_dict)
+    # Get the saves in the last branch, which are furthest from a full save
+    cur_dict = branch_dict
+    while len(cur_dict["branch"]) > 0:
+        cur_dict = cur_dict["branch"][0]
+    saves = get_saves_from_dict(cur_dict)
+    def read_saves():
+        for blob_hash in hashes:
+            read_blob(blob_dir, blob_hash)
+    def clear_saves():
+        create_saves([], save_dir, None, blob_dir)
+    # Measure restoring the saves in full
+    results["saves"] = len(hashes)
+    results["full_size"] = sum([get_stored_size(blob_dir, blob_hash) for blob_hash in hashes])
+    results["read_full"] = measure(read_saves)
+    results["create_saves_full"] = measure(create_saves, saves, save_dir, None, blob_dir, setup=clear_saves)
+    # Store the saves as deltas and measure restoring them again
+    start_time = perf_counter()
+    results["packed"] = pack_saves(branch_dict, blob_dir)
+    results["pack_time"] = perf_counter() - start_time
+    results["packed_size"] = sum([get_stored_size(blob_dir, blob_hash) for blob_hash in hashes])
+    results["ratio"] = results["packed_size"] / results["full_size"]
+    results["read_packed"] = measure(read_saves)
+    results["create_saves_packed"] = measure(create_saves, saves, save_dir, None, blob_dir, setup=clear_saves)
+    # Only keep the measurements
+    for key in ["read_full", "create_saves_full", "read_packed", "create_saves_packed"]:
+        results[key].pop("result")
+    return results
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument(
+            "--depth",
+            help="Number of branch splits from the root to each ending.",
+            type=int,
+            default=6)
+    parser.add_argument(
+            "--branching",
+            help="Number of responses at each branch split.",
+            type=int,
+            default=3)
+    parser.add_argument(
+            "--items",
+            help="Number of items in each branch, alternating between saves and events.",
+            type=int,
+            default=4)
+    parser.add_argument(
+            "--save-size",
+            help="Size of each generated save, in bytes.",
+            type=int,
+            default=4096)
+    parser.add_argument(
+            "--completion",
+            help="Fraction of endings marked as complete.",
+            type=float,
+            default=0.5)
+    parser.add_argument(
+            "--seed",
+            help="Seed for generating the tree.",
+            type=int,
+            default=0)
+    parser.add_argument(
+            "--format",
+            help="Format of the tree file.",
+            choices=["json", "vno"],
+            default="json")
+    parser.add_argument(
+            "--b64-size",
+            help="Size of the save file used in the base64 benchmark, in bytes.",
+            type=int,
+            default=8388608)
+    parser.add_argument(
+            "--chain",
+            help="Length of the deep route used to check for recursion limits.",
+            type=int,
+            default=50000)
+    parser.add_argument(
+            "--budget",
+            help="Time budget for the deep route check, in seconds.",
+            type=float,
+            default=60.0)
+    parser.add_argument(
+            "--route",
+            help="Length of the route used to measure storing saves as deltas.",
+            type=int,
+            default=200)
+    parser.add_argument(
+            "--route-save-size",
+            help="Approximate size of each save along the route, in bytes.",
+            type=int,
+            default=65536)
+    parser.add_argument(
+            "-o",
+            "--output",
+            help="JSON file to write the results to, printed if not given.",
+            type=str)
+    args = parser.parse_args()
+    # Run the benchmarks
+    parameters = {"depth":args.depth,
+                "branching":args.branching,
+                "items":args.items,
+                "save_size":args.save_size,
+                "completion":args.completion,
+                "seed":args.seed}
+    results = {"parameters":dict(parameters)}
+    results["parameters"]["format"] = args.format
+    with TemporaryDirectory() as temp_dir:
+        file = abspath(join(temp_dir, "tree." + args.format))
+        results["tree"] = benchmark_tree(file, **parameters)
+    with TemporaryDirectory() as temp_dir:
+        file = abspath(join(temp_dir, "chain." + args.format))
+        results["chain"] = benchmark_chain(file, args.chain, args.budget)
+    with TemporaryDirectory() as temp_dir:
+        file = abspath(join(temp_dir, "route." + args.format))
+        results["deltas"] = benchmark_deltas(file, length=args.route, save_size=args.route_save_size, seed=args.seed)
+    results["b64"] = benchmark_b64(args.b64_size)
+    # Write the results
+    text = dumps(results, indent=4)
+    if args.output is None:
+        print(text)
+    else:
+        with open(abspath(args.output), "w") as out_file:
+            out_file.write(text)
+    # Fail if the deep route went over its time budget
+    return 0 if results["chain"]["within_budget"] else 1
+
+if __name__ == "__main__":
+    exit(main())
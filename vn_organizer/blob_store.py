@@ -0,0 +1,611 @@
+#!/usr/bin/env python3
+
+from base64 import standard_b64decode as b64decode
+from binascii import Error as binerror
+from os import makedirs, remove, replace, scandir, stat
+from os.path import abspath, exists, getsize, join
+from struct import calcsize, pack, unpack
+from struct import error as structerror
+from time import time_ns
+from typing import List, Set, Tuple
+from zlib import compressobj, decompressobj
+from zlib import error as zliberror
+
+# Bytes read at a time when hashing files
+HASH_CHUNK_SIZE = 1048576
+
+# Nanoseconds after a file is modified during which its modification time isn't trusted to detect changes
+RACY_WINDOW = 2000000000
+
+# Modification time, size, and blob hash of files stored with cached_file_to_blob, keyed by file path
+FILE_BLOB_CACHE = dict()
+
+# Extension added to the file path of blobs stored as a delta against another blob
+DELTA_EXTENSION = ".delta"
+
+# Header of delta blobs, with the hash of the base blob, the size of the blob, and the number of chunks
+DELTA_HEADER = "<32sQI"
+
+# Header of each chunk in a delta blob, with its compressed size
+DELTA_CHUNK = "<I"
+
+# Bytes of a blob compressed at a time in a delta, and bytes of the base blob around each chunk used as its dictionary
+DELTA_CHUNK_SIZE = 8192
+DELTA_WINDOW = 24576
+
+# Maximum number of deltas between a blob and the full blob its chain starts from, blobs past it are kept in full
+MAX_DELTA_CHAIN = 8
+
+# Largest size of a delta relative to the full blob for the blob to be stored as a delta
+DELTA_RATIO = 0.5
+
+def get_blob_directory(file:str=None) -> str:
+    """
+    Returns the directory used for storing save blobs for a given tree file.
+    The blob directory sits next to the tree file with ".blobs" appended to the name.
+
+    :param file: Path of the tree file, defaults to None
+    :type file: str, optional
+    :return: Path of the blob directory
+    :rtype: str
+    """
+    try:
+        return abspath(file) + ".blobs"
+    except TypeError:
+        return None
+
+def get_blob_hash(data:bytes=None) -> str:
+    """
+    Returns the content hash used as the key for a blob.
+
+    :param data: Raw bytes of the blob, defaults to None
+    :type data: bytes, optional
+    :return: Hexadecimal SHA-256 hash of the data
+    :rtype: str
+    """
+    # Hashing is only loaded once a blob is first hashed, so it doesn't slow down startup
+    from hashlib import sha256
+    try:
+        return sha256(data).hexdigest()
+    except TypeError:
+        return None
+
+def get_blob_path(blob_dir:str=None, blob_hash:str=None) -> str:
+    """
+    Returns the file path of a blob with the given hash.
+    Blobs are split into sub-directories by the first two characters of the hash.
+
+    :param blob_dir: Blob directory, defaults to None
+    :type blob_dir: str, optional
+    :param blob_hash: Hash of the blob, defaults to None
+    :type blob_hash: str, optional
+    :return: Path of the blob file
+    :rtype: str
+    """
+    try:
+        return abspath(join(blob_dir, blob_hash[:2], blob_hash))
+    except TypeError:
+        return None
+
+def has_blob(blob_dir:str=None, blob_hash:str=None) -> bool:
+    """
+    Returns whether a blob with the given hash exists in the blob directory.
+
+    :param blob_dir: Blob directory, defaults to None
+    :type blob_dir: str, optional
+    :param blob_hash: Hash of the blob, defaults to None
+    :type blob_hash: str, optional
+    :return: Whether the blob exists
+    :rtype: bool
+    """
+    blob_file = get_blob_path(blob_dir, blob_hash)
+    return blob_file is not None and (exists(blob_file) or exists(blob_file + DELTA_EXTENSION))
+
+def write_blob(blob_dir:str=None, data:bytes=None) -> str:
+    """
+    Writes raw bytes to the blob directory and returns the hash used to reference them.
+    Data already present in the blob directory, in full or as a delta, is not written a second time.
+
+    :param blob_dir: Blob directory, defaults to None
+    :type blob_dir: str, optional
+    :param data: Raw bytes to store, defaults to None
+    :type data: bytes, optional
+    :return: Hash of the stored blob
+    :rtype: str
+    """
+    try:
+        # Skip writing if the blob is already stored
+        blob_hash = get_blob_hash(data)
+        blob_file = get_blob_path(blob_dir, blob_hash)
+        if has_blob(blob_dir, blob_hash):
+            return blob_hash
+        # Write to a temporary file and rename so partial blobs are never stored
+        makedirs(abspath(join(blob_file, "..")), exist_ok=True)
+        temp_file = blob_file + ".tmp"
+        with open(temp_file, "wb") as out_file:
+            out_file.write(data)
+        replace(temp_file, blob_file)
+        return blob_hash
+    except (FileNotFoundError, TypeError):
+        return None
+
+def get_delta_window(offset:int=None, base_size:int=None) -> int:
+    """
+    Returns where the part of the base blob used as the dictionary for a chunk of a delta starts.
+    The dictionary covers the same part of the base blob as the chunk, and some of the data on either side of it,
+    so data that moved a little between the base and the blob is still found.
+
+    :param offset: Offset of the chunk in the blob, defaults to None
+    :type offset: int, optional
+    :param base_size: Size of the base blob, defaults to None
+    :type base_size: int, optional
+    :return: Offset of the dictionary in the base blob
+    :rtype: int
+    """
+    return max(min(offset - (DELTA_WINDOW - DELTA_CHUNK_SIZE) // 2, base_size - DELTA_WINDOW), 0)
+
+def encode_delta(base:bytes=None, data:bytes=None) -> List[bytes]:
+    """
+    Returns data encoded as a delta against a base blob.
+    The data is compressed in chunks, each using the part of the base blob around it as a preset dictionary,
+    so parts that match the base blob take up almost no space.
+
+    :param base: Raw bytes of the base blob, defaults to None
+    :type base: bytes, optional
+    :param data: Raw bytes to encode, defaults to None
+    :type data: bytes, optional
+    :return: Compressed chunks
+    :rtype: list[bytes]
+    """
+    chunks = []
+    view = memoryview(base)
+    for offset in range(0, len(data), DELTA_CHUNK_SIZE):
+        start = get_delta_window(offset, len(base))
+        compressor = compressobj(zdict=view[start:start+DELTA_WINDOW])
+        chunks.append(compressor.compress(data[offset:offset+DELTA_CHUNK_SIZE]) + compressor.flush())
+    return chunks
+
+def decode_delta(base:bytes=None, chunks:List[bytes]=None) -> bytes:
+    """
+    Returns the data encoded as a delta by encode_delta.
+
+    :param base: Raw bytes of the base blob, defaults to None
+    :type base: bytes, optional
+    :param chunks: Compressed chunks, defaults to None
+    :type chunks: list[bytes], optional
+    :return: Decoded data
+    :rtype: bytes
+    """
+    parts = []
+    view = memoryview(base)
+    for i in range(0, len(chunks)):
+        start = get_delta_window(i * DELTA_CHUNK_SIZE, len(base))
+        decompressor = decompressobj(zdict=view[start:start+DELTA_WINDOW])
+        parts.append(decompressor.decompress(chunks[i]) + decompressor.flush())
+    return b"".join(parts)
+
+def read_delta(blob_dir:str=None, blob_hash:str=None) -> Tuple[str, int, List[bytes]]:
+    """
+    Reads a blob stored as a delta from the blob directory, without decoding it.
+
+    :param blob_dir: Blob directory, defaults to None
+    :type blob_dir: str, optional
+    :param blob_hash: Hash of the blob, defaults to None
+    :type blob_hash: str, optional
+    :return: Hash of the base blob, size of the blob, and compressed chunks, None if there is no delta for the blob
+    :rtype: tuple[str, int, list[bytes]]
+    """
+    try:
+        with open(get_blob_path(blob_dir, blob_hash) + DELTA_EXTENSION, "rb") as in_file:
+            raw_hash, size, num_chunks = unpack(DELTA_HEADER, in_file.read(calcsize(DELTA_HEADER)))
+            chunks = []
+            for i in range(0, num_chunks):
+                chunk_size = unpack(DELTA_CHUNK, in_file.read(calcsize(DELTA_CHUNK)))[0]
+                chunks.append(in_file.read(chunk_size))
+        return raw_hash.hex(), size, chunks
+    except (FileNotFoundError, TypeError, structerror):
+        return None
+
+def get_delta_chain(blob_dir:str=None, blob_hash:str=None) -> List[str]:
+    """
+    Returns the hashes of the blobs needed to read a blob, from the blob itself to the full blob its deltas start from.
+    Only the headers of delta blobs are read.
+
+    :param blob_dir: Blob directory, defaults to None
+    :type blob_dir: str, optional
+    :param blob_hash: Hash of the blob, defaults to None
+    :type blob_hash: str, optional
+    :return: List of blob hashes, None if a blob in the chain is missing
+    :rtype: list[str]
+    """
+    try:
+        chain = [blob_hash]
+        while not exists(get_blob_path(blob_dir, chain[-1])):
+            with open(get_blob_path(blob_dir, chain[-1]) + DELTA_EXTENSION, "rb") as in_file:
+                chain.append(unpack(DELTA_HEADER, in_file.read(calcsize(DELTA_HEADER)))[0].hex())
+        return chain
+    except (FileNotFoundError, TypeError, structerror):
+        return None
+
+def get_delta_bases(blob_dir:str=None) -> Set[str]:
+    """
+    Returns the hashes of every blob a delta in the blob directory is stored against.
+    This includes deltas of saves no longer in the tree, as they still need their base to be read.
+    Only the headers of delta blobs are read.
+
+    :param blob_dir: Blob directory, defaults to None
+    :type blob_dir: str, optional
+    :return: Hashes of the base blobs
+    :rtype: set[str]
+    """
+    bases = set()
+    try:
+        with scandir(blob_dir) as directories:
+            for directory in directories:
+                if not directory.is_dir():
+                    continue
+                with scandir(directory.path) as entries:
+                    for entry in entries:
+                        if not entry.name.endswith(DELTA_EXTENSION):
+                            continue
+                        with open(entry.path, "rb") as in_file:
+                            bases.add(unpack(DELTA_HEADER, in_file.read(calcsize(DELTA_HEADER)))[0].hex())
+    except (FileNotFoundError, TypeError, structerror):
+        pass
+    return bases
+
+def get_blob_size(blob_dir:str=None, blob_hash:str=None) -> int:
+    """
+    Returns the size of the raw bytes of a blob, without decoding blobs stored as deltas.
+
+    :param blob_dir: Blob directory, defaults to None
+    :type blob_dir: str, optional
+    :param blob_hash: Hash of the blob, defaults to None
+    :type blob_hash: str, optional
+    :return: Size of the blob in bytes, None if the blob doesn't exist
+    :rtype: int
+    """
+    try:
+        blob_file = get_blob_path(blob_dir, blob_hash)
+        if exists(blob_file):
+            return getsize(blob_file)
+        with open(blob_file + DELTA_EXTENSION, "rb") as in_file:
+            return unpack(DELTA_HEADER, in_file.read(calcsize(DELTA_HEADER)))[1]
+    except (FileNotFoundError, TypeError, structerror):
+        return None
+
+def get_stored_size(blob_dir:str=None, blob_hash:str=None) -> int:
+    """
+    Returns the number of bytes a blob takes up in the blob directory, in full or as a delta.
+
+    :param blob_dir: Blob directory, defaults to None
+    :type blob_dir: str, optional
+    :param blob_hash: Hash of the blob, defaults to None
+    :type blob_hash: str, optional
+    :return: Size of the stored blob in bytes, None if the blob doesn't exist
+    :rtype: int
+    """
+    try:
+        blob_file = get_blob_path(blob_dir, blob_hash)
+        if exists(blob_file):
+            return getsize(blob_file)
+        return getsize(blob_file + DELTA_EXTENSION)
+    except (FileNotFoundError, TypeError):
+        return None
+
+def read_blob(blob_dir:str=None, blob_hash:str=None) -> bytes:
+    """
+    Reads the raw bytes of a blob from the blob directory.
+    Blobs stored as deltas are decoded starting from the full blob their chain of deltas starts from.
+
+    :param blob_dir: Blob directory, defaults to None
+    :type blob_dir: str, optional
+    :param blob_hash: Hash of the blob, defaults to None
+    :type blob_hash: str, optional
+    :return: Raw bytes of the blob, None if the blob doesn't exist
+    :rtype: bytes
+    """
+    try:
+        with open(get_blob_path(blob_dir, blob_hash), "rb") as in_file:
+            return in_file.read()
+    except FileNotFoundError:
+        pass
+    except TypeError:
+        return None
+    try:
+        # Read the deltas down to the full blob, then apply them in reverse
+        chain = get_delta_chain(blob_dir, blob_hash)
+        with open(get_blob_path(blob_dir, chain[-1]), "rb") as in_file:
+            data = in_file.read()
+        for cur_hash in reversed(chain[:-1]):
+            data = decode_delta(data, read_delta(blob_dir, cur_hash)[2])
+        return data
+    except (FileNotFoundError, TypeError, zliberror):
+        return None
+
+def store_delta(blob_dir:str=None, blob_hash:str=None, base_hash:str=None) -> bool:
+    """
+    Stores a full blob as a delta against another blob, removing the full blob once the delta is written.
+    The blob is kept in full if the delta isn't at most DELTA_RATIO of its size, or if the base blob
+    already has MAX_DELTA_CHAIN deltas before a full blob, so reading a blob never needs more deltas than that.
+    The delta is decoded and checked against the hash of the blob before the full blob is removed.
+
+    :param blob_dir: Blob directory, defaults to None
+    :type blob_dir: str, optional
+    :param blob_hash: Hash of the blob to store as a delta, defaults to None
+    :type blob_hash: str, optional
+    :param base_hash: Hash of the blob to store the delta against, defaults to None
+    :type base_hash: str, optional
+    :return: Whether the blob was stored as a delta
+    :rtype: bool
+    """
+    try:
+        # Check that the chain of the base blob has room and doesn't depend on the blob
+        blob_file = get_blob_path(blob_dir, blob_hash)
+        chain = get_delta_chain(blob_dir, base_hash)
+        if not exists(blob_file) or chain is None or blob_hash in chain or len(chain) > MAX_DELTA_CHAIN:
+            return False
+        with open(blob_file, "rb") as in_file:
+            data = in_file.read()
+        base = read_blob(blob_dir, base_hash)
+        if len(base) == 0:
+            return False
+        # Encode the delta, keeping the full blob if the delta doesn't save enough space
+        chunks = encode_delta(base, data)
+        size = calcsize(DELTA_HEADER) + sum([calcsize(DELTA_CHUNK) + len(chunk) for chunk in chunks])
+        if size > len(data) * DELTA_RATIO or not get_blob_hash(decode_delta(base, chunks)) == blob_hash:
+            return False
+        # Write the delta and remove the full blob
+        temp_file = blob_file + DELTA_EXTENSION + ".tmp"
+        with open(temp_file, "wb") as out_file:
+            out_file.write(pack(DELTA_HEADER, bytes.fromhex(base_hash), len(data), len(chunks)))
+            for chunk in chunks:
+                out_file.write(pack(DELTA_CHUNK, len(chunk)))
+                out_file.write(chunk)
+        replace(temp_file, blob_file + DELTA_EXTENSION)
+        remove(blob_file)
+        return True
+    except (FileNotFoundError, TypeError, ValueError, zliberror):
+        return False
+
+def file_to_blob(blob_dir:str=None, file:str=None) -> str:
+    """
+    Stores the contents of a file in the blob directory.
+
+    :param blob_dir: Blob directory, defaults to None
+    :type blob_dir: str, optional
+    :param file: File to store, defaults to None
+    :type file: str, optional
+    :return: Hash of the stored blob
+    :rtype: str
+    """
+    try:
+        with open(abspath(file), "rb") as in_file:
+            data = in_file.read()
+        return write_blob(blob_dir, data)
+    except (FileNotFoundError, TypeError):
+        return None
+
+def cached_file_to_blob(blob_dir:str=None, file:str=None) -> str:
+    """
+    Stores the contents of a file in the blob directory, skipping files that haven't changed since they were last stored.
+    Files are considered unchanged if their modification time and size match the last time they were stored,
+    so unchanged files aren't read at all.
+
+    :param blob_dir: Blob directory, defaults to None
+    :type blob_dir: str, optional
+    :param file: File to store, defaults to None
+    :type file: str, optional
+    :return: Hash of the stored blob
+    :rtype: str
+    """
+    try:
+        # Return the cached hash if the file is unchanged
+        full_file = abspath(file)
+        file_stat = stat(full_file)
+        key = (file_stat.st_mtime_ns, file_stat.st_size)
+        cached = FILE_BLOB_CACHE.get(full_file)
+        if cached is not None and cached[0] == key and has_blob(blob_dir, cached[1]):
+            return cached[1]
+        # Store the file, only caching it if it wasn't modified too recently to be sure it's unchanged
+        blob_hash = file_to_blob(blob_dir, full_file)
+        FILE_BLOB_CACHE.pop(full_file, None)
+        if blob_hash is not None and time_ns() - file_stat.st_mtime_ns > RACY_WINDOW:
+            FILE_BLOB_CACHE[full_file] = (key, blob_hash)
+        return blob_hash
+    except (FileNotFoundError, TypeError):
+        return None
+
+def copy_blobs(blob_dir:str=None, new_blob_dir:str=None, blob_hashes:List[str]=None) -> int:
+    """
+    Copies blobs from one blob directory to another, skipping blobs the other directory already holds.
+
+    :param blob_dir: Blob directory to copy from, defaults to None
+    :type blob_dir: str, optional
+    :param new_blob_dir: Blob directory to copy to, defaults to None
+    :type new_blob_dir: str, optional
+    :param blob_hashes: Hashes of the blobs to copy, defaults to None
+    :type blob_hashes: list[str], optional
+    :return: Number of blobs copied
+    :rtype: int
+    """
+    copied = 0
+    if blob_dir == new_blob_dir:
+        return copied
+    for blob_hash in blob_hashes:
+        if has_blob(new_blob_dir, blob_hash):
+            continue
+        data = read_blob(blob_dir, blob_hash)
+        if data is not None and write_blob(new_blob_dir, data) is not None:
+            copied += 1
+    return copied
+
+def get_file_hash(file:str=None) -> str:
+    """
+    Returns the content hash of a file, as used for blobs in the blob directory.
+    The file is read in chunks rather than all at once.
+
+    :param file: File to hash, defaults to None
+    :type file: str, optional
+    :return: Hexadecimal SHA-256 hash of the file contents, None if the file can't be read
+    :rtype: str
+    """
+    from hashlib import sha256
+    try:
+        file_hash = sha256()
+        with open(abspath(file), "rb") as in_file:
+            while True:
+                chunk = in_file.read(HASH_CHUNK_SIZE)
+                if len(chunk) == 0:
+                    break
+                file_hash.update(chunk)
+        return file_hash.hexdigest()
+    except (FileNotFoundError, IsADirectoryError, TypeError):
+        return None
+
+def blob_to_file(blob_dir:str=None, blob_hash:str=None, file:str=None) -> bool:
+    """
+    Writes the contents of a blob to the given file.
+    The blob is copied to a temporary file first and renamed, so the file is never left partially written.
+    Full blobs are copied directly, while blobs stored as deltas are decoded first.
+
+    :param blob_dir: Blob directory, defaults to None
+    :type blob_dir: str, optional
+    :param blob_hash: Hash of the blob, defaults to None
+    :type blob_hash: str, optional
+    :param file: File to write to, defaults to None
+    :type file: str, optional
+    :return: Whether the file was written
+    :rtype: bool
+    """
+    try:
+        temp_file = abspath(file) + ".tmp"
+        blob_file = get_blob_path(blob_dir, blob_hash)
+        if exists(blob_file):
+            from shutil import copyfile
+            copyfile(blob_file, temp_file)
+        else:
+            data = read_blob(blob_dir, blob_hash)
+            if data is None:
+                return False
+            with open(temp_file, "wb") as out_file:
+                out_file.write(data)
+        replace(temp_file, abspath(file))
+        return True
+    except (FileNotFoundError, TypeError):
+        return False
+
+def update_file_from_blob(blob_dir:str=None, blob_hash:str=None, file:str=None) -> bool:
+    """
+    Writes the contents of a blob to the given file, unless the file already holds the same data.
+    Files are compared by size first, so only files of the same size as the blob are hashed.
+
+    :param blob_dir: Blob directory, defaults to None
+    :type blob_dir: str, optional
+    :param blob_hash: Hash of the blob, defaults to None
+    :type blob_hash: str, optional
+    :param file: File to write to, defaults to None
+    :type file: str, optional
+    :return: Whether the file was written
+    :rtype: bool
+    """
+    try:
+        if (exists(file) and getsize(file) == get_blob_size(blob_dir, blob_hash)
+                    and get_file_hash(file) == blob_hash):
+            return False
+        return blob_to_file(blob_dir, blob_hash, file)
+    except (FileNotFoundError, TypeError):
+        return False
+
+def migrate_inline_saves(branch_dict:dict=None, blob_dir:str=None) -> int:
+    """
+    Moves saves stored inline as base64 text into the blob directory.
+    Save items in the tree are replaced with items that only hold the hash of the blob.
+
+    :param branch_dict: Branch dict to migrate, defaults to None
+    :type branch_dict: dict, optional
+    :param blob_dir: Blob directory to store saves in, defaults to None
+    :type blob_dir: str, optional
+    :return: Number of save items migrated
+    :rtype: int
+    """
+    try:
+        migrated = 0
+        stack = [branch_dict]
+        while len(stack) > 0:
+            cur_dict = stack.pop()
+            item_list = cur_dict["item_list"]
+            for i in range(0, len(item_list)):
+                item = item_list[i]
+                if not item["type"] == "s" or "hash" in item:
+                    continue
+                # Decode the inline save and store it as a blob
+                blob_hash = write_blob(blob_dir, b64decode(item["text"]))
+                if blob_hash is not None:
+                    item_list[i] = {"type":"s", "hash":blob_hash}
+                    migrated += 1
+            stack.extend(cur_dict["branch"])
+        return migrated
+    except (binerror, KeyError, TypeError):
+        return 0
+
+def get_tree_blobs(branch_dict:dict=None) -> List[str]:
+    """
+    Returns the hashes of every save blob referenced in a branch dict.
+
+    :param branch_dict: Branch dict to search, defaults to None
+    :type branch_dict: dict, optional
+    :return: List of unique blob hashes
+    :rtype: list[str]
+    """
+    try:
+        hashes = dict()
+        stack = [branch_dict]
+        while len(stack) > 0:
+            cur_dict = stack.pop()
+            for item in cur_dict["item_list"]:
+                if item["type"] == "s" and "hash" in item:
+                    hashes[item["hash"]] = None
+            stack.extend(cur_dict["branch"])
+        return list(hashes)
+    except (KeyError, TypeError):
+        return []
+
+def pack_saves(branch_dict:dict=None, blob_dir:str=None) -> int:
+    """
+    Stores the saves in a branch dict as deltas against the save before them on the same route.
+    The save before a save is the previous save in its branch, or the last save in the branches above it.
+    Saves other deltas are based on are kept in full, as are saves whose deltas wouldn't be small enough
+    and saves at the end of a full chain of deltas, which act as keyframes for the saves after them.
+
+    :param branch_dict: Branch dict to pack the saves of, defaults to None
+    :type branch_dict: dict, optional
+    :param blob_dir: Blob directory holding the saves, defaults to None
+    :type blob_dir: str, optional
+    :return: Number of saves stored as deltas
+    :rtype: int
+    """
+    try:
+        # Get the saves that existing deltas are based on, including deltas of saves no longer in the tree
+        bases = get_delta_bases(blob_dir)
+        # Visit each save once, along with the save before it on its route
+        packed = 0
+        visited = set()
+        stack = [(branch_dict, None)]
+        while len(stack) > 0:
+            cur_dict, base_hash = stack.pop()
+            for item in cur_dict["item_list"]:
+                if not item["type"] == "s" or "hash" not in item:
+                    continue
+                blob_hash = item["hash"]
+                if blob_hash not in visited and base_hash is not None and blob_hash not in bases:
+                    if store_delta(blob_dir, blob_hash, base_hash):
+                        bases.add(base_hash)
+                        packed += 1
+                visited.add(blob_hash)
+                base_hash = blob_hash
+            for branch in reversed(cur_dict["branch"]):
+                stack.append((branch, base_hash))
+        return packed
+    except (KeyError, TypeError):
+        return 0
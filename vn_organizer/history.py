@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+from collections import deque
+from vn_organizer.nodes import to_dicts
+from vn_organizer.tree_database import get_list_position
+from vn_organizer.vn_organizer import apply_operation
+from vn_organizer.vn_organizer import get_operation_dict
+
+# Maximum number of edits that can be undone
+HISTORY_LIMIT = 10000
+
+def get_empty_history() -> dict:
+    """
+    Returns an empty edit history for undoing and redoing edits.
+    Each entry holds an operation and its inverse operation, so only the parts of the tree an edit changed are stored.
+
+    :return: Dict with "undo" and "redo" keys
+    :rtype: dict
+    """
+    return {"undo":deque(maxlen=HISTORY_LIMIT), "redo":[]}
+
+def get_inverse_operation(tree_dict:dict=None, operation:dict=None, index:dict=None, node_id:int=None) -> dict:
+    """
+    Returns the operation that reverts a given operation, based on the tree before the operation is applied.
+
+    :param tree_dict: Tree dict the operation will be applied to, defaults to None
+    :type tree_dict: dict, optional
+    :param operation: Edit operation to revert, defaults to None
+    :type operation: dict, optional
+    :param index: Tree index for the tree, defaults to None
+    :type index: dict, optional
+    :param node_id: Node ID of the branch at the path of the operation, to avoid following the path, defaults to None
+    :type node_id: int, optional
+    :return: Inverse operation, None if the operation can't or doesn't need to be reverted
+    :rtype: dict
+    """
+    try:
+        op = operation["op"]
+        if op == "set_paths":
+            return {"op":"set_paths", "primary":tree_dict["primary_path"], "secondary":tree_dict["secondary_path"]}
+        path = list(operation["path"])
+        sub_dict = get_operation_dict(tree_dict, operation, index, node_id)
+        if op == "add_item":
+            position = get_list_position(len(sub_dict["item_list"]), operation.get("index", len(sub_dict["item_list"])), True)
+            return {"op":"delete_item", "path":path, "index":position}
+        if op == "delete_item":
+            position = get_list_position(len(sub_dict["item_list"]), operation["index"])
+            item = sub_dict["item_list"][position]
+            return {"op":"add_item", "path":path, "item":dict(item.items()), "index":position}
+        if op == "create_branch" or op == "set_branches":
+            branches = [to_dicts(branch) for branch in sub_dict["branch"]]
+            return {"op":"set_branches", "path":path, "branches":branches, "end":sub_dict["end"]}
+        if op == "delete_branch":
+            position = get_list_position(len(sub_dict["branch"]), operation["index"])
+            branch = to_dicts(sub_dict["branch"][position])
+            return {"op":"insert_branch", "path":path, "index":position, "branch":branch}
+        if op == "insert_branch":
+            position = get_list_position(len(sub_dict["branch"]), operation["index"], True)
+            return {"op":"delete_branch", "path":path, "index":position}
+        if op == "toggle_end" and len(sub_dict["branch"]) == 0:
+            return {"op":"toggle_end", "path":path}
+        return None
+    except (IndexError, KeyError, TypeError):
+        return None
+
+def apply_with_history(tree_dict:dict=None, operation:dict=None, index:dict=None, history:dict=None, node_id:int=None) -> bool:
+    """
+    Applies an edit operation and records it in the edit history so it can be undone.
+    Edits that were undone can no longer be redone once a new edit is made.
+
+    :param tree_dict: Tree dict to modify, defaults to None
+    :type tree_dict: dict, optional
+    :param operation: Edit operation to apply, defaults to None
+    :type operation: dict, optional
+    :param index: Tree index to keep up to date with the edit, defaults to None
+    :type index: dict, optional
+    :param history: Edit history to record the edit in, defaults to None
+    :type history: dict, optional
+    :param node_id: Node ID of the branch at the path of the operation, to avoid following the path, defaults to None
+    :type node_id: int, optional
+    :return: Whether the operation was applied
+    :rtype: bool
+    """
+    inverse = get_inverse_operation(tree_dict, operation, index, node_id)
+    if not apply_operation(tree_dict, operation, index, node_id):
+        return False
+    if inverse is not None:
+        history["undo"].append((operation, inverse))
+        history["redo"] = []
+    return True
+
+def undo_operation(tree_dict:dict=None, index:dict=None, history:dict=None) -> dict:
+    """
+    Reverts the last edit in the edit history.
+
+    :param tree_dict: Tree dict to modify, defaults to None
+    :type tree_dict: dict, optional
+    :param index: Tree index to keep up to date with the edit, defaults to None
+    :type index: dict, optional
+    :param history: Edit history, defaults to None
+    :type history: dict, optional
+    :return: Operation that was applied to revert the edit, None if there is nothing to undo
+    :rtype: dict
+    """
+    if len(history["undo"]) == 0:
+        return None
+    operation, inverse = history["undo"].pop()
+    # Copy the operation, as operations are numbered when they are saved
+    inverse = dict(inverse)
+    if not apply_operation(tree_dict, inverse, index):
+        return None
+    history["redo"].append((operation, inverse))
+    return inverse
+
+def redo_operation(tree_dict:dict=None, index:dict=None, history:dict=None) -> dict:
+    """
+    Applies the last edit that was undone again.
+
+    :param tree_dict: Tree dict to modify, defaults to None
+    :type tree_dict: dict, optional
+    :param index: Tree index to keep up to date with the edit, defaults to None
+    :type index: dict, optional
+    :param history: Edit history, defaults to None
+    :type history: dict, optional
+    :return: Operation that was applied, None if there is nothing to redo
+    :rtype: dict
+    """
+    if len(history["redo"]) == 0:
+        return None
+    operation, inverse = history["redo"].pop()
+    operation = dict(operation)
+    if not apply_operation(tree_dict, operation, index):
+        return None
+    history["undo"].append((operation, inverse))
+    return operation
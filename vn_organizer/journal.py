@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+from json.decoder import JSONDecodeError
+from os import fsync, remove
+from os.path import abspath, exists, getsize
+from typing import List
+from vn_organizer.tree_format import iterencode_json
+from vn_organizer.tree_format import loads_json
+
+def get_journal_file(file:str=None) -> str:
+    """
+    Returns the path of the edit journal for a given tree file.
+
+    :param file: Path of the tree file, defaults to None
+    :type file: str, optional
+    :return: Path of the journal file
+    :rtype: str
+    """
+    try:
+        return abspath(file) + ".journal"
+    except TypeError:
+        return None
+
+def append_journal(file:str=None, operations:List[dict]=None) -> bool:
+    """
+    Appends edit operations to the journal of a tree file.
+    Each operation is written as a single line of JSON and synced to disk before returning.
+    Operations holding deeply nested branches, such as those for undoing a deleted branch, are written without recursion.
+
+    :param file: Path of the tree file, defaults to None
+    :type file: str, optional
+    :param operations: Edit operations to append, defaults to None
+    :type operations: list[dict], optional
+    :return: Whether the operations were written
+    :rtype: bool
+    """
+    try:
+        lines = []
+        for operation in operations:
+            lines.append("".join(iterencode_json(operation, None)) + "\n")
+        with open(get_journal_file(file), "a") as out_file:
+            out_file.write("".join(lines))
+            out_file.flush()
+            fsync(out_file.fileno())
+        return True
+    except (FileNotFoundError, TypeError):
+        return False
+
+def read_journal(file:str=None) -> List[dict]:
+    """
+    Reads the edit operations in the journal of a tree file.
+    Reading stops at the first incomplete line, as left by a crash while appending.
+
+    :param file: Path of the tree file, defaults to None
+    :type file: str, optional
+    :return: List of edit operations in the order they were written
+    :rtype: list[dict]
+    """
+    operations = []
+    try:
+        with open(get_journal_file(file)) as in_file:
+            for line in in_file:
+                if not line.endswith("\n"):
+                    break
+                operations.append(loads_json(line))
+    except (FileNotFoundError, JSONDecodeError, TypeError):
+        pass
+    return operations
+
+def get_journal_size(file:str=None) -> int:
+    """
+    Returns the size of the journal of a tree file in bytes.
+
+    :param file: Path of the tree file, defaults to None
+    :type file: str, optional
+    :return: Size of the journal, 0 if there is no journal
+    :rtype: int
+    """
+    journal = get_journal_file(file)
+    if journal is None or not exists(journal):
+        return 0
+    return getsize(journal)
+
+def clear_journal(file:str=None):
+    """
+    Removes the journal of a tree file once its operations are part of the snapshot.
+
+    :param file: Path of the tree file, defaults to None
+    :type file: str, optional
+    """
+    journal = get_journal_file(file)
+    if journal is not None and exists(journal):
+        remove(journal)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+from typing import List, Tuple
+
+class Item:
+    """
+    Compact representation of an item in a branch's item list.
+    Supports the same key access as the item dicts, so it can be used in their place.
+    Keys with a value of None are treated as missing, matching the item dicts,
+    where events hold "text" and saves hold "hash".
+    """
+    __slots__ = ("type", "text", "hash")
+
+    def __init__(self, type:str=None, text:str=None, hash:str=None):
+        self.type = type
+        self.text = text
+        self.hash = hash
+
+    def __getitem__(self, key:str):
+        if key not in self:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key:str, value):
+        if key not in Item.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key:str) -> bool:
+        return key in Item.__slots__ and getattr(self, key) is not None
+
+    def get(self, key:str, default=None):
+        return self[key] if key in self else default
+
+    def keys(self) -> List[str]:
+        return [key for key in Item.__slots__ if getattr(self, key) is not None]
+
+    def items(self) -> List[Tuple]:
+        return [(key, getattr(self, key)) for key in self.keys()]
+
+class BranchNode:
+    """
+    Compact representation of a branch dict.
+    Supports the same key access as branch dicts, so it can be used in their place.
+    """
+    __slots__ = ("prompt", "response", "item_list", "branch", "end")
+
+    def __init__(self, prompt:str=None, response:str=None,
+                item_list:list=None, branch:list=None, end:bool=False):
+        self.prompt = prompt
+        self.response = response
+        self.item_list = [] if item_list is None else item_list
+        self.branch = [] if branch is None else branch
+        self.end = end
+
+    def __getitem__(self, key:str):
+        if key not in BranchNode.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key:str, value):
+        if key not in BranchNode.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key:str) -> bool:
+        return key in BranchNode.__slots__
+
+    def get(self, key:str, default=None):
+        return getattr(self, key) if key in BranchNode.__slots__ else default
+
+    def keys(self) -> List[str]:
+        return list(BranchNode.__slots__)
+
+    def items(self) -> List[Tuple]:
+        return [(key, getattr(self, key)) for key in BranchNode.__slots__]
+
+def to_nodes(branch_dict:dict=None) -> BranchNode:
+    """
+    Converts a branch dict and all of its sub-branches into BranchNode and Item objects.
+
+    :param branch_dict: Branch dict to convert, defaults to None
+    :type branch_dict: dict, optional
+    :return: Converted tree
+    :rtype: BranchNode
+    """
+    try:
+        root = BranchNode()
+        stack = [(branch_dict, root)]
+        while len(stack) > 0:
+            cur_dict, node = stack.pop()
+            node.prompt = cur_dict["prompt"]
+            node.response = cur_dict["response"]
+            node.end = cur_dict["end"]
+            for item in cur_dict["item_list"]:
+                node.item_list.append(Item(item["type"], item.get("text"), item.get("hash")))
+            for branch in cur_dict["branch"]:
+                sub_node = BranchNode()
+                node.branch.append(sub_node)
+                stack.append((branch, sub_node))
+        return root
+    except (AttributeError, KeyError, TypeError):
+        return None
+
+def to_dicts(node:BranchNode=None) -> dict:
+    """
+    Converts a BranchNode and all of its sub-branches back into branch dicts.
+
+    :param node: Tree to convert, defaults to None
+    :type node: BranchNode, optional
+    :return: Converted branch dict
+    :rtype: dict
+    """
+    try:
+        root = dict()
+        stack = [(node, root)]
+        while len(stack) > 0:
+            cur_node, cur_dict = stack.pop()
+            cur_dict["prompt"] = cur_node["prompt"]
+            cur_dict["response"] = cur_node["response"]
+            cur_dict["item_list"] = [dict(item.items()) for item in cur_node["item_list"]]
+            cur_dict["branch"] = []
+            cur_dict["end"] = cur_node["end"]
+            for branch in cur_node["branch"]:
+                sub_dict = dict()
+                cur_dict["branch"].append(sub_dict)
+                stack.append((branch, sub_dict))
+        return root
+    except (AttributeError, KeyError, TypeError):
+        return None
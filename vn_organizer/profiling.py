@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+
+from sys import modules, stderr
+from threading import Lock
+from time import perf_counter
+from typing import Callable, TextIO, Tuple
+from vn_organizer.tree_database import is_loaded
+
+# Functions that are timed while profiling, by module
+PROFILED_FUNCTIONS = {
+    "vn_organizer.vn_organizer":["read_tree", "write_tree", "save_tree", "compact_tree",
+                "get_dict_print", "get_node_print", "create_saves",
+                "write_b64", "file_to_b64", "b64_to_file"]}
+
+# File holding the I/O counters of the process on Linux
+PROC_IO_FILE = "/proc/self/io"
+
+# Timings of profiled functions and commands while profiling is enabled, None while it's disabled
+PROFILE = None
+
+def get_io_counts() -> Tuple[int, int]:
+    """
+    Returns the number of bytes the process has read and written so far, on systems that report it.
+
+    :return: Bytes read and bytes written, None for each if not reported
+    :rtype: tuple[int, int]
+    """
+    try:
+        counts = dict()
+        with open(PROC_IO_FILE) as in_file:
+            for line in in_file:
+                key, value = line.split(":")
+                counts[key] = int(value)
+        return counts["rchar"], counts["wchar"]
+    except (FileNotFoundError, KeyError, PermissionError, ValueError):
+        return None, None
+
+def count_branches(branch_dict:dict=None) -> int:
+    """
+    Returns the number of branches in a tree.
+    Branches below branches that haven't been loaded from a database aren't counted, as they weren't visited.
+
+    :param branch_dict: Root branch dict of the tree, defaults to None
+    :type branch_dict: dict, optional
+    :return: Number of branches
+    :rtype: int
+    """
+    try:
+        count = 0
+        stack = [branch_dict]
+        while len(stack) > 0:
+            count += 1
+            cur_dict = stack.pop()
+            if is_loaded(cur_dict):
+                stack.extend(cur_dict["branch"])
+        return count
+    except (KeyError, TypeError):
+        return 0
+
+def get_cache_size(name:str=None, args:tuple=None) -> int:
+    """
+    Returns the number of entries in the cache used by a profiled function, for counting the branches it visits.
+
+    :param name: Name of the function, defaults to None
+    :type name: str, optional
+    :param args: Arguments the function was called with, defaults to None
+    :type args: tuple, optional
+    :return: Number of cache entries, 0 if the function doesn't use a cache
+    :rtype: int
+    """
+    try:
+        if name == "get_node_print":
+            return len(args[0]["completion"]) + len(args[0]["render"])
+        if name == "get_dict_print":
+            return len(args[2])
+        return 0
+    except (IndexError, KeyError, TypeError):
+        return 0
+
+def get_branch_visits(name:str=None, args:tuple=None, result=None, cache_size:int=0) -> int:
+    """
+    Returns the number of branches a call to a profiled function visited.
+    Functions that walk the whole tree visit every branch, while cached functions visit the branches added to their cache.
+
+    :param name: Name of the function, defaults to None
+    :type name: str, optional
+    :param args: Arguments the function was called with, defaults to None
+    :type args: tuple, optional
+    :param result: Value returned by the function, defaults to None
+    :param cache_size: Size of the function's cache before the call, defaults to 0
+    :type cache_size: int, optional
+    :return: Number of branches visited
+    :rtype: int
+    """
+    try:
+        if name == "read_tree":
+            return count_branches(result["tree"])
+        if name == "write_tree":
+            return count_branches(args[1])
+        if name == "compact_tree":
+            return count_branches(args[1]["tree"])
+        return max(get_cache_size(name, args) - cache_size, 0)
+    except (IndexError, KeyError, TypeError):
+        return 0
+
+def record_timing(name:str=None, seconds:float=0.0, bytes_read:int=None, bytes_written:int=None, visits:int=0):
+    """
+    Adds a call to the timings of a function or command while profiling.
+
+    :param name: Name of the function or command, defaults to None
+    :type name: str, optional
+    :param seconds: Time the call took, defaults to 0.0
+    :type seconds: float, optional
+    :param bytes_read: Bytes read during the call, defaults to None
+    :type bytes_read: int, optional
+    :param bytes_written: Bytes written during the call, defaults to None
+    :type bytes_written: int, optional
+    :param visits: Branches visited during the call, defaults to 0
+    :type visits: int, optional
+    """
+    if PROFILE is None:
+        return None
+    with PROFILE["lock"]:
+        timing = PROFILE["timings"].get(name)
+        if timing is None:
+            timing = {"calls":0, "total":0.0, "max":0.0, "read":0, "written":0, "visits":0}
+            PROFILE["timings"][name] = timing
+        timing["calls"] += 1
+        timing["total"] += seconds
+        timing["max"] = max(timing["max"], seconds)
+        timing["read"] += 0 if bytes_read is None else bytes_read
+        timing["written"] += 0 if bytes_written is None else bytes_written
+        timing["visits"] += visits
+
+def record_command(command:str=None, start:float=None):
+    """
+    Records the time an editor command took, from when it was entered until the editor is ready for the next one.
+    Does nothing while profiling is disabled.
+
+    :param command: Command that was entered, defaults to None
+    :type command: str, optional
+    :param start: Value of perf_counter when the command was entered, defaults to None
+    :type start: float, optional
+    """
+    if PROFILE is None or command is None:
+        return None
+    record_timing(f"command {command}", perf_counter() - start)
+
+def profile_function(name:str=None, function:Callable=None) -> Callable:
+    """
+    Returns a version of a function that records its timings, I/O, and branch visits.
+
+    :param name: Name to record the timings under, defaults to None
+    :type name: str, optional
+    :param function: Function to profile, defaults to None
+    :type function: Callable, optional
+    :return: Profiled function
+    :rtype: Callable
+    """
+    def profiled(*args, **kwargs):
+        cache_size = get_cache_size(name, args)
+        read_start, written_start = get_io_counts()
+        start = perf_counter()
+        result = function(*args, **kwargs)
+        seconds = perf_counter() - start
+        read_end, written_end = get_io_counts()
+        bytes_read = None if read_start is None else max(read_end - read_start - PROFILE["io_overhead"], 0)
+        bytes_written = None if written_start is None else written_end - written_start
+        record_timing(name, seconds, bytes_read, bytes_written, get_branch_visits(name, args, result, cache_size))
+        return result
+    return profiled
+
+def start_profiling(stats_file:str=None) -> dict:
+    """
+    Starts recording timings for the profiled functions and editor commands.
+    Profiled functions are only swapped in while profiling, so they cost nothing otherwise.
+    Bytes read and written are process-wide counts, so they include I/O from background threads during the call.
+
+    :param stats_file: File to write cProfile statistics to when profiling stops, None to skip it, defaults to None
+    :type stats_file: str, optional
+    :return: Profile state
+    :rtype: dict
+    """
+    global PROFILE
+    PROFILE = {"lock":Lock(), "timings":dict(), "stats_file":stats_file, "profiler":None, "replaced":[]}
+    # Get the bytes read by checking the I/O counts, so they aren't counted as part of each call
+    read_start = get_io_counts()[0]
+    read_end = get_io_counts()[0]
+    PROFILE["io_overhead"] = 0 if read_start is None else read_end - read_start
+    # Replace the functions everywhere they were imported
+    for module_name in PROFILED_FUNCTIONS:
+        for name in PROFILED_FUNCTIONS[module_name]:
+            function = getattr(modules[module_name], name)
+            profiled = profile_function(name, function)
+            for module in list(modules.values()):
+                if getattr(module, name, None) is function:
+                    setattr(module, name, profiled)
+                    PROFILE["replaced"].append((module, name, function))
+    if stats_file is not None:
+        # cProfile is only loaded when its statistics are written, so it doesn't slow down startup
+        from cProfile import Profile
+        PROFILE["profiler"] = Profile()
+        PROFILE["profiler"].enable()
+    return PROFILE
+
+def print_profile(out_file:TextIO=stderr):
+    """
+    Prints a table of the recorded timings, slowest in total first.
+
+    :param out_file: Text stream to print to, defaults to stderr
+    :type out_file: TextIO, optional
+    """
+    if PROFILE is None:
+        return None
+    header = f"{'Name':<20} {'Calls':>7} {'Total ms':>10} {'Mean ms':>9} {'Max ms':>9}"
+    header = header + f" {'Read':>12} {'Written':>12} {'Visits':>10}"
+    lines = [header, "-" * len(header)]
+    timings = PROFILE["timings"]
+    for name in sorted(timings, key=lambda name: timings[name]["total"], reverse=True):
+        timing = timings[name]
+        mean = timing["total"] / timing["calls"]
+        line = f"{name:<20} {timing['calls']:>7} {timing['total'] * 1000:>10.2f} {mean * 1000:>9.2f}"
+        line = line + f" {timing['max'] * 1000:>9.2f} {timing['read']:>12} {timing['written']:>12} {timing['visits']:>10}"
+        lines.append(line)
+    out_file.write("\n".join(lines) + "\n")
+
+def stop_profiling(out_file:TextIO=stderr):
+    """
+    Stops profiling, restoring the original functions, and prints the recorded timings.
+    The cProfile statistics are written if a file was given when profiling started.
+
+    :param out_file: Text stream to print the timings to, defaults to stderr
+    :type out_file: TextIO, optional
+    """
+    global PROFILE
+    if PROFILE is None:
+        return None
+    if PROFILE["profiler"] is not None:
+        PROFILE["profiler"].disable()
+        PROFILE["profiler"].dump_stats(PROFILE["stats_file"])
+    for module, name, function in PROFILE["replaced"]:
+        setattr(module, name, function)
+    print_profile(out_file)
+    PROFILE = None
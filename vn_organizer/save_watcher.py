@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+
+from ctypes import CDLL
+from ctypes.util import find_library
+from os import close, read, scandir, stat
+from os.path import abspath, join
+from select import select
+from struct import calcsize, unpack_from
+from threading import Event, Thread
+from time import monotonic
+from typing import Callable, Dict, List, Set, Tuple
+from vn_organizer.blob_store import file_to_blob
+from vn_organizer.blob_store import get_tree_blobs
+from vn_organizer.vn_organizer import SAVE_PATTERN
+
+# Seconds a save file has to stay unchanged before it's captured
+WATCH_DELAY = 1.0
+
+# Seconds between checks of the save directory
+POLL_INTERVAL = 0.5
+
+# Flags for watching a directory with inotify, for files closed after writing and files moved into the directory
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_TO = 0x80
+IN_NONBLOCK = 0x800
+IN_CLOEXEC = 0x80000
+
+# Header of each inotify event, with the watch, mask, cookie, and name length
+INOTIFY_EVENT = "iIII"
+
+def open_inotify(save_path:str=None) -> int:
+    """
+    Starts watching a directory for written files with inotify, on systems that support it.
+
+    :param save_path: Directory to watch, defaults to None
+    :type save_path: str, optional
+    :return: File descriptor to read events from, None if inotify isn't available
+    :rtype: int
+    """
+    try:
+        libc = CDLL(find_library("c"), use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None
+        if libc.inotify_add_watch(fd, abspath(save_path).encode(), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            close(fd)
+            return None
+        return fd
+    except (AttributeError, OSError, TypeError):
+        return None
+
+def read_inotify(fd:int=None, save_path:str=None, timeout:float=POLL_INTERVAL) -> List[str]:
+    """
+    Waits for inotify events and returns the save files they are for.
+
+    :param fd: File descriptor returned by open_inotify, defaults to None
+    :type fd: int, optional
+    :param save_path: Directory being watched, defaults to None
+    :type save_path: str, optional
+    :param timeout: Seconds to wait for events, defaults to POLL_INTERVAL
+    :type timeout: float, optional
+    :return: Full paths of the save files that were written
+    :rtype: list[str]
+    """
+    files = []
+    if len(select([fd], [], [], timeout)[0]) == 0:
+        return files
+    try:
+        data = read(fd, 65536)
+    except BlockingIOError:
+        return files
+    pos = 0
+    header_size = calcsize(INOTIFY_EVENT)
+    while pos + header_size <= len(data):
+        length = unpack_from(INOTIFY_EVENT, data, pos)[3]
+        name = data[pos + header_size:pos + header_size + length].rstrip(b"\x00").decode(errors="replace")
+        pos += header_size + length
+        if SAVE_PATTERN.search(name) is not None:
+            files.append(abspath(join(save_path, name)))
+    return files
+
+def get_save_stats(save_path:str=None, files:List[str]=None) -> Tuple[int, Dict[str, Tuple[int, int]]]:
+    """
+    Returns the modification time of a save directory and the modification time and size of its save files.
+    Given a list of save files, only those files are checked, without listing the directory.
+
+    :param save_path: Save directory, defaults to None
+    :type save_path: str, optional
+    :param files: Full paths of the save files to check, defaults to None
+    :type files: list[str], optional
+    :return: Modification time of the directory, and dict of save file paths to their modification time and size
+    :rtype: tuple[int, dict]
+    """
+    stats = dict()
+    try:
+        dir_time = stat(abspath(save_path)).st_mtime_ns
+        if files is None:
+            with scandir(save_path) as entries:
+                for entry in entries:
+                    if SAVE_PATTERN.search(entry.name) is not None:
+                        entry_stat = entry.stat()
+                        stats[abspath(entry.path)] = (entry_stat.st_mtime_ns, entry_stat.st_size)
+            return dir_time, stats
+        for file in files:
+            try:
+                file_stat = stat(file)
+                stats[file] = (file_stat.st_mtime_ns, file_stat.st_size)
+            except FileNotFoundError:
+                continue
+        return dir_time, stats
+    except (FileNotFoundError, NotADirectoryError, TypeError):
+        return None, stats
+
+def start_watch(save_path:str=None, blob_dir:str=None, known:Set[str]=None,
+            on_save:Callable[[str, str], None]=None) -> dict:
+    """
+    Starts a background worker that captures save files as they are written to a save directory.
+    New and changed save files are stored in the blob store once they stop changing for WATCH_DELAY seconds,
+    and on_save is called with the path and hash of each save that isn't a copy of a known save.
+    Uses inotify where available, so checking costs nothing while the directory is unchanged,
+    and polls the save files otherwise, only listing the directory again when files are added or removed.
+
+    :param save_path: Save directory to watch, defaults to None
+    :type save_path: str, optional
+    :param blob_dir: Blob directory to store saves in, defaults to None
+    :type blob_dir: str, optional
+    :param known: Hashes of saves to ignore, updated with every captured save, defaults to None
+    :type known: set[str], optional
+    :param on_save: Function called with the path and hash of each captured save, defaults to None
+    :type on_save: Callable[[str, str], None], optional
+    :return: Watch state
+    :rtype: dict
+    """
+    state = {"save_path":save_path,
+                "blob_dir":blob_dir,
+                "known":set() if known is None else known,
+                "on_save":on_save,
+                "stop":Event()}
+    state["thread"] = Thread(target=watch_worker, args=(state,), daemon=True)
+    state["thread"].start()
+    return state
+
+def watch_worker(state:dict=None):
+    """
+    Watches the save directory until the watch is stopped.
+
+    :param state: Watch state as returned by start_watch, defaults to None
+    :type state: dict, optional
+    """
+    save_path = state["save_path"]
+    fd = open_inotify(save_path)
+    dir_time, stats = get_save_stats(save_path)
+    # Save files that changed, and when they last changed
+    changed = dict()
+    try:
+        while not state["stop"].is_set():
+            # Get the save files that changed since the last check
+            if fd is not None:
+                for file in read_inotify(fd, save_path):
+                    changed[file] = monotonic()
+            else:
+                state["stop"].wait(POLL_INTERVAL)
+                new_time, new_stats = get_save_stats(save_path, list(stats))
+                if not new_time == dir_time or not len(new_stats) == len(stats):
+                    new_time, new_stats = get_save_stats(save_path)
+                for file in new_stats:
+                    if not new_stats[file] == stats.get(file):
+                        changed[file] = monotonic()
+                dir_time, stats = new_time, new_stats
+            # Capture save files that stopped changing
+            now = monotonic()
+            for file in [file for file in changed if now - changed[file] >= WATCH_DELAY]:
+                del changed[file]
+                blob_hash = file_to_blob(state["blob_dir"], file)
+                if blob_hash is None or blob_hash in state["known"]:
+                    continue
+                state["known"].add(blob_hash)
+                state["on_save"](file, blob_hash)
+    finally:
+        if fd is not None:
+            close(fd)
+
+def add_known_saves(state:dict=None, operations:List[dict]=None):
+    """
+    Adds the saves that operations add to the tree to the known saves of a watch.
+    Copies of known saves written to the save directory, such as saves restored when moving to a branch, aren't captured.
+
+    :param state: Watch state as returned by start_watch, defaults to None
+    :type state: dict, optional
+    :param operations: Operations applied to the tree, defaults to None
+    :type operations: list[dict], optional
+    """
+    for operation in operations:
+        if operation["op"] == "add_item" and operation["item"]["type"] == "s" and "hash" in operation["item"]:
+            state["known"].add(operation["item"]["hash"])
+        elif operation["op"] == "insert_branch":
+            state["known"].update(get_tree_blobs(operation["branch"]))
+        elif operation["op"] == "set_branches":
+            for branch in operation["branches"]:
+                state["known"].update(get_tree_blobs(branch))
+
+def stop_watch(state:dict=None):
+    """
+    Stops watching the save directory.
+
+    :param state: Watch state as returned by start_watch, defaults to None
+    :type state: dict, optional
+    """
+    state["stop"].set()
+    state["thread"].join()
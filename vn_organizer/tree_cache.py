@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+
+from gc import disable, enable, isenabled
+from marshal import dumps, loads
+from marshal import version as marshal_version
+from os import fsync, replace, stat
+from os.path import abspath
+from struct import calcsize, pack, unpack
+from struct import error as structerror
+from threading import Thread
+from time import time_ns
+from typing import List, Tuple
+from vn_organizer.blob_store import RACY_WINDOW
+from vn_organizer.blob_store import get_file_hash
+from vn_organizer.nodes import BranchNode
+from vn_organizer.nodes import Item
+
+# Version of the cache layout, caches from other versions are rebuilt
+CACHE_VERSION = 1
+
+# Size of the cache header, stored before the header so it can be read without reading the tree
+CACHE_HEADER = "<I"
+
+def get_cache_file(file:str=None) -> str:
+    """
+    Returns the path of the parsed tree cache for a given tree file.
+
+    :param file: Path of the tree file, defaults to None
+    :type file: str, optional
+    :return: Path of the cache file
+    :rtype: str
+    """
+    try:
+        return abspath(file) + ".cache"
+    except TypeError:
+        return None
+
+def get_file_stamp(file:str=None) -> List[int]:
+    """
+    Returns the modification time and size of a tree file, used to tell if its cache is up to date.
+
+    :param file: Path of the tree file, defaults to None
+    :type file: str, optional
+    :return: Modification time in nanoseconds and size in bytes, None if the file doesn't exist
+    :rtype: list[int]
+    """
+    try:
+        file_stat = stat(abspath(file))
+        return [file_stat.st_mtime_ns, file_stat.st_size]
+    except (FileNotFoundError, TypeError):
+        return None
+
+def flatten_tree(branch_dict:dict=None) -> Tuple[list, list, list, list, list]:
+    """
+    Flattens a tree into lists of branch values in depth first order, so it can be stored without recursion.
+    Each branch is stored as its prompt, response, end, number of sub-branches, and items as (type, text, hash) tuples.
+
+    :param branch_dict: Root branch of the tree, defaults to None
+    :type branch_dict: dict, optional
+    :return: Lists of prompts, responses, ends, sub-branch counts, and items
+    :rtype: tuple[list, list, list, list, list]
+    """
+    prompts, responses, ends, counts, items = [], [], [], [], []
+    stack = [branch_dict]
+    while len(stack) > 0:
+        cur_dict = stack.pop()
+        prompts.append(cur_dict["prompt"])
+        responses.append(cur_dict["response"])
+        ends.append(cur_dict["end"])
+        counts.append(len(cur_dict["branch"]))
+        items.append([(item["type"], item.get("text"), item.get("hash")) for item in cur_dict["item_list"]])
+        stack.extend(reversed(cur_dict["branch"]))
+    return prompts, responses, ends, counts, items
+
+def unflatten_tree(prompts:list=None, responses:list=None, ends:list=None, counts:list=None, items:list=None) -> BranchNode:
+    """
+    Rebuilds a tree flattened by flatten_tree as BranchNode and Item objects.
+
+    :param prompts: Prompt of each branch, defaults to None
+    :type prompts: list, optional
+    :param responses: Response of each branch, defaults to None
+    :type responses: list, optional
+    :param ends: Whether each branch is marked as an ending, defaults to None
+    :type ends: list, optional
+    :param counts: Number of sub-branches of each branch, defaults to None
+    :type counts: list, optional
+    :param items: Items of each branch as (type, text, hash) tuples, defaults to None
+    :type items: list, optional
+    :return: Root of the rebuilt tree
+    :rtype: BranchNode
+    """
+    # Each entry holds a branch and the number of its sub-branches still to be added
+    stack = []
+    nodes = [BranchNode(prompts[i], responses[i], [Item(*item) for item in items[i]], None, ends[i])
+                for i in range(0, len(prompts))]
+    for node, count in zip(nodes, counts):
+        if len(stack) > 0:
+            entry = stack[-1]
+            entry[0].branch.append(node)
+            entry[1] -= 1
+            if entry[1] == 0:
+                stack.pop()
+        if count > 0:
+            stack.append([node, count])
+    return nodes[0]
+
+def write_tree_cache(file:str=None, tree_dict:dict=None, stamp:List[int]=None) -> bool:
+    """
+    Writes the parsed tree cache for a tree file.
+    The cache starts with a small header holding the stamp and hash of the tree file it was made from,
+    so it can be checked without reading the rest. Nothing is written if the tree file changed since it was read.
+
+    :param file: Path of the tree file, defaults to None
+    :type file: str, optional
+    :param tree_dict: Tree dict as read from the tree file, defaults to None
+    :type tree_dict: dict, optional
+    :param stamp: Stamp of the tree file from before it was read, as returned by get_file_stamp, defaults to None
+    :type stamp: list[int], optional
+    :return: Whether the cache was written
+    :rtype: bool
+    """
+    try:
+        file_hash = get_file_hash(file)
+        if file_hash is None or not get_file_stamp(file) == stamp:
+            return False
+        header = {"version":[CACHE_VERSION, marshal_version], "stamp":stamp, "hash":file_hash, "written":time_ns()}
+        values = {key:tree_dict[key] for key in tree_dict if not key == "tree"}
+        cache_file = get_cache_file(file)
+        temp_file = cache_file + ".tmp"
+        header_data = dumps(header)
+        with open(temp_file, "wb") as out_file:
+            out_file.write(pack(CACHE_HEADER, len(header_data)))
+            out_file.write(header_data)
+            out_file.write(dumps({"values":values, "tree":flatten_tree(tree_dict["tree"])}))
+            out_file.flush()
+            fsync(out_file.fileno())
+        replace(temp_file, cache_file)
+        return True
+    except (AttributeError, FileNotFoundError, KeyError, PermissionError, TypeError, ValueError):
+        return False
+
+def read_tree_cache(file:str=None) -> dict:
+    """
+    Reads a tree from the parsed tree cache of a tree file, if the cache is up to date.
+    The cache is up to date if the modification time and size of the tree file match the ones it was made from.
+    Tree files modified too recently before the cache was made to be sure they're unchanged are hashed as well.
+
+    :param file: Path of the tree file, defaults to None
+    :type file: str, optional
+    :return: Tree dict with the same keys as a JSON tree file and the tree as BranchNode objects, None if not cached
+    :rtype: dict
+    """
+    gc_enabled = isenabled()
+    try:
+        with open(get_cache_file(file), "rb") as in_file:
+            size = unpack(CACHE_HEADER, in_file.read(calcsize(CACHE_HEADER)))[0]
+            header = loads(in_file.read(size))
+            if not header["version"] == [CACHE_VERSION, marshal_version]:
+                return None
+            if not header["stamp"] == get_file_stamp(file):
+                return None
+            if header["written"] - header["stamp"][0] <= RACY_WINDOW and not get_file_hash(file) == header["hash"]:
+                return None
+            data = in_file.read()
+        # Pause garbage collection while building the tree, as none of the new objects can be garbage yet
+        disable()
+        body = loads(data)
+        tree_dict = body["values"]
+        tree_dict["tree"] = unflatten_tree(*body["tree"])
+        return tree_dict
+    except (EOFError, FileNotFoundError, IndexError, KeyError, TypeError, ValueError, structerror):
+        return None
+    finally:
+        if gc_enabled:
+            enable()
+
+def start_cache_rebuild(file:str=None, tree_dict:dict=None, stamp:List[int]=None) -> Thread:
+    """
+    Starts a background worker that writes the parsed tree cache for a tree file.
+    The tree is only read by the worker, so it must not be edited until the worker finishes.
+
+    :param file: Path of the tree file, defaults to None
+    :type file: str, optional
+    :param tree_dict: Tree dict as read from the tree file, defaults to None
+    :type tree_dict: dict, optional
+    :param stamp: Stamp of the tree file from before it was read, as returned by get_file_stamp, defaults to None
+    :type stamp: list[int], optional
+    :return: Worker thread
+    :rtype: Thread
+    """
+    thread = Thread(target=write_tree_cache, args=(file, dict(tree_dict), stamp), daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from json.decoder import JSONDecodeError
+from os import cpu_count, fsync, replace, scandir, stat
+from os.path import abspath, basename, isdir, join
+from typing import Dict, List, Tuple
+from vn_organizer.blob_store import get_blob_directory
+from vn_organizer.blob_store import get_stored_size
+from vn_organizer.blob_store import get_tree_blobs
+from vn_organizer.journal import get_journal_file
+from vn_organizer.journal import read_journal
+from vn_organizer.tree_database import DATABASE_EXTENSION
+from vn_organizer.tree_database import DATABASE_LOG_SUFFIX
+from vn_organizer.tree_database import get_database_summary
+from vn_organizer.tree_database import is_database_file
+from vn_organizer.tree_format import BINARY_EXTENSION
+from vn_organizer.tree_format import is_binary_file
+from vn_organizer.tree_format import iterencode_json
+from vn_organizer.tree_format import loads_json
+from vn_organizer.tree_format import read_binary_structure
+from vn_organizer.vn_organizer import apply_operation
+from vn_organizer.vn_organizer import get_completion
+
+# Name of the sidecar index kept in each catalogued directory
+CATALOG_FILE = ".vn-organizer-catalog"
+
+# Version of the sidecar index, indexes from other versions are scanned again in full
+CATALOG_VERSION = 1
+
+# File extensions of tree files that are catalogued
+CATALOG_EXTENSIONS = [".json", BINARY_EXTENSION, DATABASE_EXTENSION]
+
+def get_catalog_file(directory:str=None) -> str:
+    """
+    Returns the path of the sidecar index for a directory of tree files.
+
+    :param directory: Directory of tree files, defaults to None
+    :type directory: str, optional
+    :return: Path of the sidecar index
+    :rtype: str
+    """
+    try:
+        return abspath(join(directory, CATALOG_FILE))
+    except TypeError:
+        return None
+
+def get_tree_files(directory:str=None) -> List[str]:
+    """
+    Returns the paths of the tree files in a directory, based on their extensions.
+    Hidden files and sub-directories, such as blob directories, are skipped.
+
+    :param directory: Directory to search, defaults to None
+    :type directory: str, optional
+    :return: Full paths of the tree files, sorted by name
+    :rtype: list[str]
+    """
+    files = []
+    try:
+        with scandir(abspath(directory)) as entries:
+            for entry in entries:
+                if entry.name.startswith(".") or not entry.is_file():
+                    continue
+                if any([entry.name.lower().endswith(extension) for extension in CATALOG_EXTENSIONS]):
+                    files.append(abspath(entry.path))
+        return sorted(files)
+    except (FileNotFoundError, NotADirectoryError, TypeError):
+        return []
+
+def get_catalog_stamp(file:str=None) -> List[List[int]]:
+    """
+    Returns the modification times and sizes of a tree file and the files written alongside it.
+    Edits saved to the journal or to the log of a database don't always change the tree file itself,
+    so those files are included to tell when a tree has changed.
+
+    :param file: Path of the tree file, defaults to None
+    :type file: str, optional
+    :return: Modification time and size of the tree file and each of its sidecar files, None for missing sidecars
+    :rtype: list[list[int]]
+    """
+    stamp = []
+    for path in [file, get_journal_file(file), abspath(file) + DATABASE_LOG_SUFFIX]:
+        try:
+            file_stat = stat(path)
+            stamp.append([file_stat.st_mtime_ns, file_stat.st_size])
+        except FileNotFoundError:
+            stamp.append(None)
+    return stamp
+
+def read_catalog_tree(file:str=None) -> Tuple[dict, Dict[str, int]]:
+    """
+    Reads a JSON or binary tree file without writing anything, for summarizing it.
+    Unlike read_tree, saves stored in binary files aren't extracted, inline saves from older files aren't migrated,
+    and edits from the journal are applied without storing their persistent data.
+
+    :param file: Path of the tree file, defaults to None
+    :type file: str, optional
+    :return: Tree dict, and dict of the hashes of saves stored in the tree file to their stored size,
+                None and an empty dict if the file isn't valid
+    :rtype: tuple[dict, dict]
+    """
+    try:
+        blob_sizes = dict()
+        if is_binary_file(file):
+            tree_dict, blob_sizes = read_binary_structure(file)
+        else:
+            with open(abspath(file)) as in_file:
+                tree_dict = loads_json(in_file.read())
+        assert tree_dict["application"] == "VN-Organizer"
+        # Replay edits from the journal that aren't part of the snapshot
+        sequence = tree_dict.get("sequence", 0)
+        for operation in read_journal(file):
+            if operation["sequence"] > sequence and not operation["op"] == "set_persistent":
+                apply_operation(tree_dict, operation)
+                sequence = operation["sequence"]
+        return tree_dict, blob_sizes
+    except (AssertionError, FileNotFoundError, JSONDecodeError, KeyError, TypeError, UnicodeDecodeError):
+        return None, dict()
+
+def summarize_tree(file:str=None) -> dict:
+    """
+    Returns a summary of the contents of a tree file, without writing to it or to its blob directory.
+    The tree is valid if it can be read and all of its saves are stored in the file or in the blob store.
+    Database files are summarized with queries, without reading their branches.
+    Run in worker processes while scanning a catalog, so it only takes and returns plain data.
+
+    :param file: Path of the tree file, defaults to None
+    :type file: str, optional
+    :return: Summary dict with "valid", "branches", "complete_leaves", "incomplete_leaves", "completion",
+                "saves", "save_size", and "missing_saves" keys
+    :rtype: dict
+    """
+    summary = {"valid":False, "branches":0, "complete_leaves":0, "incomplete_leaves":0, "completion":0.0,
+                "saves":0, "save_size":0, "missing_saves":0}
+    try:
+        if is_database_file(file):
+            database_summary = get_database_summary(file)
+            if database_summary is None:
+                return summary
+            for key in ["branches", "complete_leaves", "incomplete_leaves"]:
+                summary[key] = database_summary[key]
+            blob_sizes = database_summary["saves"]
+        else:
+            tree_dict, blob_sizes = read_catalog_tree(file)
+            if tree_dict is None:
+                return summary
+            # Count the branches
+            stack = [tree_dict["tree"]]
+            while len(stack) > 0:
+                summary["branches"] += 1
+                stack.extend(stack.pop()["branch"])
+            # Get the completion of the tree
+            completion = get_completion(tree_dict["tree"])
+            summary["complete_leaves"] = completion["complete_leaves"]
+            summary["incomplete_leaves"] = completion["incomplete_leaves"]
+            blob_sizes = {**{blob_hash:None for blob_hash in get_tree_blobs(tree_dict["tree"])}, **blob_sizes}
+        leaves = summary["complete_leaves"] + summary["incomplete_leaves"]
+        summary["completion"] = 0.0 if leaves == 0 else summary["complete_leaves"] * 100 / leaves
+        # Get the space used by the saves, counting saves used in several branches once
+        blob_dir = get_blob_directory(file)
+        for blob_hash in blob_sizes:
+            size = get_stored_size(blob_dir, blob_hash)
+            if size is None:
+                size = blob_sizes[blob_hash]
+            if size is None:
+                summary["missing_saves"] += 1
+                continue
+            summary["saves"] += 1
+            summary["save_size"] += size
+        summary["valid"] = summary["missing_saves"] == 0
+        return summary
+    except (KeyError, TypeError):
+        summary["valid"] = False
+        return summary
+
+def read_catalog(directory:str=None) -> dict:
+    """
+    Reads the sidecar index of a directory of tree files.
+
+    :param directory: Directory of tree files, defaults to None
+    :type directory: str, optional
+    :return: Dict of file names to their catalog entries, empty if there is no usable index
+    :rtype: dict
+    """
+    try:
+        with open(get_catalog_file(directory)) as in_file:
+            json = loads_json(in_file.read())
+        assert json["application"] == "VN-Organizer"
+        assert json["catalog"] == CATALOG_VERSION
+        return json["files"]
+    except (AssertionError, FileNotFoundError, JSONDecodeError, KeyError, TypeError):
+        return dict()
+
+def write_catalog(directory:str=None, entries:dict=None) -> bool:
+    """
+    Writes the sidecar index of a directory of tree files.
+    The index is written to a temporary file first and renamed.
+
+    :param directory: Directory of tree files, defaults to None
+    :type directory: str, optional
+    :param entries: Dict of file names to their catalog entries, defaults to None
+    :type entries: dict, optional
+    :return: Whether the index was written
+    :rtype: bool
+    """
+    try:
+        catalog_file = get_catalog_file(directory)
+        temp_file = catalog_file + ".tmp"
+        json = {"application":"VN-Organizer", "catalog":CATALOG_VERSION, "files":entries}
+        with open(temp_file, "w") as out_file:
+            for chunk in iterencode_json(json, 4):
+                out_file.write(chunk)
+            out_file.flush()
+            fsync(out_file.fileno())
+        replace(temp_file, catalog_file)
+        return True
+    except (FileNotFoundError, PermissionError, TypeError):
+        return False
+
+def scan_catalog(directory:str=None, workers:int=None) -> dict:
+    """
+    Catalogs the tree files in a directory, updating its sidecar index.
+    Only files that changed since they were last catalogued are read again,
+    with the changed files read and summarized in parallel on a pool of worker processes.
+
+    :param directory: Directory of tree files, defaults to None
+    :type directory: str, optional
+    :param workers: Maximum number of worker processes, None to use the number of processors, defaults to None
+    :type workers: int, optional
+    :return: Dict of file names to their catalog entries, with the "stamp", "modified", and "scanned" of each file
+                as well as the keys of their summary, None if the directory doesn't exist
+    :rtype: dict
+    """
+    try:
+        if not isdir(abspath(directory)):
+            return None
+    except TypeError:
+        return None
+    old_entries = read_catalog(directory)
+    # Get the files that changed since they were catalogued
+    entries = dict()
+    changed = []
+    for file in get_tree_files(directory):
+        name = basename(file)
+        stamp = get_catalog_stamp(file)
+        entry = old_entries.get(name)
+        if entry is not None and entry.get("stamp") == stamp:
+            entry["scanned"] = False
+            entries[name] = entry
+            continue
+        entries[name] = {"stamp":stamp, "modified":max([part[0] for part in stamp if part is not None])}
+        changed.append(name)
+    # Summarize the changed files, in parallel if there's more than one
+    paths = [abspath(join(directory, name)) for name in changed]
+    if len(paths) > 1:
+        try:
+            max_workers = min(len(paths), cpu_count() or 1) if workers is None else workers
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                summaries = list(pool.map(summarize_tree, paths))
+        except (BrokenProcessPool, OSError):
+            summaries = [summarize_tree(path) for path in paths]
+    else:
+        summaries = [summarize_tree(path) for path in paths]
+    for name, summary in zip(changed, summaries):
+        entries[name].update(summary)
+        entries[name]["scanned"] = True
+    # Only rewrite the index if anything changed
+    if len(changed) > 0 or not len(entries) == len(old_entries):
+        write_catalog(directory, {name:{key:entries[name][key] for key in entries[name] if not key == "scanned"}
+                    for name in entries})
+    return entries
+
+def get_size_print(size:int=None) -> str:
+    """
+    Returns a number of bytes as readable text.
+
+    :param size: Number of bytes, defaults to None
+    :type size: int, optional
+    :return: Size with a unit
+    :rtype: str
+    """
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if size < 1024 or unit == "GiB":
+            return f"{size} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size = size / 1024
+
+def get_catalog_print(entries:dict=None) -> str:
+    """
+    Gets printable text to show the user the catalog of a directory as a table.
+
+    :param entries: Catalog entries as returned by scan_catalog, defaults to None
+    :type entries: dict, optional
+    :return: Printable catalog table
+    :rtype: str
+    """
+    header = f"{'File':<30} {'Branches':>9} {'Complete':>9} {'Saves':>7} {'Save Size':>11} {'Modified'}"
+    lines = [header, "-" * len(header)]
+    totals = {"branches":0, "complete_leaves":0, "incomplete_leaves":0, "saves":0, "save_size":0}
+    for name in sorted(entries):
+        entry = entries[name]
+        modified = datetime.fromtimestamp(entry["modified"] / 1000000000).strftime("%Y-%m-%d %H:%M")
+        if not entry["valid"] and entry["branches"] == 0:
+            lines.append(f"{name:<30} {'INVALID':>9} {'':>9} {'':>7} {'':>11} {modified}")
+            continue
+        line = f"{name:<30} {entry['branches']:>9} {entry['completion']:>8.1f}% {entry['saves']:>7}"
+        line = line + f" {get_size_print(entry['save_size']):>11} {modified}"
+        if entry["missing_saves"] > 0:
+            line = line + f" ({entry['missing_saves']} missing save(s))"
+        lines.append(line)
+        for key in totals:
+            totals[key] += entry[key]
+    # Add the totals of all valid files
+    leaves = totals["complete_leaves"] + totals["incomplete_leaves"]
+    completion = 0.0 if leaves == 0 else totals["complete_leaves"] * 100 / leaves
+    lines.append("-" * len(header))
+    line = f"{'Total':<30} {totals['branches']:>9} {completion:>8.1f}% {totals['saves']:>7}"
+    lines.append(line + f" {get_size_print(totals['save_size']):>11}")
+    return "\n".join(lines)
@@ -0,0 +1,707 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+from json import dumps, loads
+from os import replace
+from os.path import abspath, exists
+from threading import Lock
+from typing import TYPE_CHECKING, Callable, List, Set
+from vn_organizer.blob_store import has_blob
+from vn_organizer.blob_store import read_blob
+from vn_organizer.blob_store import write_blob
+from vn_organizer.nodes import BranchNode
+from vn_organizer.nodes import Item
+
+# SQLite is imported when a database is first opened, so reading files in other formats doesn't load it
+if TYPE_CHECKING:
+    from sqlite3 import Connection
+
+# File extension for tree files stored as SQLite databases
+DATABASE_EXTENSION = ".vndb"
+
+# Suffix of the log SQLite keeps next to database files while they are open
+DATABASE_LOG_SUFFIX = "-wal"
+
+# First bytes of every SQLite database file
+DATABASE_MAGIC = b"SQLite format 3\x00"
+
+# Tables of a database tree file, branches and items are indexed by the branch they belong to
+DATABASE_SCHEMA = """CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS nodes (id INTEGER PRIMARY KEY AUTOINCREMENT, parent INTEGER, position INTEGER NOT NULL,
+    prompt TEXT, response TEXT, ending INTEGER NOT NULL,
+    complete_leaves INTEGER NOT NULL, incomplete_leaves INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS node_children ON nodes (parent, position);
+CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY, node INTEGER NOT NULL, position INTEGER NOT NULL,
+    type TEXT NOT NULL, text TEXT, hash TEXT);
+CREATE INDEX IF NOT EXISTS node_items ON items (node, position);
+CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, data BLOB NOT NULL) WITHOUT ROWID;"""
+
+# Keys of the tree dict stored in the meta table
+META_KEYS = ["application", "format", "sequence", "primary_path", "secondary_path", "persistent"]
+
+# Query prefix selecting the IDs of the given branches and all of their sub-branches as "subtree"
+SUBTREE = "WITH RECURSIVE subtree(id) AS (SELECT id FROM nodes WHERE id IN ({}) "\
+            + "UNION ALL SELECT nodes.id FROM nodes JOIN subtree ON nodes.parent = subtree.id) "
+
+# Query selecting the IDs of a branch and every branch above it, starting with the root
+ANCESTORS = "WITH RECURSIVE ancestors(id, parent, depth) AS (SELECT id, parent, 0 FROM nodes WHERE id = ? "\
+            + "UNION ALL SELECT nodes.id, nodes.parent, depth + 1 FROM nodes JOIN ancestors ON nodes.id = ancestors.parent) "\
+            + "SELECT id FROM ancestors ORDER BY depth DESC"
+
+# Maximum number of branch IDs given to a single query
+QUERY_IDS = 500
+
+class StoredNode(BranchNode):
+    """
+    Branch stored in a database tree file, loaded as it is used.
+    The prompt, response, and end flag are read with the branch, while its items and sub-branches
+    are only read the first time either of them is used.
+    Until then, the completion counts stored with the branch stand in for those of its sub-branches.
+    """
+    __slots__ = ("store", "row_id", "complete_leaves", "incomplete_leaves", "loaded")
+
+    def __init__(self, store:dict=None, row_id:int=None, prompt:str=None, response:str=None,
+                end:bool=False, complete_leaves:int=0, incomplete_leaves:int=0):
+        super().__init__(prompt, response, None, None, bool(end))
+        self.store = store
+        self.row_id = row_id
+        self.complete_leaves = complete_leaves
+        self.incomplete_leaves = incomplete_leaves
+        self.loaded = False
+
+    def __getitem__(self, key:str):
+        if not self.loaded and (key == "item_list" or key == "branch"):
+            load_node(self)
+        return super().__getitem__(key)
+
+    def __setitem__(self, key:str, value):
+        if not self.loaded and (key == "item_list" or key == "branch"):
+            load_node(self)
+        super().__setitem__(key, value)
+
+    def get(self, key:str, default=None):
+        return self[key] if key in BranchNode.__slots__ else default
+
+    def items(self) -> list:
+        load_node(self)
+        return super().items()
+
+def use_database_format(file:str=None) -> bool:
+    """
+    Returns whether a tree file should be stored as a database, based on its extension.
+
+    :param file: Path of the tree file, defaults to None
+    :type file: str, optional
+    :return: Whether to use the database format
+    :rtype: bool
+    """
+    try:
+        return file.lower().endswith(DATABASE_EXTENSION)
+    except AttributeError:
+        return False
+
+def is_database_file(file:str=None) -> bool:
+    """
+    Returns whether an existing tree file is stored as a database.
+
+    :param file: Path of the tree file, defaults to None
+    :type file: str, optional
+    :return: Whether the file starts with the SQLite magic bytes
+    :rtype: bool
+    """
+    try:
+        with open(abspath(file), "rb") as in_file:
+            return in_file.read(len(DATABASE_MAGIC)) == DATABASE_MAGIC
+    except (FileNotFoundError, IsADirectoryError, TypeError):
+        return False
+
+def is_loaded(branch_dict:dict=None) -> bool:
+    """
+    Returns whether the items and sub-branches of a branch are in memory.
+    Only branches read lazily from a database tree file can be unloaded.
+
+    :param branch_dict: Branch dict to check, defaults to None
+    :type branch_dict: dict, optional
+    :return: Whether the branch is loaded
+    :rtype: bool
+    """
+    return not isinstance(branch_dict, StoredNode) or branch_dict.loaded
+
+def get_stored_completion(node:StoredNode=None) -> dict:
+    """
+    Returns the completion state of an unloaded branch from the counts stored with it.
+    A branch is complete when none of the endings below it are incomplete.
+
+    :param node: Branch to get the completion of, defaults to None
+    :type node: StoredNode, optional
+    :return: Dict with "complete", "complete_leaves" and "incomplete_leaves" keys
+    :rtype: dict
+    """
+    return {"complete":node.incomplete_leaves == 0,
+                "complete_leaves":node.complete_leaves,
+                "incomplete_leaves":node.incomplete_leaves}
+
+def open_database(file:str=None, read_only:bool=False) -> Connection:
+    """
+    Opens a database tree file, creating its tables if they don't exist.
+    Databases use write-ahead logging, so branches can be read while edits are being written.
+    Connections can be shared between threads, as long as only one thread uses them at a time.
+    Opened read only, the database is left as it is, and databases without a log are read without creating one.
+
+    :param file: Path of the tree file, defaults to None
+    :type file: str, optional
+    :param read_only: Whether to open the database without writing to it, defaults to False
+    :type read_only: bool, optional
+    :return: Connection to the database
+    :rtype: Connection
+    """
+    from sqlite3 import connect
+    if read_only:
+        from urllib.parse import quote
+        uri = "file:" + quote(abspath(file).replace("\\", "/"), safe="/:") + "?mode=ro"
+        if not exists(abspath(file) + DATABASE_LOG_SUFFIX):
+            uri = uri + "&immutable=1"
+        return connect(uri, uri=True, check_same_thread=False)
+    connection = connect(abspath(file), check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(DATABASE_SCHEMA)
+    return connection
+
+def get_database_summary(file:str=None) -> dict:
+    """
+    Returns the number of branches, completion, and saves of a database tree file, without writing to it.
+    Completion is taken from the counts stored with the root branch, so no branches are read.
+
+    :param file: Path of the database tree file, defaults to None
+    :type file: str, optional
+    :return: Dict with "branches", "complete_leaves", and "incomplete_leaves" counts,
+                and "saves" as a dict of the hashes of the saves in the tree to their stored size,
+                with None for saves that aren't stored in the database, None if the file isn't valid
+    :rtype: dict
+    """
+    from sqlite3 import DatabaseError
+    connection = None
+    try:
+        connection = open_database(file, True)
+        meta = {row[0]:loads(row[1]) for row in connection.execute("SELECT key, value FROM meta")}
+        assert meta["application"] == "VN-Organizer"
+        summary = {"branches":connection.execute("SELECT COUNT(*) FROM nodes").fetchone()[0]}
+        row = connection.execute("SELECT complete_leaves, incomplete_leaves FROM nodes WHERE parent IS NULL").fetchone()
+        summary["complete_leaves"], summary["incomplete_leaves"] = row
+        summary["saves"] = {row[0]:row[1] for row in connection.execute("SELECT items.hash, LENGTH(blobs.data) "
+                    + "FROM items LEFT JOIN blobs ON blobs.hash = items.hash "
+                    + "WHERE items.type = 's' AND items.hash IS NOT NULL GROUP BY items.hash")}
+        return summary
+    except (AssertionError, DatabaseError, KeyError, TypeError, ValueError):
+        return None
+    finally:
+        if connection is not None:
+            connection.close()
+
+def load_node(node:StoredNode=None):
+    """
+    Reads the items and sub-branches of a branch from its database.
+    Functions watching the database with watch_loads are called with the branch once it is loaded.
+
+    :param node: Branch to load, defaults to None
+    :type node: StoredNode, optional
+    """
+    store = node.store
+    with store["lock"]:
+        if node.loaded:
+            return None
+        connection = store["connection"]
+        rows = connection.execute("SELECT type, text, hash FROM items WHERE node = ? ORDER BY position",
+                    (node.row_id,)).fetchall()
+        node.item_list = [Item(row[0], row[1], row[2]) for row in rows]
+        rows = connection.execute("SELECT id, prompt, response, ending, complete_leaves, incomplete_leaves "
+                    + "FROM nodes WHERE parent = ? ORDER BY position", (node.row_id,)).fetchall()
+        node.branch = [StoredNode(store, *row) for row in rows]
+        node.loaded = True
+    for callback in store["on_load"]:
+        callback(node)
+
+def watch_loads(branch_dict:dict=None, callback:Callable[[StoredNode], None]=None):
+    """
+    Calls a function with every branch of a lazily read tree as it is loaded from the database.
+    Does nothing for trees that aren't read from a database.
+
+    :param branch_dict: Root branch of the tree, defaults to None
+    :type branch_dict: dict, optional
+    :param callback: Function to call with each loaded branch, defaults to None
+    :type callback: Callable[[StoredNode], None], optional
+    """
+    if isinstance(branch_dict, StoredNode):
+        branch_dict.store["on_load"].append(callback)
+
+def insert_branches(connection:Connection=None, branches:List[dict]=None, parent_id:int=None, position:int=0) -> Set[str]:
+    """
+    Inserts branch dicts and all of their sub-branches into a database, along with the completion counts of each branch.
+    Positions of existing branches aren't changed, so room has to be made for the branches first.
+
+    :param connection: Connection to the database, defaults to None
+    :type connection: Connection, optional
+    :param branches: Branch dicts to insert, defaults to None
+    :type branches: list[dict], optional
+    :param parent_id: Row ID of the branch to insert into, None for the root branch, defaults to None
+    :type parent_id: int, optional
+    :param position: Position of the first branch in its parent, defaults to 0
+    :type position: int, optional
+    :return: Hashes of the saves in the inserted branches
+    :rtype: set[str]
+    """
+    # Count the endings below each branch, counting every branch after its sub-branches
+    order = []
+    stack = list(branches)
+    while len(stack) > 0:
+        cur_dict = stack.pop()
+        order.append(cur_dict)
+        stack.extend(cur_dict["branch"])
+    counts = dict()
+    for cur_dict in reversed(order):
+        if len(cur_dict["branch"]) == 0:
+            counts[id(cur_dict)] = (1, 0) if cur_dict["end"] else (0, 1)
+            continue
+        sub_counts = [counts[id(branch)] for branch in cur_dict["branch"]]
+        counts[id(cur_dict)] = (sum([count[0] for count in sub_counts]), sum([count[1] for count in sub_counts]))
+    # Insert each branch before its sub-branches, so they can refer to it
+    hashes = set()
+    stack = [(branches[i], parent_id, position + i) for i in range(len(branches) - 1, -1, -1)]
+    while len(stack) > 0:
+        cur_dict, cur_parent, cur_position = stack.pop()
+        count = counts[id(cur_dict)]
+        row_id = connection.execute("INSERT INTO nodes (parent, position, prompt, response, ending, "
+                    + "complete_leaves, incomplete_leaves) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (cur_parent, cur_position, cur_dict["prompt"], cur_dict["response"],
+                    int(bool(cur_dict["end"])), count[0], count[1])).lastrowid
+        rows = []
+        item_list = cur_dict["item_list"]
+        for i in range(0, len(item_list)):
+            rows.append((row_id, i, item_list[i]["type"], item_list[i].get("text"), item_list[i].get("hash")))
+            if item_list[i]["type"] == "s":
+                hashes.add(item_list[i]["hash"])
+        connection.executemany("INSERT INTO items (node, position, type, text, hash) VALUES (?, ?, ?, ?, ?)", rows)
+        sub_branches = cur_dict["branch"]
+        for i in range(len(sub_branches) - 1, -1, -1):
+            stack.append((sub_branches[i], row_id, i))
+    return hashes
+
+def delete_branches(connection:Connection=None, row_ids:List[int]=None):
+    """
+    Deletes branches and all of their sub-branches and items from a database.
+    Positions of the remaining branches aren't changed.
+
+    :param connection: Connection to the database, defaults to None
+    :type connection: Connection, optional
+    :param row_ids: Row IDs of the branches to delete, defaults to None
+    :type row_ids: list[int], optional
+    """
+    for i in range(0, len(row_ids), QUERY_IDS):
+        chunk = row_ids[i:i+QUERY_IDS]
+        subtree = SUBTREE.format(", ".join(["?"] * len(chunk)))
+        connection.execute(subtree + "DELETE FROM items WHERE node IN subtree", chunk)
+        connection.execute(subtree + "DELETE FROM nodes WHERE id IN subtree", chunk)
+
+def store_blobs(connection:Connection=None, blob_dir:str=None, hashes:List[str]=None) -> int:
+    """
+    Copies blobs from the blob directory into a database, skipping blobs that are already in it.
+
+    :param connection: Connection to the database, defaults to None
+    :type connection: Connection, optional
+    :param blob_dir: Blob directory holding the blobs, defaults to None
+    :type blob_dir: str, optional
+    :param hashes: Hashes of the blobs to store, defaults to None
+    :type hashes: list[str], optional
+    :return: Number of blobs stored
+    :rtype: int
+    """
+    stored = 0
+    for blob_hash in hashes:
+        if blob_hash is None or not has_blob(blob_dir, blob_hash):
+            continue
+        if connection.execute("SELECT 1 FROM blobs WHERE hash = ?", (blob_hash,)).fetchone() is not None:
+            continue
+        connection.execute("INSERT INTO blobs (hash, data) VALUES (?, ?)", (blob_hash, read_blob(blob_dir, blob_hash)))
+        stored += 1
+    return stored
+
+def extract_blobs(connection:Connection=None, blob_dir:str=None, hashes:List[str]=None) -> int:
+    """
+    Copies blobs from a database into the blob directory, skipping blobs that are already in it.
+
+    :param connection: Connection to the database, defaults to None
+    :type connection: Connection, optional
+    :param blob_dir: Blob directory to copy to, defaults to None
+    :type blob_dir: str, optional
+    :param hashes: Hashes of the blobs to copy, defaults to None
+    :type hashes: list[str], optional
+    :return: Number of blobs copied
+    :rtype: int
+    """
+    extracted = 0
+    for blob_hash in hashes:
+        if blob_hash is None or has_blob(blob_dir, blob_hash):
+            continue
+        row = connection.execute("SELECT data FROM blobs WHERE hash = ?", (blob_hash,)).fetchone()
+        if row is not None and write_blob(blob_dir, row[0]) is not None:
+            extracted += 1
+    return extracted
+
+def load_blobs(branch_dict:dict=None, blob_dir:str=None, hashes:List[str]=None) -> int:
+    """
+    Copies blobs a lazily read tree needs from its database into the blob directory.
+    Does nothing for trees that aren't read from a database.
+
+    :param branch_dict: Root branch of the tree, defaults to None
+    :type branch_dict: dict, optional
+    :param blob_dir: Blob directory to copy to, defaults to None
+    :type blob_dir: str, optional
+    :param hashes: Hashes of the blobs to copy, defaults to None
+    :type hashes: list[str], optional
+    :return: Number of blobs copied
+    :rtype: int
+    """
+    if not isinstance(branch_dict, StoredNode):
+        return 0
+    with branch_dict.store["lock"]:
+        return extract_blobs(branch_dict.store["connection"], blob_dir, hashes)
+
+def write_database_tree(file:str=None, tree_dict:dict=None, blob_dir:str=None):
+    """
+    Writes a tree dict to a database tree file, along with the persistent data and every save referenced in the tree.
+    Existing databases are rewritten in a single transaction, so a failed write leaves them unchanged.
+    Other files are replaced once the new database has been written next to them.
+
+    :param file: Path of the tree file, defaults to None
+    :type file: str, optional
+    :param tree_dict: Tree dict with the same keys as a JSON tree file, defaults to None
+    :type tree_dict: dict, optional
+    :param blob_dir: Blob directory holding the saves in the tree, defaults to None
+    :type blob_dir: str, optional
+    """
+    in_place = not exists(abspath(file)) or is_database_file(file)
+    database_file = abspath(file) if in_place else abspath(file) + ".tmp"
+    connection = open_database(database_file)
+    try:
+        with connection:
+            connection.execute("DELETE FROM meta")
+            connection.execute("DELETE FROM items")
+            connection.execute("DELETE FROM nodes")
+            for key in META_KEYS:
+                connection.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (key, dumps(tree_dict[key])))
+            hashes = insert_branches(connection, [tree_dict["tree"]], None, 0)
+            store_blobs(connection, blob_dir, sorted(hashes) + [tree_dict["persistent"]])
+    finally:
+        connection.close()
+    if not in_place:
+        replace(database_file, abspath(file))
+
+def read_database_tree(file:str=None, blob_dir:str=None, lazy:bool=False) -> dict:
+    """
+    Reads a database tree file.
+    Read lazily, only the root branch is read, and other branches are loaded from the database as they are used.
+    Otherwise the whole tree is read as branch dicts, and saves that aren't in the blob directory yet are extracted into it.
+    The persistent data is always extracted, so it can be restored.
+
+    :param file: Path of the database tree file, defaults to None
+    :type file: str, optional
+    :param blob_dir: Blob directory to extract saves to, defaults to None
+    :type blob_dir: str, optional
+    :param lazy: Whether to load branches as they are used, defaults to False
+    :type lazy: bool, optional
+    :return: Tree dict with the same keys as a JSON tree file, None if the file isn't valid
+    :rtype: dict
+    """
+    from sqlite3 import DatabaseError
+    connection = None
+    try:
+        # Check the file exists first, as opening a missing file would create an empty database
+        if not exists(abspath(file)):
+            return None
+        connection = open_database(file)
+        tree_dict = dict()
+        for row in connection.execute("SELECT key, value FROM meta"):
+            tree_dict[row[0]] = loads(row[1])
+        extract_blobs(connection, blob_dir, [tree_dict["persistent"]])
+        columns = "id, prompt, response, ending, complete_leaves, incomplete_leaves"
+        if lazy:
+            # Read the root branch, keeping the connection open for loading the others
+            row = connection.execute(f"SELECT {columns} FROM nodes WHERE parent IS NULL").fetchone()
+            store = {"connection":connection, "lock":Lock(), "on_load":[]}
+            tree_dict["tree"] = StoredNode(store, *row)
+            connection = None
+            return tree_dict
+        # Read every branch and attach it to its parent
+        nodes = dict()
+        root = None
+        for row in connection.execute(f"SELECT {columns}, parent FROM nodes ORDER BY parent, position"):
+            nodes[row[0]] = {"prompt":row[1], "response":row[2], "item_list":[], "branch":[], "end":bool(row[3])}
+            if row[6] is None:
+                root = nodes[row[0]]
+        for row in connection.execute("SELECT parent, id FROM nodes WHERE parent IS NOT NULL ORDER BY parent, position"):
+            nodes[row[0]]["branch"].append(nodes[row[1]])
+        for row in connection.execute("SELECT node, type, text, hash FROM items ORDER BY node, position"):
+            item = {"type":row[1], "text":row[2]} if row[3] is None else {"type":row[1], "hash":row[3]}
+            nodes[row[0]]["item_list"].append(item)
+        extract_blobs(connection, blob_dir, [row[0] for row in connection.execute("SELECT hash FROM blobs")])
+        tree_dict["tree"] = root
+        return tree_dict
+    except (DatabaseError, KeyError, TypeError, ValueError):
+        return None
+    finally:
+        # The connection is kept open by the stored nodes of a lazily read tree
+        if connection is not None:
+            connection.close()
+
+def get_row_from_path(connection:Connection=None, path:List[int]=None) -> int:
+    """
+    Returns the row ID of the branch at the given path in a database.
+
+    :param connection: Connection to the database, defaults to None
+    :type connection: Connection, optional
+    :param path: Path of the branch, defaults to None
+    :type path: list[int], optional
+    :return: Row ID of the branch, None if the path is invalid
+    :rtype: int
+    """
+    row = connection.execute("SELECT id FROM nodes WHERE parent IS NULL").fetchone()
+    for position in path:
+        if row is None:
+            return None
+        row = connection.execute("SELECT id FROM nodes WHERE parent = ? AND position = ?", (row[0], position)).fetchone()
+    return None if row is None else row[0]
+
+def get_list_position(length:int=None, position:int=None, insert:bool=False) -> int:
+    """
+    Returns the position in a list a list index refers to, following the rules of Python lists.
+
+    :param length: Length of the list, defaults to None
+    :type length: int, optional
+    :param position: Index into the list, defaults to None
+    :type position: int, optional
+    :param insert: Whether the index is for inserting into the list, defaults to False
+    :type insert: bool, optional
+    :return: Position in the list, None if the index is out of range
+    :rtype: int
+    """
+    if position < 0:
+        position += length
+    if insert:
+        return min(max(position, 0), length)
+    return position if 0 <= position < length else None
+
+def update_stored_completion(connection:Connection=None, row_id:int=None):
+    """
+    Updates the completion counts stored for a branch and every branch above it after the branch changes.
+
+    :param connection: Connection to the database, defaults to None
+    :type connection: Connection, optional
+    :param row_id: Row ID of the branch that changed, defaults to None
+    :type row_id: int, optional
+    """
+    cur_id = row_id
+    while cur_id is not None:
+        count, complete, incomplete = connection.execute("SELECT COUNT(*), COALESCE(SUM(complete_leaves), 0), "
+                    + "COALESCE(SUM(incomplete_leaves), 0) FROM nodes WHERE parent = ?", (cur_id,)).fetchone()
+        parent_id, end = connection.execute("SELECT parent, ending FROM nodes WHERE id = ?", (cur_id,)).fetchone()
+        if count == 0:
+            complete, incomplete = (1, 0) if end else (0, 1)
+        connection.execute("UPDATE nodes SET complete_leaves = ?, incomplete_leaves = ? WHERE id = ?",
+                    (complete, incomplete, cur_id))
+        cur_id = parent_id
+
+def apply_database_operation(connection:Connection=None, operation:dict=None, blob_dir:str=None) -> bool:
+    """
+    Applies an edit operation to the rows of a database, the same way apply_operation applies it to a tree dict.
+    Saves the operation adds are copied into the database from the blob directory.
+
+    :param connection: Connection to the database, defaults to None
+    :type connection: Connection, optional
+    :param operation: Edit operation to apply, defaults to None
+    :type operation: dict, optional
+    :param blob_dir: Blob directory holding the saves the operation adds, defaults to None
+    :type blob_dir: str, optional
+    :return: Whether the operation was applied
+    :rtype: bool
+    """
+    try:
+        op = operation["op"]
+        # Apply operations that affect the whole file
+        if op == "set_paths":
+            for key, value in [("primary_path", operation["primary"]), ("secondary_path", operation["secondary"])]:
+                connection.execute("UPDATE meta SET value = ? WHERE key = ?", (dumps(value), key))
+            return True
+        if op == "set_persistent":
+            store_blobs(connection, blob_dir, [operation["hash"]])
+            connection.execute("UPDATE meta SET value = ? WHERE key = 'persistent'", (dumps(operation["hash"]),))
+            return True
+        # Apply operations that affect a single branch
+        row_id = get_row_from_path(connection, operation["path"])
+        if row_id is None:
+            return False
+        item_count = connection.execute("SELECT COUNT(*) FROM items WHERE node = ?", (row_id,)).fetchone()[0]
+        child_ids = [row[0] for row in connection.execute("SELECT id FROM nodes WHERE parent = ? ORDER BY position",
+                    (row_id,))]
+        if op == "add_item":
+            item = operation["item"]
+            position = get_list_position(item_count, operation.get("index", item_count), True)
+            connection.execute("UPDATE items SET position = position + 1 WHERE node = ? AND position >= ?",
+                        (row_id, position))
+            connection.execute("INSERT INTO items (node, position, type, text, hash) VALUES (?, ?, ?, ?, ?)",
+                        (row_id, position, item["type"], item.get("text"), item.get("hash")))
+            if item["type"] == "s":
+                store_blobs(connection, blob_dir, [item["hash"]])
+            return True
+        if op == "delete_item":
+            position = get_list_position(item_count, operation["index"])
+            if position is None:
+                return False
+            connection.execute("DELETE FROM items WHERE node = ? AND position = ?", (row_id, position))
+            connection.execute("UPDATE items SET position = position - 1 WHERE node = ? AND position > ?",
+                        (row_id, position))
+            return True
+        if op == "create_branch":
+            if type(operation["prompt"]) is not str or type(operation["responses"]) is not list:
+                return True
+            delete_branches(connection, child_ids)
+            branches = []
+            for response in operation["responses"]:
+                branches.append({"prompt":operation["prompt"], "response":response,
+                            "item_list":[], "branch":[], "end":False})
+            insert_branches(connection, branches, row_id, 0)
+            connection.execute("UPDATE nodes SET ending = 0 WHERE id = ?", (row_id,))
+        elif op == "delete_branch":
+            position = get_list_position(len(child_ids), operation["index"])
+            if position is None:
+                return False
+            delete_branches(connection, [child_ids[position]])
+            connection.execute("UPDATE nodes SET position = position - 1 WHERE parent = ? AND position > ?",
+                        (row_id, position))
+        elif op == "insert_branch":
+            position = get_list_position(len(child_ids), operation["index"], True)
+            connection.execute("UPDATE nodes SET position = position + 1 WHERE parent = ? AND position >= ?",
+                        (row_id, position))
+            store_blobs(connection, blob_dir, sorted(insert_branches(connection, [operation["branch"]], row_id, position)))
+        elif op == "set_branches":
+            delete_branches(connection, child_ids)
+            store_blobs(connection, blob_dir, sorted(insert_branches(connection, operation["branches"], row_id, 0)))
+            connection.execute("UPDATE nodes SET ending = ? WHERE id = ?", (int(bool(operation["end"])), row_id))
+        elif op == "toggle_end":
+            connection.execute("UPDATE nodes SET ending = CASE WHEN ? > 0 THEN 0 ELSE 1 - ending END WHERE id = ?",
+                        (len(child_ids), row_id))
+        else:
+            return False
+        # Update the completion counts for changes to the branches
+        update_stored_completion(connection, row_id)
+        return True
+    except (IndexError, KeyError, TypeError):
+        return False
+
+def save_database_operations(file:str=None, operations:List[dict]=None, blob_dir:str=None) -> bool:
+    """
+    Saves edit operations to a database tree file as row updates.
+    All of the operations are written in a single transaction, so either every operation is saved or none are.
+    The sequence number of the last operation is stored along with them.
+
+    :param file: Path of the database tree file, defaults to None
+    :type file: str, optional
+    :param operations: Numbered edit operations to save, defaults to None
+    :type operations: list[dict], optional
+    :param blob_dir: Blob directory holding the saves the operations add, defaults to None
+    :type blob_dir: str, optional
+    :return: Whether the operations were saved
+    :rtype: bool
+    """
+    from sqlite3 import DatabaseError
+    try:
+        connection = open_database(file)
+        try:
+            for operation in operations:
+                if not apply_database_operation(connection, operation, blob_dir):
+                    connection.rollback()
+                    return False
+            if len(operations) > 0:
+                connection.execute("UPDATE meta SET value = ? WHERE key = 'sequence'", (dumps(operations[-1]["sequence"]),))
+            connection.commit()
+            return True
+        finally:
+            connection.close()
+    except (DatabaseError, KeyError, TypeError):
+        return False
+
+def get_stored_tree_blobs(branch_dict:dict=None) -> List[str]:
+    """
+    Returns the hashes of every save blob referenced in a tree, the same as get_tree_blobs.
+    Saves below branches that haven't been loaded from their database are read from it without loading the branches.
+
+    :param branch_dict: Root branch of the tree, defaults to None
+    :type branch_dict: dict, optional
+    :return: List of unique blob hashes
+    :rtype: list[str]
+    """
+    try:
+        hashes = dict()
+        unloaded = []
+        stack = [branch_dict]
+        while len(stack) > 0:
+            cur_dict = stack.pop()
+            if not is_loaded(cur_dict):
+                unloaded.append(cur_dict)
+                continue
+            for item in cur_dict["item_list"]:
+                if item["type"] == "s" and "hash" in item:
+                    hashes[item["hash"]] = None
+            stack.extend(cur_dict["branch"])
+        if len(unloaded) == 0:
+            return list(hashes)
+        # Read the saves of the unloaded branches and their sub-branches
+        store = unloaded[0].store
+        with store["lock"]:
+            for i in range(0, len(unloaded), QUERY_IDS):
+                chunk = [node.row_id for node in unloaded[i:i+QUERY_IDS]]
+                subtree = SUBTREE.format(", ".join(["?"] * len(chunk)))
+                for row in store["connection"].execute(subtree + "SELECT hash FROM items "
+                            + "WHERE node IN subtree AND hash IS NOT NULL", chunk):
+                    hashes[row[0]] = None
+        return list(hashes)
+    except (KeyError, TypeError):
+        return []
+
+def load_matches(branch_dict:dict=None, terms:Set[str]=None):
+    """
+    Loads the branches of a lazily read tree that may contain every given search term, along with the branches above them.
+    Matches are found with case-insensitive substring searches, so the loaded branches need to be checked for the terms.
+    Does nothing for trees that aren't read from a database.
+
+    :param branch_dict: Root branch of the tree, defaults to None
+    :type branch_dict: dict, optional
+    :param terms: Search terms, defaults to None
+    :type terms: set[str], optional
+    """
+    if not isinstance(branch_dict, StoredNode):
+        return None
+    # Get the branches containing each term, and the branches above them
+    store = branch_dict.store
+    with store["lock"]:
+        connection = store["connection"]
+        matches = None
+        for term in terms:
+            pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            rows = connection.execute("SELECT id FROM nodes WHERE prompt LIKE ?1 ESCAPE '\\' OR response LIKE ?1 ESCAPE '\\' "
+                        + "UNION SELECT node FROM items WHERE text LIKE ?1 ESCAPE '\\'", (pattern,))
+            row_ids = set([row[0] for row in rows])
+            matches = row_ids if matches is None else matches & row_ids
+            if len(matches) == 0:
+                return None
+        chains = [[row[0] for row in connection.execute(ANCESTORS, (row_id,))] for row_id in sorted(matches)]
+    # Load each branch through the branches above it, skipping branches that were removed from the tree
+    for chain in chains:
+        cur_dict = branch_dict
+        for row_id in chain[1:]:
+            branches = [branch for branch in cur_dict["branch"] if getattr(branch, "row_id", None) == row_id]
+            if len(branches) == 0:
+                cur_dict = None
+                break
+            cur_dict = branches[0]
+        if isinstance(cur_dict, StoredNode):
+            load_node(cur_dict)
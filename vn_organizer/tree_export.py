@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+
+from base64 import standard_b64encode as b64encode
+from html import escape
+from os import fsync, remove, replace
+from os.path import abspath, basename, exists
+from typing import List, TextIO
+from vn_organizer.blob_store import get_blob_directory
+from vn_organizer.blob_store import get_blob_path
+from vn_organizer.blob_store import read_blob
+from vn_organizer.vn_organizer import read_tree
+from vn_organizer.vn_organizer import write_b64
+
+# File extensions exported as Graphviz DOT, everything else is exported as HTML
+DOT_EXTENSIONS = [".dot", ".gv"]
+
+# Fill colors for complete and incomplete branches in DOT exports
+DOT_COMPLETE = "#c8f0c8"
+DOT_INCOMPLETE = "#f0c8c8"
+
+# Style sheet for HTML exports, branches are colored by whether they contain an incomplete ending
+HTML_STYLE = """body { font-family: sans-serif; }
+ul { list-style: none; margin: 0; padding-left: 1em; }
+details { margin-left: 1em; }
+details:has(.incomplete) > summary { color: #c03030; }
+details:not(:has(.incomplete)) > summary { color: #208020; }
+.prompt { color: #c03030; font-style: italic; margin-left: 1em; }
+.r { color: #c03030; } .g { color: #208020; } .b { color: #2040c0; }
+.c { color: #108080; } .m { color: #a020a0; } .y { color: #a08000; }
+.save { color: #108080; } .complete { color: #208020; } .incomplete { color: #c03030; }"""
+
+def escape_dot(text:str=None) -> str:
+    """
+    Returns text escaped for use in a quoted Graphviz DOT string.
+
+    :param text: Text to escape, defaults to None
+    :type text: str, optional
+    :return: Escaped text
+    :rtype: str
+    """
+    return text.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def get_dot_label(branch_dict:dict=None, include_saves:bool=False) -> str:
+    """
+    Returns the escaped DOT label for a branch, listing its response and items.
+
+    :param branch_dict: Branch dict, defaults to None
+    :type branch_dict: dict, optional
+    :param include_saves: Whether to list the hash of each save, defaults to False
+    :type include_saves: bool, optional
+    :return: Escaped label text
+    :rtype: str
+    """
+    lines = ["Start" if branch_dict["response"] is None else branch_dict["response"]]
+    save_num = 1
+    for item in branch_dict["item_list"]:
+        if item["type"] == "s":
+            lines.append(f"(S) Save {save_num}" + (f" {item['hash']}" if include_saves else ""))
+            save_num += 1
+        else:
+            lines.append("(E) " + item["text"])
+    return "\\l".join([escape_dot(line) for line in lines]) + "\\l"
+
+def write_dot(out_file:TextIO=None, branch_dict:dict=None, include_saves:bool=False):
+    """
+    Writes a tree to an open text stream as a Graphviz DOT graph.
+    Branches are written in a single depth first pass once all of their sub-branches are written,
+    so completion is worked out along the way and memory use only depends on the depth of the tree.
+
+    :param out_file: Text stream to write to, defaults to None
+    :type out_file: TextIO, optional
+    :param branch_dict: Root branch dict of the tree, defaults to None
+    :type branch_dict: dict, optional
+    :param include_saves: Whether to list the hash of each save, defaults to False
+    :type include_saves: bool, optional
+    """
+    out_file.write("digraph vn_organizer {\n")
+    out_file.write("    node [shape=box, style=filled];\n")
+    # Each entry holds a branch, its node number, an iterator of its sub-branches, and whether it's complete so far
+    num = 0
+    stack = [[branch_dict, num, iter(branch_dict["branch"]), True]]
+    while len(stack) > 0:
+        entry = stack[-1]
+        sub_dict = next(entry[2], None)
+        if sub_dict is not None:
+            num += 1
+            stack.append([sub_dict, num, iter(sub_dict["branch"]), True])
+            continue
+        # Write the branch once all of its sub-branches are written
+        stack.pop()
+        cur_dict = entry[0]
+        complete = entry[3] if len(cur_dict["branch"]) > 0 else cur_dict["end"]
+        color = DOT_COMPLETE if complete else DOT_INCOMPLETE
+        label = get_dot_label(cur_dict, include_saves)
+        out_file.write(f"    n{entry[1]} [label=\"{label}\", fillcolor=\"{color}\"];\n")
+        if len(stack) > 0:
+            parent = stack[-1]
+            parent[3] = parent[3] and complete
+            prompt = "" if cur_dict["prompt"] is None else escape_dot(cur_dict["prompt"])
+            out_file.write(f"    n{parent[1]} -> n{entry[1]} [label=\"{prompt}\"];\n")
+    out_file.write("}\n")
+
+def write_html_items(out_file:TextIO=None, branch_dict:dict=None, blob_dir:str=None,
+            include_saves:bool=False) -> List[str]:
+    """
+    Writes the items of a branch to an open text stream as an HTML list.
+    Saves missing from the blob store are listed without a download link.
+
+    :param out_file: Text stream to write to, defaults to None
+    :type out_file: TextIO, optional
+    :param branch_dict: Branch dict, defaults to None
+    :type branch_dict: dict, optional
+    :param blob_dir: Blob directory holding the saves in the tree, defaults to None
+    :type blob_dir: str, optional
+    :param include_saves: Whether to embed each save as a download link, defaults to False
+    :type include_saves: bool, optional
+    :return: Hashes of the saves that are missing from the blob store, if including saves
+    :rtype: list[str]
+    """
+    missing = []
+    out_file.write("<ul>")
+    save_num = 1
+    for item in branch_dict["item_list"]:
+        if not item["type"] == "s":
+            out_file.write(f"<li class=\"{escape(item['type'])}\">(E) {escape(item['text'])}</li>")
+            continue
+        if include_saves:
+            # Stream the save into the file as a data link, decoding saves stored as deltas first
+            blob_file = get_blob_path(blob_dir, item["hash"])
+            stored = exists(blob_file)
+            data = None if stored else read_blob(blob_dir, item["hash"])
+            if not stored and data is None:
+                missing.append(item["hash"])
+                out_file.write(f"<li class=\"save\">(S) Save {save_num} (Missing)</li>")
+                save_num += 1
+                continue
+            out_file.write(f"<li class=\"save\"><a download=\"1-{save_num}-LT1.save\" "
+                        + "href=\"data:application/octet-stream;base64,")
+            if stored:
+                write_b64(blob_file, out_file)
+            else:
+                out_file.write(b64encode(data).decode("ascii"))
+            out_file.write(f"\">(S) Save {save_num}</a></li>")
+        else:
+            out_file.write(f"<li class=\"save\">(S) Save {save_num}</li>")
+        save_num += 1
+    if len(branch_dict["branch"]) == 0:
+        if branch_dict["end"]:
+            out_file.write("<li class=\"complete\">[END]</li>")
+        else:
+            out_file.write("<li class=\"incomplete\">[INCOMPLETE]</li>")
+    out_file.write("</ul>\n")
+    return missing
+
+def write_html(out_file:TextIO=None, branch_dict:dict=None, title:str=None,
+            blob_dir:str=None, include_saves:bool=False) -> List[str]:
+    """
+    Writes a tree to an open text stream as a self-contained HTML outline.
+    Branches are written in a single depth first pass, with memory use only depending on the depth of the tree.
+    Completion is shown through the style sheet, which colors each branch by whether it contains an incomplete ending.
+
+    :param out_file: Text stream to write to, defaults to None
+    :type out_file: TextIO, optional
+    :param branch_dict: Root branch dict of the tree, defaults to None
+    :type branch_dict: dict, optional
+    :param title: Title of the page, defaults to None
+    :type title: str, optional
+    :param blob_dir: Blob directory holding the saves in the tree, defaults to None
+    :type blob_dir: str, optional
+    :param include_saves: Whether to embed each save as a download link, defaults to False
+    :type include_saves: bool, optional
+    :return: Hashes of the saves that are missing from the blob store, if including saves
+    :rtype: list[str]
+    """
+    missing = []
+    title = escape("VN-Organizer" if title is None else title)
+    out_file.write(f"<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n<title>{title}</title>\n")
+    out_file.write(f"<style>\n{HTML_STYLE}\n</style>\n</head>\n<body>\n")
+    # Each entry holds an iterator of the sub-branches of a branch that has been opened
+    stack = []
+    cur_dict = branch_dict
+    while True:
+        # Open the branch and write its items
+        response = "Start" if cur_dict["response"] is None else cur_dict["response"]
+        out_file.write(f"<details open><summary>{escape(response)}</summary>\n")
+        missing.extend(write_html_items(out_file, cur_dict, blob_dir, include_saves))
+        if len(cur_dict["branch"]) > 0 and cur_dict["branch"][0]["prompt"] is not None:
+            out_file.write(f"<div class=\"prompt\">(P) {escape(cur_dict['branch'][0]['prompt'])}</div>\n")
+        stack.append(iter(cur_dict["branch"]))
+        # Get the next branch, closing branches that have been fully written
+        cur_dict = None
+        while len(stack) > 0:
+            cur_dict = next(stack[-1], None)
+            if cur_dict is not None:
+                break
+            stack.pop()
+            out_file.write("</details>\n")
+        if cur_dict is None:
+            break
+    out_file.write("</body>\n</html>\n")
+    return missing
+
+def export_tree(file:str=None, out_file:str=None, include_saves:bool=False) -> List[str]:
+    """
+    Exports a tree file as a Graphviz DOT graph or an HTML outline, based on the extension of the output file.
+    The output is written to a temporary file first and renamed, and the temporary file is removed if writing fails.
+
+    :param file: Path of the tree file, defaults to None
+    :type file: str, optional
+    :param out_file: Path to export to, defaults to None
+    :type out_file: str, optional
+    :param include_saves: Whether to include the saves, as hashes in DOT and as download links in HTML, defaults to False
+    :type include_saves: bool, optional
+    :return: Hashes of the saves left out of an HTML export as they're missing from the blob store,
+                None if the tree wasn't exported
+    :rtype: list[str]
+    """
+    tree_dict = read_tree(file)
+    if tree_dict is None or out_file is None:
+        return None
+    temp_file = abspath(out_file) + ".tmp"
+    try:
+        missing = []
+        with open(temp_file, "w", encoding="utf-8") as stream:
+            if any([out_file.lower().endswith(extension) for extension in DOT_EXTENSIONS]):
+                write_dot(stream, tree_dict["tree"], include_saves)
+            else:
+                missing = write_html(stream, tree_dict["tree"], basename(file), get_blob_directory(file), include_saves)
+            stream.flush()
+            fsync(stream.fileno())
+        replace(temp_file, abspath(out_file))
+        return missing
+    except (FileNotFoundError, KeyError, TypeError):
+        return None
+    finally:
+        # Remove the temporary file if it wasn't renamed
+        try:
+            remove(temp_file)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+
+from json import loads
+from json.decoder import JSONDecodeError, scanstring
+from json.encoder import encode_basestring_ascii
+from os.path import abspath
+from re import compile
+from struct import calcsize, pack, unpack
+from struct import error as structerror
+from typing import BinaryIO, Dict, Iterator, Tuple
+from vn_organizer.blob_store import get_tree_blobs
+from vn_organizer.blob_store import has_blob
+from vn_organizer.blob_store import read_blob
+from vn_organizer.blob_store import write_blob
+from vn_organizer.nodes import BranchNode
+from vn_organizer.nodes import Item
+from zlib import compress, decompress
+from zlib import error as zliberror
+
+# File extension for tree files written in the binary format
+BINARY_EXTENSION = ".vno"
+
+# First bytes of every binary tree file
+BINARY_MAGIC = b"VNO\x00"
+
+# Version of the binary container layout
+BINARY_VERSION = 1
+
+# Header with the magic bytes, container version, and the number of sections
+HEADER = "<4sBI"
+
+# Section header with the section type, blob hash, and compressed size of the section
+SECTION = "<B32sQ"
+
+# Section types in the binary container, persistent sections are only found in files from older versions
+STRUCTURE_SECTION = 0
+PERSISTENT_SECTION = 1
+BLOB_SECTION = 2
+
+# Nesting level past which pretty-printed JSON isn't indented any further
+MAX_INDENT_LEVEL = 32
+
+# Patterns for parsing JSON
+WHITESPACE = compile("[ \\t\\n\\r]*")
+NUMBER = compile("(-?(?:0|[1-9][0-9]*))(\\.[0-9]+)?([eE][-+]?[0-9]+)?")
+LITERALS = {"null":None, "true":True, "false":False}
+
+def encode_json_value(value=None) -> str:
+    """
+    Returns the JSON text for a single value that isn't a non-empty container.
+
+    :param value: Value to encode, defaults to None
+    :return: JSON text
+    :rtype: str
+    """
+    if value is None:
+        return "null"
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if isinstance(value, str):
+        return encode_basestring_ascii(value)
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, dict):
+        return "{}"
+    if isinstance(value, list):
+        return "[]"
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def iterencode_json(value=None, indent:int=4, level:int=0) -> Iterator[str]:
+    """
+    Encodes a value as JSON text, yielding it in chunks.
+    Containers are walked with an explicit stack, so deeply nested trees don't hit the recursion limit.
+    Output matches the json module with the same indent, except that indentation stops growing past MAX_INDENT_LEVEL.
+    BranchNode and Item objects are written the same as the dicts they represent.
+
+    :param value: Value to encode, defaults to None
+    :param indent: Spaces per nesting level, None for compact JSON, defaults to 4
+    :type indent: int, optional
+    :param level: Nesting level the value starts at, defaults to 0
+    :type level: int, optional
+    :return: Iterator of JSON text chunks
+    :rtype: Iterator[str]
+    """
+    key_separator = ":" if indent is None else ": "
+    # Each entry holds whether the container is a dict, an iterator of its contents, and whether it's been written to
+    stack = []
+    cur_value = value
+    while True:
+        # Write the current value, opening it if it's a container
+        if isinstance(cur_value, (BranchNode, Item)):
+            yield "{"
+            stack.append([True, iter(cur_value.items()), True])
+        elif isinstance(cur_value, dict) and len(cur_value) > 0:
+            yield "{"
+            stack.append([True, iter(cur_value.items()), True])
+        elif isinstance(cur_value, list) and len(cur_value) > 0:
+            yield "["
+            stack.append([False, iter(cur_value), True])
+        else:
+            yield encode_json_value(cur_value)
+        # Get the next value, closing containers that have been fully written
+        while len(stack) > 0:
+            entry = stack[-1]
+            next_value = next(entry[1], stack)
+            if next_value is stack:
+                stack.pop()
+                if indent is not None:
+                    yield "\n" + " " * (indent * min(level + len(stack), MAX_INDENT_LEVEL))
+                yield "}" if entry[0] else "]"
+                continue
+            if not entry[2]:
+                yield ","
+            entry[2] = False
+            if indent is not None:
+                yield "\n" + " " * (indent * min(level + len(stack), MAX_INDENT_LEVEL))
+            if entry[0]:
+                yield encode_basestring_ascii(next_value[0]) + key_separator
+                cur_value = next_value[1]
+            else:
+                cur_value = next_value
+            break
+        else:
+            return None
+
+def parse_json(text:str=None):
+    """
+    Parses JSON text with an explicit stack instead of recursion, so deeply nested trees can be read.
+
+    :param text: JSON text to parse, defaults to None
+    :type text: str, optional
+    :return: Parsed value
+    """
+    try:
+        # Each entry holds a container being read and the key for the value being read into it
+        stack = []
+        pos = WHITESPACE.match(text, 0).end()
+        while True:
+            # Read a value, or open a container
+            char = text[pos]
+            if char == "{" or char == "[":
+                pos = WHITESPACE.match(text, pos + 1).end()
+                if text[pos] == ("}" if char == "{" else "]"):
+                    value = dict() if char == "{" else []
+                    pos += 1
+                elif char == "[":
+                    stack.append([[], None])
+                    continue
+                else:
+                    if not text[pos] == "\"":
+                        raise JSONDecodeError("Expecting property name", text, pos)
+                    key, pos = scanstring(text, pos + 1)
+                    pos = WHITESPACE.match(text, pos).end()
+                    if not text[pos] == ":":
+                        raise JSONDecodeError("Expecting ':' delimiter", text, pos)
+                    pos = WHITESPACE.match(text, pos + 1).end()
+                    stack.append([dict(), key])
+                    continue
+            elif char == "\"":
+                value, pos = scanstring(text, pos + 1)
+            else:
+                match = NUMBER.match(text, pos)
+                if match is not None:
+                    integer, fraction, exponent = match.groups()
+                    if fraction is None and exponent is None:
+                        value = int(integer)
+                    else:
+                        value = float(match.group())
+                    pos = match.end()
+                else:
+                    for literal in LITERALS:
+                        if text.startswith(literal, pos):
+                            value = LITERALS[literal]
+                            pos += len(literal)
+                            break
+                    else:
+                        raise JSONDecodeError("Expecting value", text, pos)
+            # Add the value to its container, closing containers that have ended
+            while True:
+                pos = WHITESPACE.match(text, pos).end()
+                if len(stack) == 0:
+                    if pos < len(text):
+                        raise JSONDecodeError("Extra data", text, pos)
+                    return value
+                container, key = stack[-1]
+                if key is None:
+                    container.append(value)
+                else:
+                    container[key] = value
+                char = text[pos]
+                if char == ",":
+                    pos = WHITESPACE.match(text, pos + 1).end()
+                    if key is not None:
+                        if not text[pos] == "\"":
+                            raise JSONDecodeError("Expecting property name", text, pos)
+                        key, pos = scanstring(text, pos + 1)
+                        pos = WHITESPACE.match(text, pos).end()
+                        if not text[pos] == ":":
+                            raise JSONDecodeError("Expecting ':' delimiter", text, pos)
+                        pos = WHITESPACE.match(text, pos + 1).end()
+                        stack[-1][1] = key
+                    break
+                if char == ("]" if key is None else "}"):
+                    stack.pop()
+                    value = container
+                    pos += 1
+                    continue
+                raise JSONDecodeError("Expecting ',' delimiter", text, pos)
+    except IndexError:
+        raise JSONDecodeError("Unexpected end of data", text, len(text))
+
+def loads_json(text:str=None):
+    """
+    Parses JSON text, using the json module when possible and parse_json for trees too deep for it.
+
+    :param text: JSON text to parse, defaults to None
+    :type text: str, optional
+    :return: Parsed value
+    """
+    try:
+        return loads(text)
+    except RecursionError:
+        return parse_json(text)
+
+def use_binary_format(file:str=None) -> bool:
+    """
+    Returns whether a tree file should be written in the binary format, based on its extension.
+
+    :param file: Path of the tree file, defaults to None
+    :type file: str, optional
+    :return: Whether to use the binary format
+    :rtype: bool
+    """
+    try:
+        return file.lower().endswith(BINARY_EXTENSION)
+    except AttributeError:
+        return False
+
+def is_binary_file(file:str=None) -> bool:
+    """
+    Returns whether an existing tree file is in the binary format.
+
+    :param file: Path of the tree file, defaults to None
+    :type file: str, optional
+    :return: Whether the file starts with the binary format's magic bytes
+    :rtype: bool
+    """
+    try:
+        with open(abspath(file), "rb") as in_file:
+            return in_file.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+    except (FileNotFoundError, IsADirectoryError, TypeError):
+        return False
+
+def write_section(out_file:BinaryIO, section_type:int, data:bytes, blob_hash:str=None):
+    """
+    Writes a compressed section to an open binary tree file.
+
+    :param out_file: Binary stream to write to
+    :type out_file: BinaryIO
+    :param section_type: Type of the section
+    :type section_type: int
+    :param data: Uncompressed data for the section
+    :type data: bytes
+    :param blob_hash: Hash of the blob for blob sections, defaults to None
+    :type blob_hash: str, optional
+    """
+    raw_hash = bytes(32) if blob_hash is None else bytes.fromhex(blob_hash)
+    compressed = compress(data)
+    out_file.write(pack(SECTION, section_type, raw_hash, len(compressed)))
+    out_file.write(compressed)
+
+def write_binary_tree(out_file:BinaryIO=None, tree_dict:dict=None, blob_dir:str=None):
+    """
+    Writes a tree dict to an open binary stream in the binary tree format.
+    The container holds the tree structure as compact JSON and the raw bytes of
+    the persistent data and every save referenced in the tree, each compressed with zlib.
+
+    :param out_file: Binary stream to write to, defaults to None
+    :type out_file: BinaryIO, optional
+    :param tree_dict: Tree dict with the same keys as a JSON tree file, defaults to None
+    :type tree_dict: dict, optional
+    :param blob_dir: Blob directory holding the saves in the tree, defaults to None
+    :type blob_dir: str, optional
+    """
+    # Get the sections to write, keeping the order of the saves without searching the list for each one
+    blobs = dict()
+    for blob_hash in get_tree_blobs(tree_dict["tree"]) + [tree_dict["persistent"]]:
+        if blob_hash not in blobs and has_blob(blob_dir, blob_hash):
+            blobs[blob_hash] = None
+    num_sections = 1 + len(blobs)
+    # Write the header and structure
+    out_file.write(pack(HEADER, BINARY_MAGIC, BINARY_VERSION, num_sections))
+    text = "".join(iterencode_json(tree_dict, None))
+    write_section(out_file, STRUCTURE_SECTION, text.encode("utf-8"))
+    # Write the raw bytes of the persistent data and each save
+    for blob_hash in blobs:
+        write_section(out_file, BLOB_SECTION, read_blob(blob_dir, blob_hash), blob_hash)
+
+def read_binary_tree(file:str=None, blob_dir:str=None) -> dict:
+    """
+    Reads a tree file in the binary tree format.
+    Saves that aren't in the blob directory yet are extracted into it, others are skipped without decompressing.
+    Persistent data from older versions is moved into the blob directory as well.
+
+    :param file: Path of the binary tree file, defaults to None
+    :type file: str, optional
+    :param blob_dir: Blob directory to extract saves to, defaults to None
+    :type blob_dir: str, optional
+    :return: Tree dict with the same keys as a JSON tree file, None if the file isn't valid
+    :rtype: dict
+    """
+    try:
+        tree_dict = None
+        persistent = None
+        with open(abspath(file), "rb") as in_file:
+            magic, version, num_sections = unpack(HEADER, in_file.read(calcsize(HEADER)))
+            assert magic == BINARY_MAGIC and version <= BINARY_VERSION
+            for i in range(0, num_sections):
+                section_type, raw_hash, size = unpack(SECTION, in_file.read(calcsize(SECTION)))
+                if section_type == BLOB_SECTION:
+                    blob_hash = raw_hash.hex()
+                    if has_blob(blob_dir, blob_hash):
+                        in_file.seek(size, 1)
+                        continue
+                    write_blob(blob_dir, decompress(in_file.read(size)))
+                elif section_type == STRUCTURE_SECTION:
+                    tree_dict = loads_json(decompress(in_file.read(size)).decode("utf-8"))
+                elif section_type == PERSISTENT_SECTION:
+                    persistent = write_blob(blob_dir, decompress(in_file.read(size)))
+                else:
+                    in_file.seek(size, 1)
+        if persistent is not None:
+            tree_dict["persistent"] = persistent
+            tree_dict["format"] = 3
+        return tree_dict
+    except (AssertionError, FileNotFoundError, KeyError, TypeError, ValueError, structerror, zliberror):
+        return None
+
+def read_binary_structure(file:str=None) -> Tuple[dict, Dict[str, int]]:
+    """
+    Reads the tree of a binary tree file without extracting its saves or persistent data.
+    Only the structure section is decompressed, and the other sections are skipped using their headers.
+
+    :param file: Path of the binary tree file, defaults to None
+    :type file: str, optional
+    :return: Tree dict as stored in the file, and dict of the hashes of the saves stored in the file to their stored size,
+                None and an empty dict if the file isn't valid
+    :rtype: tuple[dict, dict]
+    """
+    try:
+        tree_dict = None
+        blob_sizes = dict()
+        with open(abspath(file), "rb") as in_file:
+            magic, version, num_sections = unpack(HEADER, in_file.read(calcsize(HEADER)))
+            assert magic == BINARY_MAGIC and version <= BINARY_VERSION
+            for i in range(0, num_sections):
+                section_type, raw_hash, size = unpack(SECTION, in_file.read(calcsize(SECTION)))
+                if section_type == STRUCTURE_SECTION:
+                    tree_dict = loads_json(decompress(in_file.read(size)).decode("utf-8"))
+                    continue
+                if section_type == BLOB_SECTION:
+                    blob_sizes[raw_hash.hex()] = size
+                in_file.seek(size, 1)
+        return tree_dict, blob_sizes
+    except (AssertionError, FileNotFoundError, KeyError, TypeError, ValueError, structerror, zliberror):
+        return None, dict()
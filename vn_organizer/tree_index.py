@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+
+from re import compile
+from typing import List, Set
+from vn_organizer.tree_database import is_loaded
+from vn_organizer.tree_database import load_matches
+from vn_organizer.tree_database import watch_loads
+
+# Pattern matching the words indexed for searching
+TERM_PATTERN = compile("\\w+")
+
+def get_node_id(index:dict=None, branch_dict:dict=None) -> int:
+    """
+    Returns the node ID of a branch dict in a tree index.
+    Node IDs are numbered as branches are added to the index, so they stay the same for as long as the branch is in the tree,
+    and are never reused for another branch once it is removed.
+
+    :param index: Tree index, defaults to None
+    :type index: dict, optional
+    :param branch_dict: Branch dict to get the ID of, defaults to None
+    :type branch_dict: dict, optional
+    :return: Node ID of the branch, None if the branch isn't in the index
+    :rtype: int
+    """
+    try:
+        return index["ids"].get(id(branch_dict))
+    except (AttributeError, KeyError, TypeError):
+        return None
+
+def get_terms(text:str=None) -> Set[str]:
+    """
+    Returns the search terms in a piece of text.
+    Terms are words in the text, ignoring case.
+
+    :param text: Text to get terms from, defaults to None
+    :type text: str, optional
+    :return: Set of search terms
+    :rtype: set[str]
+    """
+    try:
+        return set(TERM_PATTERN.findall(text.casefold()))
+    except AttributeError:
+        return set()
+
+def get_branch_terms(branch_dict:dict=None) -> Set[str]:
+    """
+    Returns the search terms in the prompt, response, and event text of a branch dict.
+    Sub-branches aren't included.
+
+    :param branch_dict: Branch dict to get terms from, defaults to None
+    :type branch_dict: dict, optional
+    :return: Set of search terms
+    :rtype: set[str]
+    """
+    terms = get_terms(branch_dict["prompt"])
+    terms.update(get_terms(branch_dict["response"]))
+    for item in branch_dict["item_list"]:
+        if not item["type"] == "s":
+            terms.update(get_terms(item.get("text")))
+    return terms
+
+def remove_terms(index:dict=None, node_id:int=None):
+    """
+    Removes a branch from the search terms of a tree index.
+
+    :param index: Tree index to update, defaults to None
+    :type index: dict, optional
+    :param node_id: Node ID of the branch, defaults to None
+    :type node_id: int, optional
+    """
+    for term in index["node_terms"].pop(node_id, ()):
+        node_ids = index["terms"][term]
+        node_ids.discard(node_id)
+        if len(node_ids) == 0:
+            del index["terms"][term]
+
+def update_terms(index:dict=None, node_id:int=None):
+    """
+    Updates the search terms of a tree index for a branch after its text changes.
+
+    :param index: Tree index to update, defaults to None
+    :type index: dict, optional
+    :param node_id: Node ID of the branch, defaults to None
+    :type node_id: int, optional
+    """
+    try:
+        remove_terms(index, node_id)
+        terms = get_branch_terms(index["nodes"][node_id])
+        index["node_terms"][node_id] = terms
+        for term in terms:
+            node_ids = index["terms"].get(term)
+            if node_ids is None:
+                node_ids = set()
+                index["terms"][term] = node_ids
+            node_ids.add(node_id)
+    except (KeyError, TypeError):
+        return None
+
+def add_to_index(index:dict=None, branch_dict:dict=None, parent_id:int=None, position:int=None):
+    """
+    Adds a branch dict and all of its sub-branches to a tree index.
+    Sub-branches of branches that haven't been loaded from a database are added once the branch is loaded.
+
+    :param index: Tree index to update, defaults to None
+    :type index: dict, optional
+    :param branch_dict: Branch dict to add, defaults to None
+    :type branch_dict: dict, optional
+    :param parent_id: Node ID of the branch the added branch belongs to, defaults to None
+    :type parent_id: int, optional
+    :param position: Position of the added branch in the "branch" list of its parent, defaults to None
+    :type position: int, optional
+    """
+    try:
+        stack = [(branch_dict, parent_id, position)]
+        while len(stack) > 0:
+            cur_dict, cur_parent, cur_position = stack.pop()
+            node_id = index["next_id"]
+            index["next_id"] += 1
+            index["ids"][id(cur_dict)] = node_id
+            index["nodes"][node_id] = cur_dict
+            index["parents"][node_id] = cur_parent
+            index["positions"][node_id] = cur_position
+            if not is_loaded(cur_dict):
+                continue
+            update_terms(index, node_id)
+            branches = cur_dict["branch"]
+            for i in range(0, len(branches)):
+                stack.append((branches[i], node_id, i))
+    except (KeyError, TypeError):
+        return None
+
+def remove_from_index(index:dict=None, branch_dict:dict=None):
+    """
+    Removes a branch dict and all of its sub-branches from a tree index.
+
+    :param index: Tree index to update, defaults to None
+    :type index: dict, optional
+    :param branch_dict: Branch dict to remove, defaults to None
+    :type branch_dict: dict, optional
+    """
+    try:
+        stack = [branch_dict]
+        while len(stack) > 0:
+            cur_dict = stack.pop()
+            node_id = index["ids"].pop(id(cur_dict), None)
+            index["completion"].pop(id(cur_dict), None)
+            if node_id is None:
+                continue
+            remove_terms(index, node_id)
+            index["nodes"].pop(node_id, None)
+            index["parents"].pop(node_id, None)
+            index["positions"].pop(node_id, None)
+            index["render"].pop(node_id, None)
+            if is_loaded(cur_dict):
+                stack.extend(cur_dict["branch"])
+    except (KeyError, TypeError):
+        return None
+
+def update_positions(index:dict=None, node_id:int=None, start:int=0):
+    """
+    Updates the positions of the sub-branches of a branch in a tree index after branches are inserted or removed.
+
+    :param index: Tree index to update, defaults to None
+    :type index: dict, optional
+    :param node_id: Node ID of the branch whose sub-branches moved, defaults to None
+    :type node_id: int, optional
+    :param start: Position of the first sub-branch that moved, defaults to 0
+    :type start: int, optional
+    """
+    try:
+        branches = index["nodes"][node_id]["branch"]
+        for i in range(start, len(branches)):
+            index["positions"][get_node_id(index, branches[i])] = i
+    except (KeyError, TypeError):
+        return None
+
+def add_loaded_branch(index:dict=None, branch_dict:dict=None):
+    """
+    Adds the search terms and sub-branches of a branch to a tree index once it is loaded from a database.
+
+    :param index: Tree index to update, defaults to None
+    :type index: dict, optional
+    :param branch_dict: Branch that was loaded, defaults to None
+    :type branch_dict: dict, optional
+    """
+    node_id = get_node_id(index, branch_dict)
+    if node_id is None:
+        return None
+    update_terms(index, node_id)
+    branches = branch_dict["branch"]
+    for i in range(0, len(branches)):
+        add_to_index(index, branches[i], node_id, i)
+
+def build_index(branch_dict:dict=None) -> dict:
+    """
+    Builds an index of every branch in a branch dict.
+    The index maps node IDs to branches, to the node ID of their parent branch, and to their position in the parent.
+    It also holds the completion and render caches for the branches in the tree,
+    and maps search terms to the node IDs of the branches containing them.
+    Trees read lazily from a database only have their loaded branches indexed, with others added as they are loaded.
+
+    :param branch_dict: Root branch dict of the tree, defaults to None
+    :type branch_dict: dict, optional
+    :return: Tree index
+    :rtype: dict
+    """
+    index = {"root":0,
+                "next_id":0,
+                "ids":dict(),
+                "nodes":dict(),
+                "parents":dict(),
+                "positions":dict(),
+                "completion":dict(),
+                "render":dict(),
+                "terms":dict(),
+                "node_terms":dict()}
+    add_to_index(index, branch_dict, None, None)
+    watch_loads(branch_dict, lambda loaded_dict: add_loaded_branch(index, loaded_dict))
+    return index
+
+def get_node(index:dict=None, node_id:int=None) -> dict:
+    """
+    Returns the branch dict with the given node ID.
+
+    :param index: Tree index, defaults to None
+    :type index: dict, optional
+    :param node_id: Node ID of the branch, defaults to None
+    :type node_id: int, optional
+    :return: Branch dict, empty dict if the ID isn't in the index
+    :rtype: dict
+    """
+    try:
+        return index["nodes"][node_id]
+    except (KeyError, TypeError):
+        return {}
+
+def get_parent_id(index:dict=None, node_id:int=None) -> int:
+    """
+    Returns the node ID of the branch containing the branch with the given node ID.
+
+    :param index: Tree index, defaults to None
+    :type index: dict, optional
+    :param node_id: Node ID of the branch, defaults to None
+    :type node_id: int, optional
+    :return: Node ID of the parent branch, None for the root branch
+    :rtype: int
+    """
+    try:
+        return index["parents"][node_id]
+    except (KeyError, TypeError):
+        return None
+
+def get_child_position(index:dict=None, node_id:int=None) -> int:
+    """
+    Returns the position of a branch in the "branch" list of its parent.
+
+    :param index: Tree index, defaults to None
+    :type index: dict, optional
+    :param node_id: Node ID of the branch, defaults to None
+    :type node_id: int, optional
+    :return: Position of the branch, None for the root branch
+    :rtype: int
+    """
+    try:
+        return index["positions"][node_id]
+    except (KeyError, TypeError):
+        return None
+
+def get_node_path(index:dict=None, node_id:int=None) -> List[int]:
+    """
+    Returns the path of a branch, as used by get_dict_from_path.
+
+    :param index: Tree index, defaults to None
+    :type index: dict, optional
+    :param node_id: Node ID of the branch, defaults to None
+    :type node_id: int, optional
+    :return: Path of the branch
+    :rtype: list[int]
+    """
+    path = []
+    cur_id = node_id
+    while get_parent_id(index, cur_id) is not None:
+        path.append(get_child_position(index, cur_id))
+        cur_id = get_parent_id(index, cur_id)
+    path.reverse()
+    return path
+
+def get_node_from_path(index:dict=None, path:List[int]=None) -> int:
+    """
+    Returns the node ID of the branch at the given path.
+
+    :param index: Tree index, defaults to None
+    :type index: dict, optional
+    :param path: Path of the branch, defaults to None
+    :type path: list[int], optional
+    :return: Node ID of the branch, None if the path is invalid
+    :rtype: int
+    """
+    try:
+        cur_dict = index["nodes"][index["root"]]
+        for branch in path:
+            cur_dict = cur_dict["branch"][branch]
+        return get_node_id(index, cur_dict)
+    except (IndexError, KeyError, TypeError):
+        return None
+
+def invalidate_node(index:dict=None, node_id:int=None):
+    """
+    Removes cached state for a branch and every branch above it after the branch changes.
+
+    :param index: Tree index, defaults to None
+    :type index: dict, optional
+    :param node_id: Node ID of the branch that changed, defaults to None
+    :type node_id: int, optional
+    """
+    try:
+        cur_id = node_id
+        while cur_id is not None:
+            index["completion"].pop(id(index["nodes"][cur_id]), None)
+            index["render"].pop(cur_id, None)
+            cur_id = index["parents"].get(cur_id)
+    except (KeyError, TypeError, AttributeError):
+        return None
+
+def replace_node(index:dict=None, node_id:int=None, replace_dict:dict=None) -> bool:
+    """
+    Replaces the branch with the given node ID with a different branch dict.
+    The root branch can't be replaced, as the tree index is tied to it.
+
+    :param index: Tree index, defaults to None
+    :type index: dict, optional
+    :param node_id: Node ID of the branch to replace, defaults to None
+    :type node_id: int, optional
+    :param replace_dict: Branch dict to put in place of the branch, defaults to None
+    :type replace_dict: dict, optional
+    :return: Whether the branch was replaced
+    :rtype: bool
+    """
+    try:
+        old_dict = index["nodes"][node_id]
+        if old_dict is replace_dict:
+            invalidate_node(index, node_id)
+            return True
+        parent_id = index["parents"][node_id]
+        position = get_child_position(index, node_id)
+        if position is None:
+            return False
+        # Replace the branch and update the index
+        index["nodes"][parent_id]["branch"][position] = replace_dict
+        remove_from_index(index, old_dict)
+        add_to_index(index, replace_dict, parent_id, position)
+        invalidate_node(index, parent_id)
+        return True
+    except (KeyError, TypeError):
+        return False
+
+def search_index(index:dict=None, query:str=None) -> List[int]:
+    """
+    Returns the branches that contain every search term in a query, in the order they appear in the tree.
+    Branches of trees read lazily from a database that may match are loaded first, so they are in the index.
+
+    :param index: Tree index, defaults to None
+    :type index: dict, optional
+    :param query: Text to search for, defaults to None
+    :type query: str, optional
+    :return: Node IDs of the matching branches
+    :rtype: list[int]
+    """
+    try:
+        terms = get_terms(query)
+        if len(terms) == 0:
+            return []
+        load_matches(index["nodes"][index["root"]], terms)
+        # Intersect the branches for each term, starting with the rarest
+        matches = None
+        for term in sorted(terms, key=lambda term: len(index["terms"].get(term, ()))):
+            node_ids = index["terms"].get(term, set())
+            matches = set(node_ids) if matches is None else matches & node_ids
+            if len(matches) == 0:
+                return []
+        # Gather the sub-branches leading to each match, stopping at branches already reached
+        children = dict()
+        reached = {index["root"]}
+        for node_id in matches:
+            cur_id = node_id
+            while cur_id not in reached:
+                reached.add(cur_id)
+                parent_id = index["parents"][cur_id]
+                children.setdefault(parent_id, []).append(cur_id)
+                cur_id = parent_id
+        # Walk only those sub-branches in tree order, without building a path for each branch
+        results = []
+        stack = [index["root"]]
+        while len(stack) > 0:
+            cur_id = stack.pop()
+            if cur_id in matches:
+                results.append(cur_id)
+            stack.extend(sorted(children.get(cur_id, ()), key=index["positions"].get, reverse=True))
+        return results
+    except (KeyError, TypeError):
+        return []
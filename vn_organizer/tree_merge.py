@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+
+from hashlib import sha256
+from json import dumps
+from typing import List, Tuple
+from vn_organizer.blob_store import copy_blobs
+from vn_organizer.blob_store import get_blob_directory
+from vn_organizer.blob_store import get_tree_blobs
+from vn_organizer.vn_organizer import compact_tree
+from vn_organizer.vn_organizer import get_empty_branch_dict
+from vn_organizer.vn_organizer import read_tree
+
+def get_subtree_hash(branch_dict:dict=None, cache:dict=None) -> str:
+    """
+    Returns a hash of a branch covering its prompt, response, items, end flag, and every sub-branch.
+    Branches with the same hash hold identical subtrees, so they can be compared without walking them.
+    Results are stored per branch in the given cache, so only branches invalidated since the last call are hashed again.
+
+    :param branch_dict: Branch dict to hash, defaults to None
+    :type branch_dict: dict, optional
+    :param cache: Hash cache to use and update, defaults to None
+    :type cache: dict, optional
+    :return: Hexadecimal SHA-256 hash of the subtree
+    :rtype: str
+    """
+    if cache is None:
+        cache = dict()
+    try:
+        # Visit branches depth first, hashing each branch after all of its sub-branches
+        stack = [(branch_dict, False)]
+        while len(stack) > 0:
+            cur_dict, visited = stack.pop()
+            if id(cur_dict) in cache:
+                continue
+            branches = cur_dict["branch"]
+            if not visited and len(branches) > 0:
+                stack.append((cur_dict, True))
+                for branch in branches:
+                    if id(branch) not in cache:
+                        stack.append((branch, False))
+                continue
+            items = []
+            for item in cur_dict["item_list"]:
+                items.append([item["type"], item.get("text"), item.get("hash")])
+            sub_hashes = [cache[id(branch)][1] for branch in branches]
+            text = dumps([cur_dict["prompt"], cur_dict["response"], cur_dict["end"], items, sub_hashes],
+                        separators=(",", ":"))
+            # Keep the branch in the cache entry so its id can't be reused while cached
+            cache[id(cur_dict)] = (cur_dict, sha256(text.encode("utf-8")).hexdigest())
+        return cache[id(branch_dict)][1]
+    except (KeyError, TypeError):
+        return None
+
+def get_items_key(branch_dict:dict=None) -> list:
+    """
+    Returns the contents of a branch's item list in a form that can be compared between trees.
+
+    :param branch_dict: Branch dict, defaults to None
+    :type branch_dict: dict, optional
+    :return: List of item tuples
+    :rtype: list
+    """
+    if branch_dict is None:
+        return None
+    return [(item["type"], item.get("text"), item.get("hash")) for item in branch_dict["item_list"]]
+
+def match_branches(*branch_lists:List[dict]) -> List[Tuple]:
+    """
+    Pairs up the sub-branches of the same branch in different trees.
+    Sub-branches are matched by their prompt and response, so branches added in one tree don't shift the others.
+
+    :param branch_lists: Lists of sub-branches, one for each tree, None for trees missing the branch
+    :type branch_lists: list[dict]
+    :return: Tuples holding the matching sub-branch from each tree, or None where a tree doesn't have it
+    :rtype: list[tuple]
+    """
+    matches = dict()
+    for i in range(0, len(branch_lists)):
+        if branch_lists[i] is None:
+            continue
+        counts = dict()
+        for branch in branch_lists[i]:
+            # Number repeated responses so they are matched in order
+            key = (branch["prompt"], branch["response"])
+            counts[key] = counts.get(key, 0) + 1
+            key = (key, counts[key])
+            if key not in matches:
+                matches[key] = [None] * len(branch_lists)
+            matches[key][i] = branch
+    return [tuple(match) for match in matches.values()]
+
+def diff_trees(old_dict:dict=None, new_dict:dict=None) -> List[dict]:
+    """
+    Returns the differences between two trees.
+    Subtrees with matching hashes are skipped, so only the parts of the trees that differ are walked.
+
+    :param old_dict: Root branch dict of the original tree, defaults to None
+    :type old_dict: dict, optional
+    :param new_dict: Root branch dict of the changed tree, defaults to None
+    :type new_dict: dict, optional
+    :return: Dicts with a "change" key of "added", "removed", "items", or "end", the "path" of the branch,
+             and the "old" and "new" values
+    :rtype: list[dict]
+    """
+    old_cache = dict()
+    new_cache = dict()
+    changes = []
+    try:
+        stack = [(old_dict, new_dict, [])]
+        while len(stack) > 0:
+            old_branch, new_branch, path = stack.pop()
+            if get_subtree_hash(old_branch, old_cache) == get_subtree_hash(new_branch, new_cache):
+                continue
+            # Compare the contents of the branch itself
+            if not get_items_key(old_branch) == get_items_key(new_branch):
+                changes.append({"change":"items", "path":path,
+                            "old":old_branch["item_list"], "new":new_branch["item_list"]})
+            if not old_branch["end"] == new_branch["end"]:
+                changes.append({"change":"end", "path":path, "old":old_branch["end"], "new":new_branch["end"]})
+            # Compare sub-branches, recording ones only found in one tree
+            new_positions = {id(new_branch["branch"][i]):i for i in range(0, len(new_branch["branch"]))}
+            old_positions = {id(old_branch["branch"][i]):i for i in range(0, len(old_branch["branch"]))}
+            pending = []
+            for old_sub, new_sub in match_branches(old_branch["branch"], new_branch["branch"]):
+                if new_sub is None:
+                    changes.append({"change":"removed", "path":path + [old_positions[id(old_sub)]],
+                                "old":old_sub, "new":None})
+                elif old_sub is None:
+                    changes.append({"change":"added", "path":path + [new_positions[id(new_sub)]],
+                                "old":None, "new":new_sub})
+                else:
+                    pending.append((old_sub, new_sub, path + [new_positions[id(new_sub)]]))
+            pending.reverse()
+            stack.extend(pending)
+        return changes
+    except (KeyError, TypeError):
+        return changes
+
+def merge_trees(base_dict:dict=None, ours_dict:dict=None, theirs_dict:dict=None) -> Tuple[dict, List[dict]]:
+    """
+    Combines the changes made to two copies of a tree into a single tree.
+    Subtrees that are the same in both copies, or only changed in one of them, are taken whole without walking them.
+    Without a base tree, both trees are treated as additions to an empty tree, so their branches are combined.
+    Where both copies changed the same part of a branch differently, the changes are combined where possible,
+    with our version taking priority, and the conflict is recorded.
+
+    :param base_dict: Root branch dict of the tree both copies started from, None if there isn't one, defaults to None
+    :type base_dict: dict, optional
+    :param ours_dict: Root branch dict of our copy, defaults to None
+    :type ours_dict: dict, optional
+    :param theirs_dict: Root branch dict of their copy, defaults to None
+    :type theirs_dict: dict, optional
+    :return: Merged root branch dict, and dicts with the "path" and "conflict" of each conflicting change
+    :rtype: tuple[dict, list[dict]]
+    """
+    base_cache = dict()
+    ours_cache = dict()
+    theirs_cache = dict()
+    conflicts = []
+    try:
+        if base_dict is None:
+            base_dict = get_empty_branch_dict()
+        merged_dict = dict()
+        stack = [(base_dict, ours_dict, theirs_dict, merged_dict, [])]
+        while len(stack) > 0:
+            base, ours, theirs, merged, path = stack.pop()
+            merged["prompt"] = ours["prompt"]
+            merged["response"] = ours["response"]
+            # Merge the item list
+            base_items = get_items_key(base)
+            ours_items = get_items_key(ours)
+            theirs_items = get_items_key(theirs)
+            merged["item_list"] = list(ours["item_list"])
+            if ours_items == base_items:
+                merged["item_list"] = list(theirs["item_list"])
+            elif not theirs_items == base_items and not theirs_items == ours_items:
+                # Add their items that aren't in our item list
+                for i in range(0, len(theirs_items)):
+                    if theirs_items[i] not in ours_items and theirs_items[i] not in base_items:
+                        merged["item_list"].append(theirs["item_list"][i])
+                if len(base_items) > 0:
+                    conflicts.append({"path":path, "conflict":"items"})
+            # Merge the end flag
+            merged["end"] = ours["end"]
+            if ours["end"] == base["end"]:
+                merged["end"] = theirs["end"]
+            # Merge sub-branches
+            merged["branch"] = []
+            pending = []
+            for base_sub, ours_sub, theirs_sub in match_branches(base["branch"], ours["branch"], theirs["branch"]):
+                sub_path = path + [len(merged["branch"])]
+                base_hash = None if base_sub is None else get_subtree_hash(base_sub, base_cache)
+                ours_hash = None if ours_sub is None else get_subtree_hash(ours_sub, ours_cache)
+                theirs_hash = None if theirs_sub is None else get_subtree_hash(theirs_sub, theirs_cache)
+                if ours_hash == theirs_hash or theirs_hash == base_hash:
+                    # Take our branch if theirs is unchanged, or skip it if both removed it
+                    if ours_sub is not None:
+                        merged["branch"].append(ours_sub)
+                elif ours_hash == base_hash:
+                    # Take their branch if ours is unchanged, or skip it if they removed it
+                    if theirs_sub is not None:
+                        merged["branch"].append(theirs_sub)
+                elif ours_sub is None or theirs_sub is None:
+                    # Keep the branch if one copy removed it while the other changed it
+                    merged["branch"].append(theirs_sub if ours_sub is None else ours_sub)
+                    conflicts.append({"path":sub_path, "conflict":"removed"})
+                else:
+                    # Merge branches that were changed in both copies
+                    merged_sub = dict()
+                    merged["branch"].append(merged_sub)
+                    if base_sub is None:
+                        base_sub = get_empty_branch_dict()
+                    pending.append((base_sub, ours_sub, theirs_sub, merged_sub, sub_path))
+            # Branches that split can't be marked as ended
+            if len(merged["branch"]) > 0:
+                merged["end"] = False
+            pending.reverse()
+            stack.extend(pending)
+        return merged_dict, conflicts
+    except (KeyError, TypeError):
+        return None, conflicts
+
+def merge_tree_files(file:str=None, theirs_file:str=None, base_file:str=None) -> List[dict]:
+    """
+    Merges the tree in another tree file into a tree file, writing the result as a new snapshot of the tree file.
+    Saves used in the other tree are copied into the blob directory of the tree file.
+
+    :param file: Path of the tree file to merge into, defaults to None
+    :type file: str, optional
+    :param theirs_file: Path of the tree file to merge from, defaults to None
+    :type theirs_file: str, optional
+    :param base_file: Path of the tree file both trees started from, None if there isn't one, defaults to None
+    :type base_file: str, optional
+    :return: Dicts with the "path" and "conflict" of each conflicting change, None if the trees couldn't be merged
+    :rtype: list[dict]
+    """
+    tree_dict = read_tree(file)
+    theirs = read_tree(theirs_file)
+    base = None if base_file is None else read_tree(base_file)
+    if tree_dict is None or theirs is None or (base_file is not None and base is None):
+        return None
+    merged_dict, conflicts = merge_trees(None if base is None else base["tree"], tree_dict["tree"], theirs["tree"])
+    if merged_dict is None:
+        return None
+    # Copy their saves and write the merged tree
+    copy_blobs(get_blob_directory(theirs_file), get_blob_directory(file), get_tree_blobs(theirs["tree"]))
+    tree_dict["tree"] = merged_dict
+    if not compact_tree(file, tree_dict):
+        return None
+    return conflicts
@@ -3,13 +3,72 @@
 from base64 import standard_b64decode as b64decode
 from base64 import standard_b64encode as b64encode
 from binascii import Error as binerror
-from json import dump, load
+from io import StringIO
+from json import dumps
 from json.decoder import JSONDecodeError
-from os import listdir, remove
-from os.path import abspath, exists, join
-from re import findall, sub
-from traceback import print_exc
-from typing import List
+from os import fsync, remove, replace, scandir
+from os.path import abspath, exists, getsize, join
+from re import compile
+from typing import List, TextIO, Tuple
+from vn_organizer.blob_store import blob_to_file
+from vn_organizer.blob_store import cached_file_to_blob
+from vn_organizer.blob_store import copy_blobs
+from vn_organizer.blob_store import file_to_blob
+from vn_organizer.blob_store import get_blob_directory
+from vn_organizer.blob_store import get_tree_blobs
+from vn_organizer.blob_store import migrate_inline_saves
+from vn_organizer.blob_store import update_file_from_blob
+from vn_organizer.blob_store import write_blob
+from vn_organizer.journal import append_journal
+from vn_organizer.journal import clear_journal
+from vn_organizer.journal import get_journal_size
+from vn_organizer.journal import read_journal
+from vn_organizer.nodes import BranchNode
+from vn_organizer.nodes import Item
+from vn_organizer.nodes import to_dicts
+from vn_organizer.nodes import to_nodes
+from vn_organizer.tree_cache import get_file_stamp
+from vn_organizer.tree_cache import read_tree_cache
+from vn_organizer.tree_cache import start_cache_rebuild
+from vn_organizer.tree_database import get_stored_completion
+from vn_organizer.tree_database import get_stored_tree_blobs
+from vn_organizer.tree_database import get_list_position
+from vn_organizer.tree_database import is_database_file
+from vn_organizer.tree_database import is_loaded
+from vn_organizer.tree_database import read_database_tree
+from vn_organizer.tree_database import save_database_operations
+from vn_organizer.tree_database import use_database_format
+from vn_organizer.tree_database import write_database_tree
+from vn_organizer.tree_index import add_to_index
+from vn_organizer.tree_index import get_node
+from vn_organizer.tree_index import get_node_from_path
+from vn_organizer.tree_index import get_node_id
+from vn_organizer.tree_index import invalidate_node
+from vn_organizer.tree_index import remove_from_index
+from vn_organizer.tree_index import replace_node
+from vn_organizer.tree_index import update_positions
+from vn_organizer.tree_index import update_terms
+from vn_organizer.tree_format import is_binary_file
+from vn_organizer.tree_format import iterencode_json
+from vn_organizer.tree_format import loads_json
+from vn_organizer.tree_format import read_binary_tree
+from vn_organizer.tree_format import use_binary_format
+from vn_organizer.tree_format import write_binary_tree
+
+# Bytes encoded at a time when converting files to base64, must be a multiple of 3
+B64_CHUNK_SIZE = 196608
+
+# Maximum number of save files written at the same time
+SAVE_WORKERS = 8
+
+# Journal size in bytes below which the journal is never folded into the snapshot
+JOURNAL_MINIMUM = 1048576
+
+# Pattern matching the names of save files in a save directory, with the page and slot numbers
+SAVE_PATTERN = compile("([0-9]+)-([0-9]+)-LT1\\.save$")
+
+# Version of the tree file format, tree files from older versions are migrated when read
+TREE_FORMAT = 3
 
 def get_color(color:str=None) -> str:
     """
@@ -43,21 +102,55 @@ def get_color(color:str=None) -> str:
         # Default
         return "\033[0m"
 
+def write_b64(file:str, out_file:TextIO) -> int:
+    """
+    Writes the contents of a file to an open text stream as base64 text.
+    The file is read and encoded in fixed-size chunks, so memory use doesn't depend on the size of the file.
+
+    :param file: File to encode
+    :type file: str
+    :param out_file: Text stream to write base64 text to
+    :type out_file: TextIO
+    :return: Number of bytes read from the file
+    :rtype: int
+    """
+    size = 0
+    with open(file, "rb") as in_file:
+        while True:
+            chunk = in_file.read(B64_CHUNK_SIZE)
+            if len(chunk) == 0:
+                break
+            out_file.write(b64encode(chunk).decode("ascii"))
+            size += len(chunk)
+    return size
+
 def file_to_b64(file:str) -> str:
-    with open(file, "rb") as f:
-        ba = bytearray(f.read())
-        data = str(b64encode(ba))
-    # Remove Extraneous characters
-    while data.startswith("b'"):
-        data = data[2:]
-    while data.endswith("'"):
-        data = data[:len(data)-1]
-    return data
+    """
+    Returns the contents of a file as base64 text.
+
+    :param file: File to encode
+    :type file: str
+    :return: Base64 text
+    :rtype: str
+    """
+    out_file = StringIO()
+    write_b64(file, out_file)
+    return out_file.getvalue()
 
 def b64_to_file(b64:str, file:str):
-    ba = bytearray(b64decode(b64))
+    """
+    Decodes base64 text and writes it to a file.
+    The text is decoded in fixed-size chunks, so only one chunk of decoded data is held at a time.
+
+    :param b64: Base64 text to decode
+    :type b64: str
+    :param file: File to write to
+    :type file: str
+    """
+    step = B64_CHUNK_SIZE // 3 * 4
     with open(file, "wb") as f:
-        f.write(ba)
+        for i in range(0, len(b64), step):
+            f.write(b64decode(b64[i:i+step]))
 
 def get_empty_branch_dict() -> dict:
     """
@@ -95,6 +188,8 @@ def add_item_to_dict(branch_dict:dict=None,
         # Add event item to the dict
         if type(item_type) is str and type(text) is str:
             item = {"type":item_type, "text":text}
+            if isinstance(new_dict, BranchNode):
+                item = Item(item_type, text)
             item_list.append(item)
             new_dict["item_list"] = item_list
         # Return the dict with item added
@@ -102,6 +197,47 @@ def add_item_to_dict(branch_dict:dict=None,
     except (KeyError, TypeError):
         return {}
 
+def add_save_to_dict(branch_dict:dict=None, save_hash:str=None) -> dict:
+    """
+    Adds a save item to the item list in a branch dict.
+    Save items only hold the hash of the save, with the data itself kept in the blob store.
+
+    :param branch_dict: Branch dict to add save to, defaults to None
+    :type branch_dict: dict, optional
+    :param save_hash: Blob store hash of the save, defaults to None
+    :type save_hash: str, optional
+    :return: Given branch dict with save added
+    :rtype: dict
+    """
+    try:
+        new_dict = branch_dict
+        if type(save_hash) is str:
+            item = {"type":"s", "hash":save_hash}
+            if isinstance(new_dict, BranchNode):
+                item = Item("s", hash=save_hash)
+            new_dict["item_list"].append(item)
+        return new_dict
+    except (KeyError, TypeError):
+        return {}
+
+def get_saves_from_dict(branch_dict:dict=None) -> List[str]:
+    """
+    Returns the blob hashes of the saves in a branch dict's item list, in order.
+
+    :param branch_dict: Branch dict to get saves from, defaults to None
+    :type branch_dict: dict, optional
+    :return: List of save hashes
+    :rtype: list[str]
+    """
+    try:
+        saves = []
+        for item in branch_dict["item_list"]:
+            if item["type"] == "s":
+                saves.append(item["hash"])
+        return saves
+    except (KeyError, TypeError):
+        return []
+
 def create_branch_in_dict(branch_dict:dict=None,
             prompt:str=None,
             responses:List[str]=None) -> dict:
@@ -126,6 +262,8 @@ def create_branch_in_dict(branch_dict:dict=None,
         new_dict = branch_dict
         for response in responses:
             res_dict = get_empty_branch_dict()
+            if isinstance(new_dict, BranchNode):
+                res_dict = BranchNode()
             res_dict["prompt"] = prompt
             res_dict["response"] = response
             res_dicts.append(res_dict)
@@ -158,10 +296,12 @@ def get_dict_from_path(branch_dict:dict=None, path:List[int]=None) -> dict:
 
 def set_dict_from_path(branch_dict:dict=None,
             replace_dict:dict=None,
-            path:List[int]=None) -> dict:
+            path:List[int]=None,
+            index:dict=None) -> dict:
     """
     Sets the dict at a given path to the given dict.
     Path is a list of indexes indicating which option to pick in the "branch" key of the dict.
+    If a tree index is given, it is updated through replace_node.
     
     :param branch_dict: Branch dict to modify, defaults to None
     :type branch_dict: dict, optional
@@ -169,173 +309,672 @@ def set_dict_from_path(branch_dict:dict=None,
     :type replace_dict: dict, optional
     :param path: Path of the dict to replace, defaults to None
     :type path: list[int], optional
+    :param index: Tree index for the branch dict, defaults to None
+    :type index: dict, optional
     :return: Branch dict with given path modified
     :rtype: dict
     """
     try:
         if len(path) == 0:
             return replace_dict
-        new_dict = branch_dict
-        sub_dict = branch_dict["branch"][path[0]]
-        new_dict["branch"][path[0]] = set_dict_from_path(sub_dict, replace_dict, path[1:])
-        return new_dict
-    except (IndexError, TypeError):
+        if index is not None:
+            replace_node(index, get_node_from_path(index, path), replace_dict)
+            return branch_dict
+        # Replace the dict in the branch list of its parent
+        parent_dict = get_dict_from_path(branch_dict, path[:-1])
+        parent_dict["branch"][path[-1]] = replace_dict
+        return branch_dict
+    except (IndexError, KeyError, TypeError):
         return branch_dict
 
-def is_complete(branch_dict:dict=None) -> bool:
+def get_completion(branch_dict:dict=None, cache:dict=None) -> dict:
     """
-    Returns whether a given branch and all it's sub-branches are marked as complete.
+    Returns the completion state of a branch and counts of the complete and incomplete endings below it.
+    Results are stored per branch in the given cache, so only branches invalidated since the last call are checked again.
+    Branches that haven't been loaded from a database use the completion stored with them.
 
     :param branch_dict: Branch dict to check, defaults to None
     :type branch_dict: dict, optional
-    :return: Whether the branch and all sub-branches are complete
-    :rtype: bool
+    :param cache: Completion cache to use and update, defaults to None
+    :type cache: dict, optional
+    :return: Dict with "complete", "complete_leaves" and "incomplete_leaves" keys
+    :rtype: dict
     """
+    if cache is None:
+        cache = dict()
     try:
-        # Get internal branches
-        branches = branch_dict["branch"]
-        # Check if there are multiple branches
-        if len(branches) == 0:
-            # Return whether this single branch is finished
-            return branch_dict["end"]
-        else:
-            # Check whether each sub branch is finished
-            for branch in branches:
-                if not is_complete(branch):
-                    return False
-        # Return True if all branches are found complete
-        return True
+        # Visit branches depth first, checking each branch after all of its sub-branches
+        stack = [(branch_dict, False)]
+        while len(stack) > 0:
+            cur_dict, visited = stack.pop()
+            if id(cur_dict) in cache:
+                continue
+            if not is_loaded(cur_dict):
+                cache[id(cur_dict)] = (cur_dict, get_stored_completion(cur_dict))
+                continue
+            branches = cur_dict["branch"]
+            if not visited and len(branches) > 0:
+                stack.append((cur_dict, True))
+                for branch in branches:
+                    if id(branch) not in cache:
+                        stack.append((branch, False))
+                continue
+            if len(branches) == 0:
+                # Single branch is complete if it is marked as finished
+                end = cur_dict["end"]
+                completion = {"complete":end,
+                            "complete_leaves":1 if end else 0,
+                            "incomplete_leaves":0 if end else 1}
+            else:
+                # Branch is complete if all sub branches are complete
+                completion = {"complete":True, "complete_leaves":0, "incomplete_leaves":0}
+                for branch in branches:
+                    sub_completion = cache[id(branch)][1]
+                    completion["complete"] = completion["complete"] and sub_completion["complete"]
+                    completion["complete_leaves"] += sub_completion["complete_leaves"]
+                    completion["incomplete_leaves"] += sub_completion["incomplete_leaves"]
+            # Keep the branch in the cache entry so its id can't be reused while cached
+            cache[id(cur_dict)] = (cur_dict, completion)
+        return cache[id(branch_dict)][1]
     except (KeyError, TypeError):
-        return False
+        return {"complete":False, "complete_leaves":0, "incomplete_leaves":0}
 
-def get_dict_print(branch_dict:dict=None, path:List[int]=None) -> str:
+def is_complete(branch_dict:dict=None, cache:dict=None) -> bool:
     """
-    Gets printable text to show the user the contents of the branch dict at a given path.
-    Path is a list of indexes indicating which option to pick in the "branch" key of the dict.
+    Returns whether a given branch and all it's sub-branches are marked as complete.
 
-    :param branch_dict: Branch dict for getting sub dict within, defaults to None
+    :param branch_dict: Branch dict to check, defaults to None
     :type branch_dict: dict, optional
-    :param path: Path of the sub dict to retrieve, defaults to None
-    :type path: list[int], optional
-    :return: Text to show the contents of the given dict at the given path
+    :param cache: Completion cache to use and update, defaults to None
+    :type cache: dict, optional
+    :return: Whether the branch and all sub-branches are complete
+    :rtype: bool
+    """
+    return get_completion(branch_dict, cache)["complete"]
+
+def get_branch_print(sub_dict:dict=None, nested:bool=False, cache:dict=None) -> str:
+    """
+    Gets printable text to show the user the contents of a single branch dict.
+
+    :param sub_dict: Branch dict to show, defaults to None
+    :type sub_dict: dict, optional
+    :param nested: Whether the branch is below the root of the tree, defaults to False
+    :type nested: bool, optional
+    :param cache: Completion cache to use and update, defaults to None
+    :type cache: dict, optional
+    :return: Text to show the contents of the given branch dict
     :rtype: str
     """
     try:
-        # Get the sub dict from the given path
-        sub_dict = get_dict_from_path(branch_dict, path)
+        lines = []
+        # Add elipses if not at the beginning of the branch
+        if nested:
+            lines.append("(...)")
+        # Add complete tag if the branch and all sub-branches are complete
+        if is_complete(sub_dict, cache):
+            lines.append(get_color("g") + "[COMPLETE BRANCH]" + get_color("d"))
+        # Get the current response and prompt
+        if sub_dict["response"] is not None and sub_dict["prompt"] is not None:
+            lines.append(get_color("r") + "(P) " + sub_dict["prompt"] + get_color("d"))
+            lines.append(get_color("g") + "    ﹂" + sub_dict["response"] + get_color("d"))
+        # Add tabs to the contents if necessary
+        indent = "     " if nested else ""
         # Get the item list
-        text = ""
-        item_list = sub_dict["item_list"]
         save_num = 1
-        for item in item_list:
+        for item in sub_dict["item_list"]:
             if item["type"] == "s":
-                line = get_color("c") + "(S) Save " + str(save_num)
-                text = text + "\n" + line + get_color("d")
+                lines.append(indent + get_color("c") + "(S) Save " + str(save_num) + get_color("d"))
                 save_num += 1
             else:
-                line = get_color(item["type"].lower()) + "(E) "
-                text = text + "\n" + line + item["text"] + get_color("d")
+                lines.append(indent + get_color(item["type"].lower()) + "(E) " + item["text"] + get_color("d"))
         # Add ending marker, if present
         if sub_dict["end"]:
-            text = text + "\n[END]"
+            lines.append(indent + "[END]")
         # Get the next prompt and responses if available
         branches = sub_dict["branch"]
         if len(branches) > 0:
-            text = text +  get_color("r") + "\n(P) " + branches[0]["prompt"] + get_color("d")
+            lines.append(indent + get_color("r") + "(P) " + branches[0]["prompt"] + get_color("d"))
             for branch in branches:
-                text = text + get_color("g") + "\n    ﹂" + branch["response"] + get_color("d")
-                if not is_complete(branch):
-                    text = text + get_color("r") + "\n        [INCOMPLETE]" + get_color("d")
-        # Add tabs to text if necessary
-        if len(path) > 0:
-            text = text.replace("\n", "\n     ")
-        text = sub("^\n", "", text)
-        # Get the current response and prompt
-        if sub_dict["response"] is not None and sub_dict["prompt"] is not None:
-            text = get_color("g") + "    ﹂" + sub_dict["response"] + get_color("d") + "\n" + text
-            text = get_color("r") + "(P) " + sub_dict["prompt"] + get_color("d") + "\n" + text
-        # Add complete tag if the branch and all sub-branches are complete
-        if is_complete(sub_dict):
-            text = get_color("g") + "[COMPLETE BRANCH]" + get_color("d") + "\n" + text
-        # Add elipses if not at the beginning of the branch
-        if len(path) > 0:
-            text = "(...)\n" + text
+                lines.append(indent + get_color("g") + "    ﹂" + branch["response"] + get_color("d"))
+                if not is_complete(branch, cache):
+                    lines.append(indent + get_color("r") + "        [INCOMPLETE]" + get_color("d"))
         # Return the formatted text
-        text = sub("^\n+|\n+$", "", text)
+        return "\n".join(lines)
+    except (AttributeError, KeyError, TypeError):
+        return ""
+
+def get_node_print(index:dict=None, node_id:int=None) -> str:
+    """
+    Gets printable text to show the user the contents of the branch with the given node ID.
+    Text is cached in the tree index until the branch or one of its sub-branches is edited.
+
+    :param index: Tree index, defaults to None
+    :type index: dict, optional
+    :param node_id: Node ID of the branch to show, defaults to None
+    :type node_id: int, optional
+    :return: Text to show the contents of the branch
+    :rtype: str
+    """
+    try:
+        if node_id in index["render"]:
+            return index["render"][node_id][1]
+        sub_dict = get_node(index, node_id)
+        text = get_branch_print(sub_dict, not node_id == index["root"], index["completion"])
+        index["render"][node_id] = (sub_dict, text)
         return text
     except (KeyError, TypeError):
         return ""
 
-def write_tree(file:str, branch_dict:dict, primary_path:str, secondary_path:str, persistent:str):
+def get_dict_print(branch_dict:dict=None, path:List[int]=None, cache:dict=None) -> str:
+    """
+    Gets printable text to show the user the contents of the branch dict at a given path.
+    Path is a list of indexes indicating which option to pick in the "branch" key of the dict.
+
+    :param branch_dict: Branch dict for getting sub dict within, defaults to None
+    :type branch_dict: dict, optional
+    :param path: Path of the sub dict to retrieve, defaults to None
+    :type path: list[int], optional
+    :param cache: Completion cache to use and update, defaults to None
+    :type cache: dict, optional
+    :return: Text to show the contents of the given dict at the given path
+    :rtype: str
+    """
+    try:
+        # Get the sub dict from the given path
+        sub_dict = get_dict_from_path(branch_dict, path)
+        return get_branch_print(sub_dict, len(path) > 0, cache)
+    except TypeError:
+        return ""
+
+def write_tree(file:str, branch_dict:dict, primary_path:str, secondary_path:str, persistent:str, sequence:int=0) -> bool:
     """
     Write a given branch dict as a JSON file with the given filename.
+    Files with the binary format's extension are written as a compressed binary container instead,
+    and files with the database format's extension are written as an SQLite database.
+    The file is written to a temporary file first and renamed, so a failed write never corrupts it.
+    The persistent file is stored in the blob store, and is only read again if it changed since it was last stored.
 
     :param file: File path to save JSON file to, defaults to None
     :type file: str, optional
     :param branch_dict: Dictionary to save as a JSON file, defaults to None
     :type branch_dict: dict, optional
+    :param persistent: Blob hash of the persistent data, used if the persistent file doesn't exist, defaults to None
+    :type persistent: str, optional
+    :param sequence: Sequence number of the last journal operation included, defaults to 0
+    :type sequence: int, optional
+    :return: Whether the file was written
+    :rtype: bool
     """
+    temp_file = abspath(file) + ".tmp"
     try:
         # Test that the branch_dict is a proper dict
-        assert type(branch_dict) is dict
+        assert type(branch_dict) is dict or isinstance(branch_dict, BranchNode)
         cur_dict = dict()
         cur_dict["application"] = "VN-Organizer"
+        cur_dict["format"] = TREE_FORMAT
+        cur_dict["sequence"] = sequence
         cur_dict["primary_path"] = primary_path
         cur_dict["secondary_path"] = secondary_path
         cur_dict["tree"] = branch_dict
-        # Check for persistent file
+        # Store the persistent file, or write persistent data if it doesn't exist
+        blob_dir = get_blob_directory(file)
         prime_persistent = abspath(join(primary_path, "persistent"))
-        # Read persistent file, if exists
-        persistent_data = persistent
         if exists(prime_persistent):
-            persistent_data = file_to_b64(prime_persistent)
-        cur_dict["persistent"] = persistent_data
-        # Write persistent data, if it doesn't exist
-        if persistent_data is not None and not exists(prime_persistent):
-            b64_to_file(persistent_data, prime_persistent)
+            persistent = cached_file_to_blob(blob_dir, prime_persistent)
+        elif persistent is not None:
+            blob_to_file(blob_dir, persistent, prime_persistent)
+        cur_dict["persistent"] = persistent
+        if use_database_format(file):
+            # Write dict as a database, only loading SQLite when a database is written
+            from sqlite3 import DatabaseError
+            try:
+                write_database_tree(file, cur_dict, blob_dir)
+            except DatabaseError:
+                from traceback import print_exc
+                print_exc()
+                return False
+            return True
+        if use_binary_format(file):
+            # Write dict as a binary file
+            with open(temp_file, "wb") as out_file:
+                write_binary_tree(out_file, cur_dict, blob_dir)
+                out_file.flush()
+                fsync(out_file.fileno())
+            replace(temp_file, abspath(file))
+            return True
         # Write dict as a JSON file
-        with open(abspath(file), "w") as out_file:
-            dump(cur_dict, out_file, indent=4, separators=(",", ": "))
+        with open(temp_file, "w") as out_file:
+            out_file.write("{")
+            for key in cur_dict:
+                out_file.write("\n    " if key == "application" else ",\n    ")
+                out_file.write(dumps(key) + ": ")
+                for chunk in iterencode_json(cur_dict[key], 4, 1):
+                    out_file.write(chunk)
+            out_file.write("\n}")
+            out_file.flush()
+            fsync(out_file.fileno())
+        replace(temp_file, abspath(file))
+        return True
     except (AssertionError, FileNotFoundError, TypeError):
+        from traceback import print_exc
         print_exc()
+        return False
+    finally:
+        # Remove what was written of a failed write
+        if exists(temp_file):
+            remove(temp_file)
 
-def read_tree(file:str=None) -> dict:
+def read_tree(file:str=None, lazy:bool=False) -> dict:
     """
     Reads a JSON file and converts to a branch dict.
+    Files in the binary and database formats are detected and read as well.
+    Database files can be read lazily, loading branches as they are used instead of all at once.
+    JSON files read lazily are taken from their parsed tree cache as BranchNode objects when it's up to date,
+    and the cache is rebuilt in the background otherwise.
     Returns None is keys of the dict do not match the branch dict format.
+    Saves and persistent data stored inline by older versions are moved into the blob store.
+    Operations in the edit journal that are newer than the file are applied to the result.
 
     :param file: File path of JSON file to read, defaults to None
     :type file: str, optional
+    :param lazy: Whether to load database branches as they are used and read JSON files from their cache, defaults to False
+    :type lazy: bool, optional
     :return: Branch dict
     :rtype: dict
     """
     try:
-        # Read given file as JSON
-        with open(abspath(file)) as in_file:
-            json = load(in_file)
+        # Read given file as JSON, or as a binary or database file
+        stamp = None
+        if is_database_file(file):
+            json = read_database_tree(file, get_blob_directory(file), lazy)
+        elif is_binary_file(file):
+            json = read_binary_tree(file, get_blob_directory(file))
+        else:
+            json = read_tree_cache(file) if lazy else None
+            if json is None:
+                stamp = get_file_stamp(file)
+                with open(abspath(file)) as in_file:
+                    json = loads_json(in_file.read())
         # Check if JSON is for a branch dict
         assert json["application"] == "VN-Organizer"
+        # Move inline saves and persistent data from older files into the blob store
+        blob_dir = get_blob_directory(file)
+        file_format = json.get("format", 1)
+        if file_format < 2:
+            migrate_inline_saves(json["tree"], blob_dir)
+        json["persistent"] = json.get("persistent")
+        if file_format < 3 and json["persistent"] is not None:
+            json["persistent"] = write_blob(blob_dir, b64decode(json["persistent"]))
+        json["format"] = TREE_FORMAT
+        # Replay edits from the journal that aren't part of the snapshot
+        json["sequence"] = json.get("sequence", 0)
+        for operation in read_journal(file):
+            if operation["op"] == "set_persistent" and "data" in operation:
+                operation["hash"] = write_blob(blob_dir, b64decode(operation["data"]))
+            if operation["sequence"] > json["sequence"]:
+                apply_operation(json, operation)
+                json["sequence"] = operation["sequence"]
+        # Cache the parsed tree if it wasn't read from the cache
+        if lazy and stamp is not None:
+            start_cache_rebuild(file, json, stamp)
         return json
-    except (AssertionError, FileNotFoundError, JSONDecodeError, KeyError, TypeError):
+    except (AssertionError, FileNotFoundError, JSONDecodeError, KeyError, TypeError, binerror):
+        return None
+
+def get_operation_dict(tree_dict:dict=None, operation:dict=None, index:dict=None, node_id:int=None) -> dict:
+    """
+    Returns the branch an edit operation affects.
+    Given a tree index and the node ID of the branch, the branch is taken from the index instead of following the path.
+
+    :param tree_dict: Tree dict the operation applies to, defaults to None
+    :type tree_dict: dict, optional
+    :param operation: Edit operation, defaults to None
+    :type operation: dict, optional
+    :param index: Tree index for the tree, defaults to None
+    :type index: dict, optional
+    :param node_id: Node ID of the branch at the path of the operation, defaults to None
+    :type node_id: int, optional
+    :return: Branch dict the operation affects
+    :rtype: dict
+    """
+    if index is not None and node_id is not None:
+        return index["nodes"][node_id]
+    return get_dict_from_path(tree_dict["tree"], operation["path"])
+
+def apply_operation(tree_dict:dict=None, operation:dict=None, index:dict=None, node_id:int=None) -> bool:
+    """
+    Applies an edit operation to a tree dict as returned by read_tree.
+    Operations are dicts with an "op" key naming the edit and a "path" key for the branch it affects.
+
+    :param tree_dict: Tree dict to modify, defaults to None
+    :type tree_dict: dict, optional
+    :param operation: Edit operation to apply, defaults to None
+    :type operation: dict, optional
+    :param index: Tree index to keep up to date with the edit, defaults to None
+    :type index: dict, optional
+    :param node_id: Node ID of the branch at the path of the operation, to avoid following the path, defaults to None
+    :type node_id: int, optional
+    :return: Whether the operation was applied
+    :rtype: bool
+    """
+    try:
+        op = operation["op"]
+        # Apply operations that affect the whole file
+        if op == "set_paths":
+            tree_dict["primary_path"] = operation["primary"]
+            tree_dict["secondary_path"] = operation["secondary"]
+            return True
+        if op == "set_persistent":
+            tree_dict["persistent"] = operation["hash"]
+            return True
+        # Apply operations that affect a single branch
+        sub_dict = get_operation_dict(tree_dict, operation, index, node_id)
+        if index is not None:
+            node_id = get_node_id(index, sub_dict)
+            invalidate_node(index, node_id)
+        if op == "add_item":
+            item = operation["item"]
+            if item["type"] == "s":
+                add_save_to_dict(sub_dict, item["hash"])
+            else:
+                add_item_to_dict(sub_dict, item["type"], item["text"])
+            # Move the item into place if it isn't added to the end
+            if "index" in operation:
+                sub_dict["item_list"].insert(operation["index"], sub_dict["item_list"].pop())
+        elif op == "create_branch":
+            if index is not None:
+                for branch in sub_dict["branch"]:
+                    remove_from_index(index, branch)
+            create_branch_in_dict(sub_dict, operation["prompt"], operation["responses"])
+            if index is not None:
+                for i in range(0, len(sub_dict["branch"])):
+                    add_to_index(index, sub_dict["branch"][i], node_id, i)
+        elif op == "delete_item":
+            del sub_dict["item_list"][operation["index"]]
+        elif op == "delete_branch":
+            position = get_list_position(len(sub_dict["branch"]), operation["index"])
+            if index is not None:
+                remove_from_index(index, sub_dict["branch"][position])
+            del sub_dict["branch"][position]
+            if index is not None:
+                update_positions(index, node_id, position)
+        elif op == "insert_branch" or op == "set_branches":
+            # Copy the stored branches, so the operation can be applied again
+            branches = [operation["branch"]] if op == "insert_branch" else operation["branches"]
+            convert = to_nodes if isinstance(sub_dict, BranchNode) else to_dicts
+            branches = [convert(branch) for branch in branches]
+            if index is not None and op == "set_branches":
+                for branch in sub_dict["branch"]:
+                    remove_from_index(index, branch)
+            if op == "insert_branch":
+                position = get_list_position(len(sub_dict["branch"]), operation["index"], True)
+                sub_dict["branch"].insert(position, branches[0])
+            else:
+                position = 0
+                sub_dict["branch"] = branches
+                sub_dict["end"] = operation["end"]
+            if index is not None:
+                for i in range(0, len(branches)):
+                    add_to_index(index, branches[i], node_id, position + i)
+                update_positions(index, node_id, position + len(branches))
+        elif op == "toggle_end":
+            sub_dict["end"] = not sub_dict["end"]
+            if len(sub_dict["branch"]) > 0:
+                sub_dict["end"] = False
+        else:
+            return False
+        # Update the search terms for changes to the item list
+        if index is not None and op in ["add_item", "delete_item"]:
+            update_terms(index, node_id)
+        return True
+    except (IndexError, KeyError, TypeError):
+        return False
+
+def get_persistent_operation(tree_dict:dict=None, blob_dir:str=None) -> dict:
+    """
+    Returns an operation for storing the persistent file in the primary save path if it changed.
+    The persistent file is only read if its modification time or size changed since it was last stored.
+    If the persistent file is missing, it is restored from the blob store instead.
+
+    :param tree_dict: Tree dict as returned by read_tree, defaults to None
+    :type tree_dict: dict, optional
+    :param blob_dir: Blob directory of the tree file, defaults to None
+    :type blob_dir: str, optional
+    :return: Operation setting the persistent blob hash, None if unchanged
+    :rtype: dict
+    """
+    try:
+        prime_persistent = abspath(join(tree_dict["primary_path"], "persistent"))
+        if exists(prime_persistent):
+            persistent_hash = cached_file_to_blob(blob_dir, prime_persistent)
+            if persistent_hash is not None and not persistent_hash == tree_dict["persistent"]:
+                return {"op":"set_persistent", "hash":persistent_hash}
+        elif tree_dict["persistent"] is not None:
+            blob_to_file(blob_dir, tree_dict["persistent"], prime_persistent)
         return None
+    except (FileNotFoundError, KeyError, TypeError):
+        return None
+
+def compact_tree(file:str=None, tree_dict:dict=None) -> bool:
+    """
+    Writes the full tree as a new snapshot and removes the edit journal it replaces.
+    The tree dict is updated with the current persistent file, as the snapshot includes it.
 
-def create_saves(saves:List[str], primary_path:str, secondary_path:str):
-    # Delete existing saves
-    regex = ".+\\.save$"
-    filenames = listdir(primary_path)
-    for filename in filenames:
-        if len(findall(regex, filename)) > 0:
-            fullfile = abspath(join(primary_path, filename))
-            remove(fullfile)
-    filenames = listdir(secondary_path)
-    for filename in filenames:
-        if len(findall(regex, filename)) > 0:
-            fullfile = abspath(join(secondary_path, filename))
-            remove(fullfile)
-    # Save all save files
-    for i in range(0, len(saves)):
-        # Save files
-        savenum = i+1
-        filename = f"1-{savenum}-LT1.save"
-        b64_to_file(saves[i], abspath(join(primary_path, filename)))
-        b64_to_file(saves[i], abspath(join(secondary_path, filename)))
+    :param file: File path of the tree file, defaults to None
+    :type file: str, optional
+    :param tree_dict: Tree dict as returned by read_tree, defaults to None
+    :type tree_dict: dict, optional
+    :return: Whether the snapshot was written, the journal is kept if it wasn't
+    :rtype: bool
+    """
+    persistent_operation = get_persistent_operation(tree_dict, get_blob_directory(file))
+    if persistent_operation is not None:
+        apply_operation(tree_dict, persistent_operation)
+    if not write_tree(file, tree_dict["tree"], tree_dict["primary_path"],
+                tree_dict["secondary_path"], tree_dict["persistent"], tree_dict["sequence"]):
+        return False
+    clear_journal(file)
+    return True
+
+def convert_tree(file:str=None, new_file:str=None) -> bool:
+    """
+    Writes a tree file to a new file, converting between the JSON and binary formats based on the new file's extension.
+    Saves used in the tree are copied into the blob directory of the new file.
+
+    :param file: File path of the tree file to convert, defaults to None
+    :type file: str, optional
+    :param new_file: File path to write the converted tree to, defaults to None
+    :type new_file: str, optional
+    :return: Whether the file was converted
+    :rtype: bool
+    """
+    tree_dict = read_tree(file)
+    if tree_dict is None or new_file is None:
+        return False
+    # Copy saves to the new blob directory
+    blob_hashes = get_tree_blobs(tree_dict["tree"]) + [tree_dict["persistent"]]
+    copy_blobs(get_blob_directory(file), get_blob_directory(new_file), blob_hashes)
+    # Write the tree in the new format
+    clear_journal(new_file)
+    return compact_tree(new_file, tree_dict)
+
+def needs_compaction(file:str=None) -> bool:
+    """
+    Returns whether the edit journal of a tree file has grown large enough to fold into a new snapshot.
+    The journal is folded once it grows larger than the tree file itself.
+
+    :param file: File path of the tree file, defaults to None
+    :type file: str, optional
+    :return: Whether the tree file should be compacted
+    :rtype: bool
+    """
+    try:
+        if not exists(abspath(file)):
+            return True
+        return get_journal_size(file) > max(getsize(abspath(file)), JOURNAL_MINIMUM)
+    except (FileNotFoundError, TypeError):
+        return False
+
+def number_operations(tree_dict:dict=None, operations:List[dict]=None):
+    """
+    Gives operations the next sequence numbers of a tree, so they can be replayed in order from the journal.
+
+    :param tree_dict: Tree dict the operations were applied to, defaults to None
+    :type tree_dict: dict, optional
+    :param operations: Operations to number, defaults to None
+    :type operations: list[dict], optional
+    """
+    for operation in operations:
+        tree_dict["sequence"] = tree_dict["sequence"] + 1
+        operation["sequence"] = tree_dict["sequence"]
+
+def write_operations(file:str=None, operations:List[dict]=None) -> bool:
+    """
+    Writes numbered operations to the edit journal of a tree file, or to the rows of a database file.
+    Only the operations are used, so the tree can be edited while they are written.
+
+    :param file: File path of the tree file, defaults to None
+    :type file: str, optional
+    :param operations: Operations numbered by number_operations, defaults to None
+    :type operations: list[dict], optional
+    :return: Whether the operations were written
+    :rtype: bool
+    """
+    if is_database_file(file):
+        return save_database_operations(file, operations, get_blob_directory(file))
+    return append_journal(file, operations)
+
+def save_tree(file:str=None, tree_dict:dict=None, operations:List[dict]=None, compact:bool=True) -> bool:
+    """
+    Saves edits made to a tree by appending the operations to the edit journal.
+    The journal is folded into a new snapshot once it grows larger than the tree file itself.
+    Database files have no journal, and have the operations written to their rows in a single transaction instead.
+
+    :param file: File path of the tree file, defaults to None
+    :type file: str, optional
+    :param tree_dict: Tree dict the operations were already applied to, defaults to None
+    :type tree_dict: dict, optional
+    :param operations: Operations applied since the last save, defaults to None
+    :type operations: list[dict], optional
+    :param compact: Whether to fold the journal into a new snapshot if needed, defaults to True
+    :type compact: bool, optional
+    :return: Whether the edits were saved
+    :rtype: bool
+    """
+    try:
+        # Record changes to the persistent file
+        operations = list(operations)
+        persistent_operation = get_persistent_operation(tree_dict, get_blob_directory(file))
+        if persistent_operation is not None:
+            apply_operation(tree_dict, persistent_operation)
+            operations.append(persistent_operation)
+        # Number the operations and append them to the journal
+        number_operations(tree_dict, operations)
+        if not write_operations(file, operations):
+            return False
+        # Fold the journal into a new snapshot if it has grown too large
+        if compact and needs_compaction(file):
+            compact_tree(file, tree_dict)
+        return True
+    except (KeyError, TypeError):
+        return False
+
+def create_saves(saves:List[str], primary_path:str, secondary_path:str, blob_dir:str) -> int:
+    """
+    Replaces the save files in the save directories with the given saves.
+    Only save slots whose contents differ from the given saves are written, and slots are written in parallel.
+
+    :param saves: Blob store hashes of the saves to create
+    :type saves: list[str]
+    :param primary_path: Primary save directory
+    :type primary_path: str
+    :param secondary_path: Secondary save directory, None if not used
+    :type secondary_path: str
+    :param blob_dir: Blob directory holding the saves
+    :type blob_dir: str
+    :return: Number of save files written
+    :rtype: int
+    """
+    # Get the save files that should exist in each directory
+    regex = compile(".+\\.save$")
+    save_paths = [primary_path]
+    if secondary_path is not None:
+        save_paths.append(secondary_path)
+    targets = dict()
+    for save_path in save_paths:
+        for i in range(0, len(saves)):
+            savenum = i+1
+            targets[abspath(join(save_path, f"1-{savenum}-LT1.save"))] = saves[i]
+    # Delete existing saves that aren't part of the given saves
+    for save_path in save_paths:
+        with scandir(save_path) as entries:
+            for entry in entries:
+                fullfile = abspath(entry.path)
+                if regex.match(entry.name) is not None and fullfile not in targets:
+                    remove(fullfile)
+    # Write save files that don't match the given saves, loading thread pools once they're first used
+    if len(targets) == 0:
+        return 0
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=min(len(targets), SAVE_WORKERS)) as executor:
+        futures = []
+        for fullfile in targets:
+            futures.append(executor.submit(update_file_from_blob, blob_dir, targets[fullfile], fullfile))
+        written = 0
+        for future in futures:
+            if future.result():
+                written += 1
+    return written
+
+def get_save_files(save_path:str=None) -> List[str]:
+    """
+    Returns the save files in a save directory, ordered by page and slot number.
+
+    :param save_path: Save directory to search, defaults to None
+    :type save_path: str, optional
+    :return: Full paths of the save files
+    :rtype: list[str]
+    """
+    try:
+        files = []
+        with scandir(save_path) as entries:
+            for entry in entries:
+                match = SAVE_PATTERN.search(entry.name)
+                if match is not None and entry.is_file():
+                    files.append((int(match.group(1)), int(match.group(2)), abspath(entry.path)))
+        return [file[2] for file in sorted(files)]
+    except (FileNotFoundError, NotADirectoryError, TypeError):
+        return []
+
+def ingest_saves(branch_dict:dict=None, save_path:str=None, blob_dir:str=None) -> List[Tuple[str, str]]:
+    """
+    Stores every save file in a save directory in the blob store.
+    Files are read and hashed in parallel, and saves that are already in the tree or repeated in the directory are skipped.
+
+    :param branch_dict: Root branch dict of the tree, used to skip saves already in it, defaults to None
+    :type branch_dict: dict, optional
+    :param save_path: Save directory to ingest, defaults to None
+    :type save_path: str, optional
+    :param blob_dir: Blob directory to store saves in, defaults to None
+    :type blob_dir: str, optional
+    :return: Path and blob hash of each new save, in the order they should be added
+    :rtype: list[tuple[str, str]]
+    """
+    files = get_save_files(save_path)
+    if len(files) == 0:
+        return []
+    # Store the save files in the blob store
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=min(len(files), SAVE_WORKERS)) as executor:
+        futures = []
+        for file in files:
+            futures.append(executor.submit(file_to_blob, blob_dir, file))
+        hashes = [future.result() for future in futures]
+    # Get the saves that aren't in the tree yet
+    existing = set(get_stored_tree_blobs(branch_dict))
+    added = []
+    for i in range(0, len(files)):
+        if hashes[i] is not None and hashes[i] not in existing:
+            existing.add(hashes[i])
+            added.append((files[i], hashes[i]))
+    return added
@@ -2,20 +2,51 @@
 
 from argparse import ArgumentParser
 
+from gc import freeze
 from os import pardir, system
-from os import name as os_name, listdir
+from os import name as os_name
 from os.path import abspath, basename, join, exists, isdir
-from re import findall
+from shlex import split
+from sys import exit, stdin, stdout
+from time import perf_counter
 from typing import List
-from vn_organizer.vn_organizer import add_item_to_dict
-from vn_organizer.vn_organizer import create_branch_in_dict
+from vn_organizer.autosave import flush_autosave
+from vn_organizer.autosave import queue_operations
+from vn_organizer.autosave import start_autosave
+from vn_organizer.autosave import stop_autosave
+from vn_organizer.blob_store import file_to_blob
+from vn_organizer.blob_store import get_blob_directory
+from vn_organizer.blob_store import pack_saves
+from vn_organizer.history import apply_with_history
+from vn_organizer.history import get_empty_history
+from vn_organizer.history import redo_operation
+from vn_organizer.history import undo_operation
+from vn_organizer.journal import clear_journal
+from vn_organizer.nodes import BranchNode
+from vn_organizer.nodes import to_nodes
+from vn_organizer.profiling import record_command
+from vn_organizer.profiling import start_profiling
+from vn_organizer.profiling import stop_profiling
+from vn_organizer.tree_database import get_stored_tree_blobs
+from vn_organizer.tree_database import is_database_file
+from vn_organizer.tree_database import load_blobs
+from vn_organizer.tree_index import build_index
+from vn_organizer.tree_index import get_node
+from vn_organizer.tree_index import get_node_from_path
+from vn_organizer.tree_index import get_node_id
+from vn_organizer.tree_index import get_node_path
+from vn_organizer.tree_index import get_parent_id
+from vn_organizer.tree_index import search_index
+from vn_organizer.vn_organizer import compact_tree
+from vn_organizer.vn_organizer import convert_tree
 from vn_organizer.vn_organizer import create_saves
-from vn_organizer.vn_organizer import file_to_b64
-from vn_organizer.vn_organizer import get_dict_print
-from vn_organizer.vn_organizer import get_dict_from_path
+from vn_organizer.vn_organizer import get_node_print
 from vn_organizer.vn_organizer import get_empty_branch_dict
+from vn_organizer.vn_organizer import get_save_files
+from vn_organizer.vn_organizer import get_saves_from_dict
+from vn_organizer.vn_organizer import ingest_saves
 from vn_organizer.vn_organizer import read_tree
-from vn_organizer.vn_organizer import set_dict_from_path
+from vn_organizer.vn_organizer import save_tree
 from vn_organizer.vn_organizer import write_tree
 
 def get_save_paths() -> (str, str):
@@ -47,19 +78,13 @@ def get_save_paths() -> (str, str):
     # Return directories
     return primary, secondary
 
-def get_save(save_path:str) -> str:
+def get_save(save_path:str, blob_dir:str) -> str:
     # Get the main save files
-    files = []
-    regex = "[0-9]-[0-9]-LT1\\.save$"
-    all_files = listdir(save_path)
-    all_files = sorted(all_files)
-    for filename in all_files:
-        if len(findall(regex, filename)) > 0:
-            files.append(filename)
+    files = get_save_files(save_path)
     # Print list of save files
     print()
     for i in range(0, len(files)):
-        print("(" + str(i+1) + ") " + str(files[i]))
+        print("(" + str(i+1) + ") " + basename(files[i]))
     # Have the user choose a save file.
     response = input("Which save? (Defaults to 1): ")
     if response == "":
@@ -70,95 +95,199 @@ def get_save(save_path:str) -> str:
             return None
     except ValueError:
         return None
-    # Read save file as binary
-    file = abspath(join(save_path, files[response]))
-    return file_to_b64(file)
+    # Store save file in the blob store
+    return file_to_blob(blob_dir, files[response])
 
-def user_edit(file:str=None, branch_dict:dict=None):
-    path = []
+def redraw_terminal(text:str=None):
+    # Move to the top of the terminal and draw over the previous screen
+    lines = text.split("\n")
+    stdout.write("\033[H" + "\033[K\n".join(lines) + "\033[J")
+    stdout.flush()
+
+def user_edit(file:str=None, branch_dict:dict=None, watch:bool=False):
     text = None
     cur_dict = branch_dict["tree"]
-    primary = branch_dict["primary_path"]
-    secondary = branch_dict["secondary_path"]
-    persistent = branch_dict["persistent"]
-    while True:
-        # Clear the terminal
-        if os_name == "nt":
-            system("cls")
-        else:
-            system("clear")
-        # Print the branch dict at the current path
-        print(get_dict_print(cur_dict, path))
-        # Print additional text if present
-        if text is not None:
-            print(f"\n{text}")
-        # Get user command
-        print()
-        response = input("Command (h for help): ").lower()
-        # Check user command
-        if response == "w":
-            # Write dict to file
-            write_tree(file, cur_dict, primary, secondary, persistent)
-            text = "Saved File"
-            continue
-        if response == "a":
-            # Add element to the dict
-            cur_dict = add_element(cur_dict, path, primary)
-            text = None
-            continue
-        if response == "d":
-            # Delete element from the dict
-            cur_dict = delete_element(cur_dict, path)
-            text = None
-            continue
-        if response == "m":
-            # Move into part of the dict
-            path = move(cur_dict, path)
-            # Create save for the path
-            item_list = get_dict_from_path(cur_dict, path)["item_list"]
-            saves = []
-            for item in item_list:
-                if item["type"] == "s":
-                    saves.append(item["text"])
-            create_saves(saves, primary, secondary)
-            text = None
-            continue
-        if response == "f":
-            # Toggle the end flag for branch of the dict
-            sub_dict = get_dict_from_path(cur_dict, path)
-            sub_dict["end"] = not sub_dict["end"]
-            if len(sub_dict["branch"]) > 0:
-                sub_dict["end"] = False
-            cur_dict = set_dict_from_path(cur_dict, sub_dict, path)
-            text = "Toggled END"
-            continue
-        if response == "s":
-            primary, secondary = get_save_paths()
-            continue
-        if response == "q":
-            if input("Quit without saving? (Y/N): ").lower() == "y":
-                # Clear the terminal
-                if os_name == "nt":
-                    system("cls")
-                else:
-                    system("clear")
+    # Enable escape sequences in the Windows console
+    if os_name == "nt":
+        system("")
+    blob_dir = get_blob_directory(file)
+    # Edits that can be undone and redone
+    history = get_empty_history()
+    # Leave the tree out of later garbage collections while it's indexed, as it's kept until the editor closes
+    freeze()
+    # Index of the branches in the tree, starting at the root
+    index = build_index(cur_dict)
+    node_id = index["root"]
+    # Save edits in the background, the tree is only edited while holding the autosave's condition
+    autosave = start_autosave(file, branch_dict)
+    lock = autosave["condition"]
+    # Names of save files captured since the last redraw
+    captured = []
+    watcher = None
+    def queue_edits(operations:List[dict]):
+        # Queue edits for the autosave, and stop the watcher capturing copies of the saves they add
+        queue_operations(autosave, operations)
+        if watcher is not None:
+            add_known_saves(watcher, operations)
+    def capture_save(save_file:str, save_hash:str):
+        # Add a save written to the primary save path to the current branch
+        with lock:
+            operation = {"op":"add_item", "path":get_node_path(index, node_id), "item":{"type":"s", "hash":save_hash}}
+            if apply_with_history(branch_dict, operation, index, history, node_id):
+                queue_edits([operation])
+                captured.append(basename(save_file))
+    # Command being run and when it was entered, for profiling
+    response = None
+    start = None
+    if watch:
+        # Modules only used by a single command are imported when it runs, so they don't slow down startup
+        from vn_organizer.save_watcher import add_known_saves
+        from vn_organizer.save_watcher import start_watch
+        from vn_organizer.save_watcher import stop_watch
+        known = set(get_stored_tree_blobs(cur_dict))
+        watcher = start_watch(branch_dict["primary_path"], blob_dir, known, capture_save)
+    try:
+        while True:
+            # Redraw the terminal with the branch dict at the current node
+            # The index is read while holding the condition, as captured saves are added from the watcher thread
+            with lock:
+                sub_dict = get_node(index, node_id)
+                screen = get_node_print(index, node_id)
+                # Report saves captured from the save path
+                if len(captured) > 0:
+                    text = "Captured " + ", ".join(captured)
+                    captured.clear()
+            # Report failed autosaves
+            if autosave["failed"]:
+                text = "Failed to Save File"
+            # Add additional text if present
+            if text is not None:
+                screen = f"{screen}\n\n{text}"
+            redraw_terminal(screen + "\n\n")
+            record_command(response, start)
+            # Get user command
+            response = input("Command (h for help): ").lower()
+            start = perf_counter()
+            primary = branch_dict["primary_path"]
+            secondary = branch_dict["secondary_path"]
+            # Check user command
+            operation = None
+            if response in ["a", "d", "f", "i"]:
+                with lock:
+                    path = get_node_path(index, node_id)
+            if response == "w":
+                # Write edits without waiting for the autosave
+                text = "Saved File" if flush_autosave(autosave) else "Failed to Save File"
+                continue
+            if response == "a":
+                # Add element to the dict
+                operation = add_element(path, primary, blob_dir)
+                text = None
+            elif response == "d":
+                # Delete element from the dict
+                operation = delete_element(sub_dict, path)
+                text = None
+            elif response == "m":
+                # Move into part of the dict
+                node_id = move(index, node_id)
+                # Create save for the path
+                saves = get_saves_from_dict(get_node(index, node_id))
+                load_blobs(cur_dict, blob_dir, saves)
+                create_saves(saves, primary, secondary, blob_dir)
+                text = None
+                continue
+            elif response == "f":
+                # Toggle the end flag for branch of the dict
+                operation = {"op":"toggle_end", "path":list(path)}
+                text = "Toggled END"
+            elif response == "i":
+                # Add every new save in the primary save path
+                added = ingest_saves(cur_dict, primary, blob_dir)
+                operations = []
+                with lock:
+                    for save in added:
+                        operation = {"op":"add_item", "path":list(path), "item":{"type":"s", "hash":save[1]}}
+                        if apply_with_history(branch_dict, operation, index, history, node_id):
+                            operations.append(operation)
+                    queue_edits(operations)
+                text = get_ingest_report(added)
+                continue
+            elif response == "j":
+                # Jump to a branch containing the search text
+                node_id = search(index, node_id)
+                text = None
+                continue
+            elif response == "s":
+                primary, secondary = get_save_paths()
+                operation = {"op":"set_paths", "primary":primary, "secondary":secondary}
+            elif response == "u" or response == "r":
+                # Undo or redo an edit
+                with lock:
+                    if response == "u":
+                        operation = undo_operation(branch_dict, index, history)
+                    else:
+                        operation = redo_operation(branch_dict, index, history)
+                    if operation is not None:
+                        queue_edits([operation])
+                if operation is None:
+                    text = "Nothing to " + ("Undo" if response == "u" else "Redo")
+                    continue
+                node_id = get_history_node(index, node_id, operation)
+                text = "Undid Edit" if response == "u" else "Redid Edit"
+                continue
+            elif response == "q":
+                # Clear the terminal, pending edits are written once the loop ends
+                redraw_terminal("")
                 break
-        # Print help command
-        text = "Commands:\n"\
-                    + "h - help\n"\
-                    + "a - add element\n"\
-                    + "d - delete element\n"\
-                    + "m - move\n"\
-                    + "f - toggle whether the branch ends\n"\
-                    + "s - change save file paths\n"\
-                    + "w - write to file\n"\
-                    + "q - quit program (without saving)"
-                    
+            if response in ["a", "d", "f", "s"]:
+                # Apply the edit and queue it for the autosave
+                if operation is not None:
+                    with lock:
+                        if apply_with_history(branch_dict, operation, index, history, node_id):
+                            queue_edits([operation])
+                continue
+            # Print help command
+            text = "Commands:\n"\
+                        + "h - help\n"\
+                        + "a - add element\n"\
+                        + "d - delete element\n"\
+                        + "m - move\n"\
+                        + "j - jump to a branch by searching its text\n"\
+                        + "f - toggle whether the branch ends\n"\
+                        + "i - import all new saves\n"\
+                        + "s - change save file paths\n"\
+                        + "u - undo\n"\
+                        + "r - redo\n"\
+                        + "w - write to file\n"\
+                        + "q - quit program"
+    finally:
+        # Write edits that haven't been saved yet
+        if watcher is not None:
+            stop_watch(watcher)
+        stop_autosave(autosave)
     return False
 
-def move(branch_dict:dict=None, path:List[int]=None) -> List[int]:
+def get_ingest_report(added:List[tuple]=None) -> str:
+    # List the save files that were added
+    if len(added) == 0:
+        return "No new saves found"
+    lines = [f"Added {len(added)} save(s):"]
+    for save in added:
+        lines.append(basename(save[0]))
+    return "\n".join(lines)
+
+def get_history_node(index:dict=None, node_id:int=None, operation:dict=None) -> int:
+    # Move to the branch an undone or redone edit affected if the current branch was removed
+    if node_id in index["nodes"]:
+        return node_id
+    node_id = get_node_from_path(index, operation.get("path", []))
+    if node_id is None:
+        return index["root"]
+    return node_id
+
+def move(index:dict=None, node_id:int=None) -> int:
     # Print list of paths to move down
-    cur_dict = get_dict_from_path(branch_dict, path)
+    cur_dict = get_node(index, node_id)
     print()
     size = len(cur_dict["branch"])
     for i in range(0, size):
@@ -168,19 +297,42 @@ def move(branch_dict:dict=None, path:List[int]=None) -> List[int]:
         print()
         response = int(input("Which Path? (0 to move up): ")) - 1
         if response == -1:
-            return path[:-1]
+            parent_id = get_parent_id(index, node_id)
+            if parent_id is None:
+                return node_id
+            return parent_id
         if response < -1 or response > size-1:
-            return path
-        new_path = path
-        new_path.append(response)
-        return new_path
+            return node_id
+        return get_node_id(index, cur_dict["branch"][response])
+    except ValueError:
+        return node_id
+
+def search(index:dict=None, node_id:int=None) -> int:
+    # Get the branches matching the search text
+    matches = search_index(index, input("Search: "))
+    if len(matches) == 0:
+        return node_id
+    # Print list of matching branches
+    print()
+    for i in range(0, len(matches)):
+        match_dict = get_node(index, matches[i])
+        path = get_path_text(get_node_path(index, matches[i]))
+        response = "(Root)" if match_dict["response"] is None else match_dict["response"]
+        print("(" + str(i+1) + ") " + response + " [" + path + "]")
+    # Get user input
+    try:
+        response = input("Which branch? (Defaults to 1): ")
+        if response == "":
+            response = "1"
+        response = int(response) - 1
+        if response < 0 or response > len(matches) - 1:
+            return node_id
+        return matches[response]
     except ValueError:
-        return path
+        return node_id
 
-def delete_element(branch_dict:dict=None, path:List[int]=None) -> dict:
-    # Get user input for what kind of element to add
-    full_dict = branch_dict
-    cur_dict = get_dict_from_path(full_dict, path)
+def delete_element(cur_dict:dict=None, path:List[int]=None) -> dict:
+    # Get user input for what kind of element to delete
     response = input("Delete (e - event, b - branch): ")
     if response == "e":
         # Remove one of the events from the item list
@@ -194,12 +346,11 @@ def delete_element(branch_dict:dict=None, path:List[int]=None) -> dict:
                 print("(" + str(i+1) + ") " + item_list[i]["text"])
         try:
             index = int(input("Delete: ")) - 1
-            if index < 0:
-                return full_dict
-            del item_list[index]
-            cur_dict["item_list"] = item_list
-        except (IndexError, ValueError):
-            return full_dict
+            if index < 0 or index > len(item_list)-1:
+                return None
+            return {"op":"delete_item", "path":list(path), "index":index}
+        except ValueError:
+            return None
     elif response == "b":
         # Remove one of the branches
         branches = cur_dict["branch"]
@@ -208,33 +359,27 @@ def delete_element(branch_dict:dict=None, path:List[int]=None) -> dict:
         try:
             index = int(input("Delete: ")) - 1
             if index < 0 or index > len(branches)-1:
-                return full_dict
+                return None
             if input("Delete response and all sub branches? (Y/N)").lower() == "y":
-                del branches[index]
-            cur_dict["branch"] = branches
+                return {"op":"delete_branch", "path":list(path), "index":index}
         except ValueError:
-            return full_dict
-    # Replace the section of the dict
-    full_dict = set_dict_from_path(full_dict, cur_dict, path)
-    # Return the dict
-    return full_dict
+            return None
+    return None
 
-def add_element(branch_dict:dict=None, path:List[int]=None, save_path:str=None) -> dict:
+def add_element(path:List[int]=None, save_path:str=None, blob_dir:str=None) -> dict:
     # Get user input for element to add
-    full_dict = branch_dict
-    cur_dict = get_dict_from_path(full_dict, path)
     response = input("Add (s - save, e - event, b - branch): ").lower()
     # Check the input
     if response == "s":
         # Create a save element
-        save = get_save(save_path)
+        save = get_save(save_path, blob_dir)
         if save is not None:
-            cur_dict = add_item_to_dict(cur_dict, "s", save)
+            return {"op":"add_item", "path":list(path), "item":{"type":"s", "hash":save}}
     elif response == "e":
         # Create event
         event = input("Event Name: ")
         color = input("Color (R, G, B, C, Y, M, W): ").lower()
-        cur_dict = add_item_to_dict(cur_dict, color, event)
+        return {"op":"add_item", "path":list(path), "item":{"type":color, "text":event}}
     elif response == "b":
         # Create branches
         responses = []
@@ -244,21 +389,230 @@ def add_element(branch_dict:dict=None, path:List[int]=None, save_path:str=None)
             if r.lower() == "q":
                 break
             responses.append(r)
-        cur_dict = create_branch_in_dict(cur_dict, prompt, responses)
-    # Replace the section of the dict
-    full_dict = set_dict_from_path(full_dict, cur_dict, path)
-    # Return the dict
-    return full_dict
+        return {"op":"create_branch", "path":list(path), "prompt":prompt, "responses":responses}
+    return None
+
+def get_batch_operation(command:List[str]=None, path:List[int]=None, blob_dir:str=None) -> dict:
+    # Get the operation for a batch command that edits the tree
+    name = command[0].lower()
+    if name == "event" and len(command) == 3:
+        return {"op":"add_item", "path":list(path), "item":{"type":command[1].lower(), "text":command[2]}}
+    if name == "save" and len(command) == 2:
+        save = file_to_blob(blob_dir, command[1])
+        if save is None:
+            raise ValueError(f"Couldn't read save file {command[1]}")
+        return {"op":"add_item", "path":list(path), "item":{"type":"s", "hash":save}}
+    if name == "branch" and len(command) > 1:
+        return {"op":"create_branch", "path":list(path), "prompt":command[1], "responses":command[2:]}
+    if name == "end" and len(command) == 1:
+        return {"op":"toggle_end", "path":list(path)}
+    if name == "paths" and len(command) in [2, 3]:
+        secondary = abspath(command[2]) if len(command) == 3 else None
+        return {"op":"set_paths", "primary":abspath(command[1]), "secondary":secondary}
+    raise ValueError(f"Invalid command: {' '.join(command)}")
+
+def batch_edit(file:str=None, branch_dict:dict=None, lines:List[str]=None) -> bool:
+    # Batch commands, one per line:
+    #   event COLOR TEXT - add an event to the current branch
+    #   save FILE - add a save file to the current branch
+    #   branch PROMPT RESPONSE... - create branches in the current branch
+    #   import [DIRECTORY] - add every new save in a directory, the primary save path by default
+    #   end - toggle whether the current branch ends
+    #   move N - move into response N of the current branch, 0 to move up
+    #   root - move to the root branch
+    #   find TEXT - move to the first branch containing the text
+    #   paths PRIMARY [SECONDARY] - change save file paths
+    #   undo - undo the last edit
+    #   redo - redo the last edit that was undone
+    #   write - write edits to the file
+    blob_dir = get_blob_directory(file)
+    # Operations applied since the last write
+    operations = []
+    history = get_empty_history()
+    index = build_index(branch_dict["tree"])
+    node_id = index["root"]
+    line_num = 0
+    try:
+        for line in lines:
+            line_num += 1
+            command = split(line, comments=True)
+            if len(command) == 0:
+                continue
+            name = command[0].lower()
+            if name == "move" and len(command) == 2:
+                # Move into part of the tree
+                response = int(command[1]) - 1
+                if response == -1:
+                    if get_parent_id(index, node_id) is not None:
+                        node_id = get_parent_id(index, node_id)
+                    continue
+                if response < -1:
+                    raise IndexError(f"Invalid response: {command[1]}")
+                node_id = get_node_id(index, get_node(index, node_id)["branch"][response])
+                continue
+            if name == "root" and len(command) == 1:
+                node_id = index["root"]
+                continue
+            if name == "find" and len(command) == 2:
+                # Move to the first branch containing the text
+                matches = search_index(index, command[1])
+                if len(matches) == 0:
+                    raise ValueError(f"No branch contains {command[1]}")
+                node_id = matches[0]
+                continue
+            if name == "import" and len(command) in [1, 2]:
+                # Add every new save in the directory
+                save_path = branch_dict["primary_path"] if len(command) == 1 else command[1]
+                added = ingest_saves(branch_dict["tree"], save_path, blob_dir)
+                path = get_node_path(index, node_id)
+                for save in added:
+                    operation = {"op":"add_item", "path":list(path), "item":{"type":"s", "hash":save[1]}}
+                    apply_with_history(branch_dict, operation, index, history, node_id)
+                    operations.append(operation)
+                print(get_ingest_report(added))
+                continue
+            if (name == "undo" or name == "redo") and len(command) == 1:
+                # Undo or redo an edit
+                if name == "undo":
+                    operation = undo_operation(branch_dict, index, history)
+                else:
+                    operation = redo_operation(branch_dict, index, history)
+                if operation is None:
+                    raise ValueError(f"Nothing to {name}")
+                operations.append(operation)
+                node_id = get_history_node(index, node_id, operation)
+                continue
+            if name == "write" and len(command) == 1:
+                # Write edits to the file's journal
+                if not save_tree(file, branch_dict, operations):
+                    raise ValueError("Failed to save file")
+                operations = []
+                continue
+            # Apply the edit and keep it for the next write
+            operation = get_batch_operation(command, get_node_path(index, node_id), blob_dir)
+            if not apply_with_history(branch_dict, operation, index, history, node_id):
+                raise ValueError(f"Couldn't apply command: {line.strip()}")
+            operations.append(operation)
+    except (IndexError, ValueError) as error:
+        print(f"Line {line_num}: {error}")
+        return False
+    # Write remaining edits with a single save
+    if len(operations) > 0 and not save_tree(file, branch_dict, operations):
+        print("Failed to save file.")
+        return False
+    return True
+
+def get_path_text(path:List[int]=None) -> str:
+    # Get the path of a branch as response numbers, as chosen when moving
+    if len(path) == 0:
+        return "(Root)"
+    return ".".join([str(branch+1) for branch in path])
+
+def print_diff(changes:List[dict]=None):
+    # Print the differences between two trees
+    if len(changes) == 0:
+        print("No differences.")
+    for change in changes:
+        path = get_path_text(change["path"])
+        if change["change"] == "added":
+            print(f"+ {path} {change['new']['response']}")
+        elif change["change"] == "removed":
+            print(f"- {path} {change['old']['response']}")
+        elif change["change"] == "items":
+            print(f"~ {path} items: {len(change['old'])} -> {len(change['new'])}")
+        elif change["change"] == "end":
+            print(f"~ {path} end: {change['old']} -> {change['new']}")
 
 def main():
     # Get filename from the user
     parser = ArgumentParser()
     parser.add_argument(
             "file",
-            help="JSON file with branch info.",
+            help="JSON file with branch info, or a directory of tree files with --catalog.",
+            type=str)
+    parser.add_argument(
+            "--catalog",
+            help="Print the node count, completion, and saves of every tree file in the directory and exit.",
+            action="store_true")
+    parser.add_argument(
+            "--migrate",
+            help="Move inline saves from an older file into the blob store and exit.",
+            action="store_true")
+    parser.add_argument(
+            "--pack-saves",
+            help="Store saves as deltas against the save before them on the same route and exit.",
+            action="store_true")
+    parser.add_argument(
+            "--convert",
+            help="Write the file to the given path and exit. Paths ending in .vno use the binary format, "
+                        + "and paths ending in .vndb use an SQLite database.",
+            metavar="NEW_FILE",
+            type=str)
+    parser.add_argument(
+            "--export",
+            help="Export the tree and exit. Paths ending in .dot or .gv use Graphviz DOT, others use HTML.",
+            metavar="OUT_FILE",
+            type=str)
+    parser.add_argument(
+            "--include-saves",
+            help="Include the saves in the export, as hashes in DOT and as download links in HTML.",
+            action="store_true")
+    parser.add_argument(
+            "--diff",
+            help="Print the differences between the file and another tree file and exit.",
+            metavar="OTHER_FILE",
+            type=str)
+    parser.add_argument(
+            "--merge",
+            help="Merge the branches of another tree file into the file and exit.",
+            metavar="OTHER_FILE",
+            type=str)
+    parser.add_argument(
+            "--base",
+            help="Tree file both files started from, for use with --merge.",
+            metavar="BASE_FILE",
+            type=str)
+    parser.add_argument(
+            "--watch",
+            help="Add saves written to the primary save path to the current branch while editing.",
+            action="store_true")
+    parser.add_argument(
+            "--batch",
+            help="Apply the edit commands in the given script and exit, - to read commands from stdin.",
+            metavar="SCRIPT",
+            type=str)
+    parser.add_argument(
+            "--profile",
+            help="Print timings for commands and file operations on exit.",
+            action="store_true")
+    parser.add_argument(
+            "--profile-stats",
+            help="Profile as with --profile, and write cProfile statistics to the given file on exit.",
+            metavar="STATS_FILE",
             type=str)
     args = parser.parse_args()
+    # Return an exit status for the console script
+    if not args.profile and args.profile_stats is None:
+        return 0 if run(args) else 1
+    # Run with timings recorded
+    start_profiling(None if args.profile_stats is None else abspath(args.profile_stats))
+    try:
+        return 0 if run(args) else 1
+    finally:
+        stop_profiling()
+
+def run(args) -> bool:
     full_file = abspath(args.file)
+    # Catalog a directory of tree files
+    if args.catalog:
+        from vn_organizer.tree_catalog import get_catalog_print
+        from vn_organizer.tree_catalog import scan_catalog
+        entries = scan_catalog(full_file)
+        if entries is None:
+            print("Directory doesn't exist.")
+            return False
+        print(get_catalog_print(entries))
+        return True
     # Check if directory of the file exists
     if not exists(abspath(join(full_file, pardir))):
         print("Directory doesn't exist.")
@@ -266,21 +620,96 @@ def main():
     # Check if given file exists
     if not exists(full_file):
         print("File doesn't exist.")
+        if args.batch is not None:
+            return False
         response = input(f"Create file {basename(full_file)}? (Y/N): ").lower()
         if not response == "y":
             return False
         # Create file if specified
         primary, secondary = get_save_paths()
         new_dict = get_empty_branch_dict()
-        write_tree(full_file, new_dict, primary, secondary, None)
-    # Read the given file
-    branch_dict = read_tree(full_file)
+        clear_journal(full_file)
+        if not write_tree(full_file, new_dict, primary, secondary, None):
+            print("Failed to create file.")
+            return False
+    # Database files keep their saves in the database rather than the blob store
+    if (args.migrate or args.pack_saves) and is_database_file(full_file):
+        print("Database files store their saves in the database, so they can't be migrated or packed.")
+        return False
+    # Write the file in a different format if converting
+    if args.convert is not None:
+        if not convert_tree(full_file, abspath(args.convert)):
+            print("Failed to convert file.")
+            return False
+        print("Converted File")
+        return True
+    # Export the tree to another format
+    if args.export is not None:
+        from vn_organizer.tree_export import export_tree
+        missing = export_tree(full_file, abspath(args.export), args.include_saves)
+        if missing is None:
+            print("Failed to export file.")
+            return False
+        for blob_hash in missing:
+            print(f"Save {blob_hash} is missing from the blob store.")
+        print("Exported File")
+        return True
+    # Merge another tree file into the file
+    if args.merge is not None:
+        from vn_organizer.tree_merge import merge_tree_files
+        base_file = None if args.base is None else abspath(args.base)
+        conflicts = merge_tree_files(full_file, abspath(args.merge), base_file)
+        if conflicts is None:
+            print("Failed to merge files.")
+            return False
+        for conflict in conflicts:
+            print(f"Conflict at {get_path_text(conflict['path'])}: {conflict['conflict']}")
+        print("Merged File")
+        return True
+    # Read the given file, only loading branches of database files as they are used
+    # and reading JSON files from their cache when editing
+    editing = args.diff is None and not args.migrate and not args.pack_saves
+    branch_dict = read_tree(full_file, editing)
     # Check if the file is a proper branch dict
     if branch_dict is None:
         print("File is not correctly formatted.")
         return False
-    # Start the user editing process
-    user_edit(full_file, branch_dict)
+    # Compare with another tree file
+    if args.diff is not None:
+        from vn_organizer.tree_merge import diff_trees
+        other_dict = read_tree(abspath(args.diff))
+        if other_dict is None:
+            print("Other file is not correctly formatted.")
+            return False
+        print_diff(diff_trees(branch_dict["tree"], other_dict["tree"]))
+        return True
+    # Rewrite the file in the current format if only migrating
+    if args.migrate:
+        if not compact_tree(full_file, branch_dict):
+            print("Failed to migrate file.")
+            return False
+        print("Migrated File")
+        return True
+    # Store saves as deltas to save space
+    if args.pack_saves:
+        packed = pack_saves(branch_dict["tree"], get_blob_directory(full_file))
+        print(f"Packed {packed} save(s)")
+        return True
+    # Start the user editing process with a compact copy of the tree
+    if not isinstance(branch_dict["tree"], BranchNode):
+        branch_dict["tree"] = to_nodes(branch_dict["tree"])
+    if args.batch is not None:
+        # Apply the commands in the batch script without user input
+        if args.batch == "-":
+            return batch_edit(full_file, branch_dict, stdin.readlines())
+        try:
+            with open(abspath(args.batch)) as in_file:
+                return batch_edit(full_file, branch_dict, in_file.readlines())
+        except FileNotFoundError:
+            print("Batch script doesn't exist.")
+            return False
+    user_edit(full_file, branch_dict, args.watch)
+    return True
 
 if __name__ == "__main__":
-    main()
+    exit(main())